@@ -0,0 +1,189 @@
+import ast
+import json
+import os
+import re
+import threading
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from result_format import MORE_ROWS_PATTERN, marker_total
+
+
+# Deterministic answers
+# Between execute_query and the answer LLM, the result is parsed back into columns and rows and
+# classified by shape:
+#   empty        no rows
+#   scalar       one value, answered when the question has a recognised form
+#                ("How many X are there?", "How many X were ...?", "What is the X?")
+#   single_row   one row of at most ANSWER_TEMPLATE_MAX_COLUMNS values
+#   short_list   at most ANSWER_TEMPLATE_MAX_ROWS rows of at most ANSWER_TEMPLATE_MAX_COLUMNS values, none left out
+#   complex      anything else, errors, and questions that ask for interpretation
+# Every shape but complex is rendered from a template, so the answer LLM is only called
+# when the result needs interpretation. ANSWER_TEMPLATES=false always calls the LLM.
+
+ANSWER_TEMPLATES_ENABLED = os.getenv('ANSWER_TEMPLATES', 'true').lower() in ('1', 'true', 'yes')
+
+INTERPRETATION_PATTERN = re.compile(
+    r"\b(why|explain|compare|comparison|trend|analy[sz]e|analysis|insight|recommend|should|suggest|summari[sz]e"
+    r"|difference|better|worse|describe|interpret|predict|forecast)\b|^(is|are|was|were|do|does|did|can|could|has|have)\b",
+    re.IGNORECASE,
+)
+HOW_MANY_THERE_PATTERN = re.compile(r"^how many (.+?) (?:are there|exist|do we have)(?: in total)?$", re.IGNORECASE)
+HOW_MANY_PATTERN = re.compile(r"^how many ([\w ]+?) (are|were|have|has|had) (.+)$", re.IGNORECASE)
+WHAT_IS_PATTERN = re.compile(r"^(?:what is|what's|what was) (the .+)$", re.IGNORECASE)
+SINGULAR_VERBS = {"are": "is", "were": "was", "have": "has"}
+REPR_WRAPPERS = [
+    (re.compile(r"Decimal\('([^']*)'\)"), lambda m: repr(m.group(1))),
+    (re.compile(r"datetime\.datetime\((\d+), (\d+), (\d+)(?:, (\d+), (\d+)(?:, (\d+))?)?[^)]*\)"),
+     lambda m: repr(f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d} "
+                    f"{int(m.group(4) or 0):02d}:{int(m.group(5) or 0):02d}:{int(m.group(6) or 0):02d}")),
+    (re.compile(r"datetime\.date\((\d+), (\d+), (\d+)\)"),
+     lambda m: repr(f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}")),
+]
+
+
+def parse_result(sql_result):
+    """
+    (columns, rows, total) from a query tool result in the compact or the repr format, with
+    values as display strings (None for NULL). Columns are None for the repr format. total comes
+    from the more-rows marker when rows were left out (see result_format.marker_total).
+    Returns None for errors and anything that does not parse.
+    """
+    text = str(sql_result).strip()
+    if text.startswith("Error:"):
+        return None
+    if not text:
+        return [], [], 0
+    more = MORE_ROWS_PATTERN.search(text)
+    body = text[:more.start()] if more else text.split("\ncolumn summaries")[0]
+
+    if body.startswith("[("):
+        for pattern, replacement in REPR_WRAPPERS:
+            body = pattern.sub(replacement, body)
+        try:
+            rows = ast.literal_eval(body)
+        except (ValueError, SyntaxError):
+            return None
+        rows = [tuple(None if value is None else str(value) for value in row) for row in rows]
+        return None, rows, marker_total(more) if more else len(rows)
+
+    lines = body.split("\n")
+    columns = lines[0].split(" | ")
+    rows = []
+    for line in lines[1:]:
+        values = line.split(" | ")
+        if len(values) != len(columns):
+            return None  # a value containing " | " was quoted as JSON; leave it to the LLM
+        try:
+            rows.append(tuple(None if value == "NULL" else json.loads(value) if value.startswith('"') else value
+                              for value in values))
+        except ValueError:
+            return None  # not a JSON-quoted value after all; leave it to the LLM
+    return columns, rows, marker_total(more) if more else len(rows)
+
+
+def singular(noun):
+    return noun[:-1] if noun.endswith("s") and not noun.endswith("ss") else noun
+
+
+def render_scalar(question, value):
+    """
+    Sentence for a single value when the question has a recognised form, else None.
+    """
+    question = question.strip().rstrip("?.! ")
+    match = HOW_MANY_THERE_PATTERN.match(question)
+    if match and re.fullmatch(r"\d+", value):
+        noun = match.group(1)
+        return f"There is 1 {singular(noun)}." if value == "1" else f"There are {value} {noun}."
+    match = HOW_MANY_PATTERN.match(question)
+    if match and re.fullmatch(r"\d+", value):
+        noun, verb, rest = match.groups()
+        if value == "1":
+            noun, verb = singular(noun), SINGULAR_VERBS.get(verb.lower(), verb)
+        return f"{value} {noun} {verb} {rest}."
+    match = WHAT_IS_PATTERN.match(question)
+    if match:
+        subject = match.group(1)
+        return f"{subject[0].upper()}{subject[1:]} is {value}."
+    return None
+
+
+def describe_row(columns, row):
+    first = row[0] if row[0] is not None else "NULL"
+    details = ", ".join(f"{column}: {value if value is not None else 'NULL'}" for column, value in zip(columns[1:], row[1:]))
+    return f"{first} ({details})" if details else first
+
+
+class AnswerTemplates:
+    """
+    Result-shape classifier and template renderer placed in front of the answer LLM chain.
+    """
+
+    def __init__(self, max_rows=None, max_columns=None):
+        self.max_rows = max_rows if max_rows is not None else int(os.getenv('ANSWER_TEMPLATE_MAX_ROWS', '10'))
+        self.max_columns = max_columns if max_columns is not None else int(os.getenv('ANSWER_TEMPLATE_MAX_COLUMNS', '3'))
+        self._lock = threading.Lock()
+        self.shapes = {}
+        self.stats = {"rendered": 0, "llm_calls": 0, "render_s": 0.0}
+
+    def classify(self, question, parsed):
+        if parsed is None or INTERPRETATION_PATTERN.search(question.strip()):
+            return "complex"
+        columns, rows, total = parsed
+        if total == 0:
+            return "empty"
+        if total > len(rows) or columns is None and len(rows) > 1:
+            return "complex"
+        width = len(rows[0])
+        if len(rows) == 1 and width == 1:
+            return "scalar"
+        if width > self.max_columns:
+            return "complex"
+        return "single_row" if len(rows) == 1 else "short_list" if len(rows) <= self.max_rows else "complex"
+
+    def render(self, question, sql_result):
+        """
+        Returns (shape, answer); answer is None when the LLM has to write it.
+        """
+        parsed = parse_result(sql_result)
+        shape = self.classify(question, parsed)
+        answer = None
+        if shape == "empty":
+            answer = "No matching records were found."
+        elif shape == "scalar" and parsed[1][0][0] is not None:
+            answer = render_scalar(question, parsed[1][0][0])
+        elif shape == "single_row":
+            columns, rows, _ = parsed
+            answer = describe_row(columns or [f"value {i + 1}" for i in range(len(rows[0]))], rows[0]) + "."
+        elif shape == "short_list":
+            columns, rows, _ = parsed
+            columns = columns or [f"value {i + 1}" for i in range(len(rows[0]))]
+            answer = f"{len(rows)} results:\n" + "\n".join(f"- {describe_row(columns, row)}" for row in rows)
+        with self._lock:
+            counts = self.shapes.setdefault(shape, {"rendered": 0, "llm": 0})
+            counts["rendered" if answer is not None else "llm"] += 1
+        return shape, answer
+
+    def get_stats(self):
+        with self._lock:
+            answers = self.stats["rendered"] + self.stats["llm_calls"]
+            return dict(self.stats, shapes={shape: dict(counts) for shape, counts in self.shapes.items()},
+                        llm_call_rate=self.stats["llm_calls"] / answers if answers else 0.0,
+                        render_ms=self.stats["render_s"] * 1000 / answers if answers else 0.0)
+
+    def wrap(self, answer_chain):
+        """
+        Runnable taking the answer chain's inputs ({"question", "sql_query", "sql_result"}): returns
+        the rendered answer, or hands the inputs to answer_chain.
+        """
+        def route(inputs):
+            start = time.perf_counter()
+            _, answer = self.render(inputs["question"], inputs["sql_result"])
+            with self._lock:
+                self.stats["render_s"] += time.perf_counter() - start
+                self.stats["rendered" if answer is not None else "llm_calls"] += 1
+            # A returned runnable is invoked, or streamed token by token, with the same inputs
+            return answer if answer is not None else answer_chain
+
+        return RunnableLambda(route)
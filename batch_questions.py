@@ -0,0 +1,114 @@
+import asyncio
+import os
+import re
+
+
+# Batch question API
+# Questions are normalized and deduplicated before they reach the chain, so a nightly job
+# with repeated questions pays the LLM + DB cost once per distinct question. In the async
+# service, identical questions that are already in flight are coalesced onto one execution.
+# A failing question does not fail the batch: its slot in the answers holds the exception.
+
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+
+
+def normalize_question(question):
+    """
+    Lowercases, collapses whitespace and drops trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.!").strip().lower()
+
+
+def dedupe_questions(questions):
+    """
+    Returns (unique_questions, positions) where positions[i] is the index in
+    unique_questions that answers questions[i]. The first spelling of each question is kept.
+    """
+    unique = []
+    seen = {}
+    positions = []
+    for question in questions:
+        key = normalize_question(question)
+        if key not in seen:
+            seen[key] = len(unique)
+            unique.append(question)
+        positions.append(seen[key])
+    return unique, positions
+
+
+def record_batch_stats(stats, questions, unique, answers):
+    if stats is not None:
+        stats.update(questions=len(questions), executed=len(unique), deduplicated=len(questions) - len(unique),
+                     failed=sum(isinstance(answer, BaseException) for answer in answers))
+
+
+def answer_questions(chain, questions, extra_inputs=None, max_concurrency=None, stats=None):
+    """
+    Runs a batch of questions through a chain such as main.rephrased_chain, answering each
+    distinct question once with at most max_concurrency in parallel. Answers are returned
+    in the order of the input questions; a question that failed gets its exception instead.
+    """
+    unique, positions = dedupe_questions(questions)
+    inputs = [dict(extra_inputs or {}, question=question) for question in unique]
+    answers = chain.batch(inputs, config={"max_concurrency": max_concurrency or BATCH_MAX_CONCURRENCY},
+                          return_exceptions=True)
+    record_batch_stats(stats, questions, unique, answers)
+    return [answers[position] for position in positions]
+
+
+class RequestCoalescer:
+    """
+    Shares one execution between identical concurrent requests: the first caller for a key
+    starts the work as a task, and every caller with the same key (the first one included)
+    awaits it shielded, so a caller that is cancelled or times out leaves it running for the
+    others. The work is cancelled when its last caller is.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    async def run(self, key, work):
+        """
+        work is a zero-argument callable returning an awaitable.
+        """
+        entry = self._in_flight.get(key)
+        if entry is None:
+            entry = {"task": asyncio.ensure_future(work()), "waiters": 0}
+            self._in_flight[key] = entry
+            entry["task"].add_done_callback(lambda _: self._forget(key, entry))
+            self.stats["executions"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(entry["task"])
+        finally:
+            entry["waiters"] -= 1
+            if entry["waiters"] == 0 and not entry["task"].done():
+                entry["task"].cancel()
+
+    def _forget(self, key, entry):
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+
+async def aanswer_questions(answer, questions, max_concurrency=None, coalescer=None, stats=None):
+    """
+    Async batch: answer is an async callable taking one question. Distinct questions run with
+    bounded parallelism and, when a coalescer is given, join identical in-flight requests.
+    A question that failed (or timed out) gets its exception in place of the answer.
+    """
+    unique, positions = dedupe_questions(questions)
+    semaphore = asyncio.Semaphore(max_concurrency or BATCH_MAX_CONCURRENCY)
+
+    async def run_one(question):
+        async with semaphore:
+            if coalescer is None:
+                return await answer(question)
+            return await coalescer.run(normalize_question(question), lambda: answer(question))
+
+    answers = await asyncio.gather(*(run_one(question) for question in unique), return_exceptions=True)
+    record_batch_stats(stats, questions, unique, answers)
+    return [answers[position] for position in positions]
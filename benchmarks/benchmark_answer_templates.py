@@ -0,0 +1,96 @@
+"""
+Deterministic answers (answer_templates.py) against always calling the answer LLM, end to end.
+
+database_dump.sql is loaded into SQLite and ChatOpenAI is replaced by the fake model with
+--latency seconds per call. Every question goes through SQL generation, execution and the
+answer stage, once with the plain answer chain and once with the template fast path; the
+report shows each question's result shape and answer, the answer-LLM call rate and the
+end-to-end p50 of both runs.
+
+    python benchmarks/benchmark_answer_templates.py --latency 0.5 --repeat 3
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+sys.path.insert(0, dirname(abspath(__file__)))
+
+from langchain.chains import create_sql_query_chain
+from langchain_community.utilities.sql_database import SQLDatabase
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from answer_templates import AnswerTemplates, parse_result
+from fake_llm import FakeSQLChatModel
+from few_shot_examples import order_few_shot
+from local_database import create_local_engine
+from streaming_query import StreamingQuerySQLDataBaseTool
+from util import repair_sql_query
+
+QUESTIONS = [
+    {"input": "How many employees are there?", "query": "SELECT COUNT(*) FROM employees;"},
+    {"input": "How many customers are in the USA?", "query": "SELECT COUNT(*) FROM customers WHERE country = 'USA';"},
+    {"input": "How many orders were shipped in 2004?", "query": "SELECT COUNT(*) FROM orders WHERE status = 'Shipped' AND orderDate LIKE '2004%';"},
+    {"input": "What is the total amount of all payments?", "query": "SELECT SUM(amount) FROM payments;"},
+    {"input": "What is the phone number of Atelier graphique?", "query": "SELECT phone FROM customers WHERE customerName = 'Atelier graphique';"},
+    {"input": "Which customer has the highest credit limit?", "query": "SELECT customerName, creditLimit FROM customers ORDER BY creditLimit DESC LIMIT 1;"},
+    {"input": "List the offices and their cities", "query": "SELECT officeCode, city, country FROM offices;"},
+    {"input": "List the customers in Atlantis", "query": "SELECT customerName FROM customers WHERE country = 'Atlantis';"},
+    {"input": "Compare the sales of each product line", "query": "SELECT p.productLine, SUM(od.quantityOrdered * od.priceEach) FROM products p JOIN orderdetails od ON p.productCode = od.productCode GROUP BY p.productLine;"},
+    {"input": "List every order line", "query": "SELECT orderNumber, productCode, quantityOrdered FROM orderdetails;"},
+] + [{"input": example["input"], "query": example["query"]} for example in order_few_shot]
+
+answer_prompt = PromptTemplate.from_template(
+    """Given the following user question, corresponding SQL query, and SQL result, answer the user question.
+
+    User Question: {question}
+    SQL Query: {sql_query}
+    SQL Result: {sql_result}
+    Answer:
+    """
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db = SQLDatabase(create_local_engine())
+    llm = FakeSQLChatModel(sql_by_question={q["input"]: q["query"] for q in QUESTIONS}, latency_s=args.latency)
+    sql_chain = create_sql_query_chain(llm, db)
+    execute_query = StreamingQuerySQLDataBaseTool(db=db)
+    llm_answer_chain = answer_prompt | llm | StrOutputParser()
+    templates = AnswerTemplates()
+    chains = {"llm": llm_answer_chain, "templates": templates.wrap(llm_answer_chain)}
+
+    latencies = {name: [] for name in chains}
+    answers = {}
+    for _ in range(args.repeat):
+        for question in QUESTIONS:
+            for name, answer_chain in chains.items():
+                start = time.perf_counter()
+                sql_query, _ = repair_sql_query(sql_chain.invoke({"question": question["input"]}))
+                sql_result = execute_query.invoke(sql_query)
+                answer = answer_chain.invoke({"question": question["input"], "sql_query": sql_query, "sql_result": sql_result})
+                latencies[name].append(time.perf_counter() - start)
+                if name == "templates":
+                    answers[question["input"]] = (templates.classify(question["input"], parse_result(sql_result)), answer)
+
+    for question, (shape, answer) in answers.items():
+        print(f"[{shape}] {question}\n    " + answer.replace("\n", "\n    "))
+
+    stats = templates.get_stats()
+    print(f"\n{'answer chain':<12} {'LLM calls':>10} {'call rate':>10} {'p50 s':>8}")
+    calls = {"llm": len(latencies["llm"]), "templates": stats["llm_calls"]}
+    for name, samples in latencies.items():
+        print(f"{name:<12} {calls[name]:>10} {calls[name] / len(samples):>10.0%} {statistics.median(samples):>8.3f}")
+    print(f"\nshapes: {stats['shapes']}; template rendering {stats['render_ms']:.3f} ms per answer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of the batch question API for batches of 10, 100 and 1000 questions, with a
+fake chain of fixed latency standing in for LLM + DB. Compares one invoke per question
+against deduplicated batching (sync) and deduplicated + coalesced async execution.
+
+    python benchmarks/benchmark_batch_questions.py [latency_ms] [duplicate_ratio]
+"""
+import asyncio
+import random
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from langchain_core.runnables import RunnableLambda
+
+from batch_questions import RequestCoalescer, aanswer_questions, answer_questions
+
+BATCH_SIZES = [10, 100, 1000]
+MAX_CONCURRENCY = 8
+
+
+def make_questions(count, duplicate_ratio):
+    random.seed(count)
+    distinct = max(1, int(count * (1 - duplicate_ratio)))
+    pool = [f"How many orders did customer {i} place?" for i in range(distinct)]
+    variants = [lambda q: q, lambda q: q.upper(), lambda q: q.rstrip("?") + "  ?", lambda q: " " + q.lower()]
+    return [random.choice(variants)(pool[i % distinct] if i < distinct else random.choice(pool)) for i in range(count)]
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    duplicate_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+    def fake_answer(inputs):
+        time.sleep(latency)
+        return f"answer to {inputs['question']}"
+
+    async def fake_answer_async(question):
+        await asyncio.sleep(latency)
+        return f"answer to {question}"
+
+    chain = RunnableLambda(fake_answer)
+    print(f"latency {latency * 1000:.0f} ms per question, {duplicate_ratio:.0%} duplicates, concurrency {MAX_CONCURRENCY}\n")
+
+    for size in BATCH_SIZES:
+        questions = make_questions(size, duplicate_ratio)
+
+        start = time.perf_counter()
+        if size <= 100:
+            for question in questions:
+                chain.invoke({"question": question})
+            sequential = size / (time.perf_counter() - start)
+        else:
+            sequential = 1 / latency  # 1000 sequential calls take too long; throughput is 1/latency
+
+        stats = {}
+        start = time.perf_counter()
+        answer_questions(chain, questions, max_concurrency=MAX_CONCURRENCY, stats=stats)
+        batched = size / (time.perf_counter() - start)
+
+        async_stats = {}
+        coalescer = RequestCoalescer()
+        start = time.perf_counter()
+        asyncio.run(aanswer_questions(fake_answer_async, questions, MAX_CONCURRENCY, coalescer, async_stats))
+        coalesced = size / (time.perf_counter() - start)
+
+        print(f"{size:>5} questions | sequential {sequential:8.1f} q/s | batch {batched:8.1f} q/s | "
+              f"async {coalesced:8.1f} q/s | executed {stats['executed']}")
@@ -0,0 +1,103 @@
+"""
+Column-value index on the local SQLite copy of database_dump.sql: build and incremental
+refresh time, lookup latency (exact / prefix / fuzzy, in microseconds), the values injected
+into the prompt for a few questions, and literal correction of generated SQL with wrong
+filter values (row counts before and after the correction).
+
+    python benchmarks/benchmark_column_values.py --repeat 10000
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sqlalchemy import text
+
+from column_values import ColumnValueIndex
+from local_database import create_local_engine
+
+LOOKUPS = [
+    ("exact", "USA"), ("exact", "classic cars"), ("prefix", "Mini"), ("prefix", "Vin"),
+    ("fuzzy", "Clasic Car"), ("fuzzy", "ebikes"), ("fuzzy", "United States"), ("fuzzy", "Atelier grafique"),
+]
+
+QUESTIONS = [
+    "How many customers are in the United States?",
+    "Which orders of Atelier graphique are on hold?",
+    "Total quantity ordered for classic cars and vintage car models",
+    "List the employees working in the Sales Rep role in the Paris office",
+]
+
+WRONG_SQL = [
+    "SELECT COUNT(*) FROM customers WHERE country = 'United States';",
+    "SELECT COUNT(*) FROM customers WHERE country = 'United Kingdom';",
+    "SELECT productName FROM products WHERE productLine = 'Classic Car';",
+    "SELECT orderNumber FROM orders WHERE status = 'Canceled';",
+    "SELECT o.orderNumber FROM orders o JOIN customers c ON o.customerNumber = c.customerNumber WHERE c.customerName = 'Atelier Graphic';",
+    "SELECT COUNT(*) FROM customers WHERE country = 'Atlantis';",
+]
+
+
+def time_us(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def row_count(engine, sql):
+    """
+    Rows returned, or the counted value for COUNT(*) queries.
+    """
+    with engine.connect() as connection:
+        rows = connection.execute(text(sql.rstrip(";"))).fetchall()
+    return rows[0][0] if "COUNT(*)" in sql else len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+
+    engine = create_local_engine()
+    index = ColumnValueIndex(engine)
+    start = time.perf_counter()
+    index.refresh()
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index.refresh()
+    unchanged_ms = (time.perf_counter() - start) * 1000
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO productlines (productLine, textDescription) VALUES ('E-Bikes', 'Electric bicycles')"))
+    start = time.perf_counter()
+    reread = index.refresh()
+    refresh_ms = (time.perf_counter() - start) * 1000
+    stats = index.get_stats()
+    print(f"built {stats['columns']} columns / {stats['values']} values in {build_ms:.1f} ms; "
+          f"refresh without changes {unchanged_ms:.1f} ms; after one insert re-read {sorted(reread)} in {refresh_ms:.1f} ms")
+    for key in sorted(index.snapshot.columns):
+        print(f"  {index.names[key]:<32} {len(index.snapshot.columns[key]):>5} values")
+
+    print(f"\n{'lookup':<8} {'value':<20} {'p50 us':>8}  result")
+    for kind, value in LOOKUPS:
+        lookup = getattr(index, kind)
+        print(f"{kind:<8} {value:<20} {time_us(lambda: lookup(value), args.repeat):>8.2f}  {lookup(value)[:3]}")
+
+    print("\nprompt hints")
+    for question in QUESTIONS:
+        latency = time_us(lambda: index.prompt_hint(question), max(1, args.repeat // 100))
+        print(f"  {question} ({latency:.0f} us)\n    " + (index.prompt_hint(question).replace("\n", "\n    ") or "(none)"))
+
+    print(f"\n{'rows before':>11} {'rows after':>10}  corrected SQL")
+    for sql in WRONG_SQL:
+        corrected = index.correct_literals(sql)
+        print(f"{row_count(engine, sql):>11} {row_count(engine, corrected):>10}  {corrected if corrected != sql else '(unchanged) ' + sql}")
+
+
+if __name__ == "__main__":
+    main()
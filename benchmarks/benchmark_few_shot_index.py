@@ -0,0 +1,65 @@
+"""
+Startup-time benchmark for the persisted few-shot index: cold (from_examples / empty
+index dir), warm (hash matches, loaded from disk) and incremental (one example changed).
+
+    python benchmarks/benchmark_few_shot_index.py [number_of_examples]
+"""
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.example_selectors import SemanticSimilarityExampleSelector
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from few_shot_examples import order_few_shot
+from few_shot_index import load_example_selector
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def build_examples(count):
+    examples = []
+    for i in range(count):
+        base = order_few_shot[i % len(order_few_shot)]
+        examples.append({"input": f"{base['input']} (variant {i})", "query": base["query"]})
+    return examples
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    examples = build_examples(count)
+    embedding_model = timed("model load", lambda: HuggingFaceEmbeddings(model_name=MODEL_NAME))
+    print(f"{count} examples")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        timed("from_examples (baseline)", lambda: SemanticSimilarityExampleSelector.from_examples(
+            examples, embedding_model, FAISS, k=2, input_keys=["input"]))
+
+        stats = {}
+        timed("cold (empty index dir)", lambda: load_example_selector(
+            examples, embedding_model, MODEL_NAME, k=2, input_keys=["input"], index_dir=index_dir, stats=stats))
+        print(f"  {stats}")
+
+        stats = {}
+        selector = timed("warm (hash match)", lambda: load_example_selector(
+            examples, embedding_model, MODEL_NAME, k=2, input_keys=["input"], index_dir=index_dir, stats=stats))
+        print(f"  {stats}")
+
+        changed = examples[:-1] + [{"input": "How many products are in stock?", "query": "SELECT SUM(quantityInStock) FROM products;"}]
+        stats = {}
+        timed("incremental (1 changed)", lambda: load_example_selector(
+            changed, embedding_model, MODEL_NAME, k=2, input_keys=["input"], index_dir=index_dir, stats=stats))
+        print(f"  {stats}")
+
+        print(selector.select_examples({"input": "Find the total sales per product"}))
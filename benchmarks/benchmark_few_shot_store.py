@@ -0,0 +1,120 @@
+"""
+Example selection latency of the on-disk few-shot store (HNSW) as the example set grows,
+next to SemanticSimilarityExampleSelector.from_examples (exact FAISS search) as the baseline.
+
+For each size the store is built in a temporary directory, reopened from disk, and then timed
+on select_examples (p50 / p95), on incremental add_verified calls, and on recall@k against an
+exact search over the stored embeddings. Embeddings are deterministic fakes unless
+--real-embeddings is given (all-MiniLM-L6-v2; slow to embed 100k examples on CPU).
+
+    python benchmarks/benchmark_few_shot_store.py --sizes 5 100 1000 10000 100000
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.example_selectors import SemanticSimilarityExampleSelector
+
+from few_shot_examples import order_few_shot
+from few_shot_store import FewShotExampleStore
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+ENTITIES = ["Atelier graphique", "Signal Gift Stores", "Australian Collectors, Co.", "La Rochelle Gifts",
+            "Classic Cars", "Motorcycles", "Planes", "Vintage Cars", "USA", "France", "Japan", "Spain"]
+
+
+def build_examples(count):
+    examples = []
+    for i in range(count):
+        base = order_few_shot[i % len(order_few_shot)]
+        entity = ENTITIES[(i // len(order_few_shot)) % len(ENTITIES)]
+        examples.append({"input": f"{base['input']} for {entity} in {2003 + i % 3} (set {i})", "query": base["query"]})
+    return examples
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def time_selection(selector, questions):
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        selector.select_examples({"input": question})
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def recall_at_k(store, embedding_model, questions, k):
+    vectors = np.fromfile(store.paths["embeddings"], dtype=np.float32).reshape(-1, store.dim)
+    hits = total = 0
+    for question in questions:
+        query = np.asarray(embedding_model.embed_query(question), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+        exact = set(np.argsort(-(vectors @ query))[:k])
+        _, ids = store.index.search(query[None, :], k)
+        hits += len(exact & set(ids[0]))
+        total += len(exact)
+    return hits / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 100, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200, help="selections timed per size")
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--max-baseline", type=int, default=100000, help="largest size to build the from_examples baseline for")
+    parser.add_argument("--real-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    if args.real_embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embedding_model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    else:
+        embedding_model = DeterministicFakeEmbedding(size=384)
+
+    print(f"{'examples':>9} {'build s':>9} {'open ms':>9} {'store p50':>10} {'store p95':>10} "
+          f"{'flat p50':>9} {'flat p95':>9} {'add p50':>9} {'recall@k':>9}")
+    for size in args.sizes:
+        examples = build_examples(size)
+        questions = [f"{example['input']} please" for example in examples[::max(1, size // args.queries)]][:args.queries]
+        with tempfile.TemporaryDirectory() as store_dir:
+            start = time.perf_counter()
+            store = FewShotExampleStore(embedding_model, MODEL_NAME, store_dir=store_dir, k=args.k)
+            store.add_examples(examples)
+            store.save()
+            build_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = FewShotExampleStore(embedding_model, MODEL_NAME, store_dir=store_dir, k=args.k)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            store_p50, store_p95 = time_selection(store, questions)
+            add_samples = []
+            for i in range(20):
+                start = time.perf_counter()
+                store.add_verified(f"How many orders did customer {i} place in {2000 + i}?",
+                                   f"SELECT COUNT(*) FROM orders WHERE customerNumber = {100 + i};")
+                add_samples.append((time.perf_counter() - start) * 1000)
+            recall = recall_at_k(store, embedding_model, questions[:50], args.k)
+
+        flat = "-"
+        if size <= args.max_baseline:
+            baseline = SemanticSimilarityExampleSelector.from_examples(examples, embedding_model, FAISS, k=args.k, input_keys=["input"])
+            flat_p50, flat_p95 = time_selection(baseline, questions)
+            flat = f"{flat_p50:>9.3f} {flat_p95:>9.3f}"
+        print(f"{size:>9} {build_s:>9.2f} {open_ms:>9.1f} {store_p50:>10.3f} {store_p95:>10.3f} {flat:>19} "
+              f"{statistics.median(add_samples):>9.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
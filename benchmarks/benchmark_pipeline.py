@@ -0,0 +1,156 @@
+"""
+Offline, reproducible per-stage benchmark of the SQL QA pipeline in main.py.
+
+database_dump.sql is loaded into an in-memory SQLite database that main.py uses as its
+engine, ChatOpenAI is replaced by a deterministic fake model with configurable latency and
+the embedding model by a fake one (or all-MiniLM-L6-v2), so no MySQL server or OpenAI
+endpoint is needed. The table router is built from the dump. Each question from
+few_shot_examples.py (plus a few simple ones) goes through main.answer_chain, the chain the
+service runs, and its stages are timed by pipeline_metrics (the METRICS_JSONL_PATH export):
+
+    schema_context      table routing and the cached schema context (SQLite schema, sample rows)
+    example_selection   few-shot example store (FEW_SHOT_STORE=true only)
+    sql_generation      SQL prompt | fake model | SQLRepairer.extract (| literal correction)
+    sql_execution       SQLRepairer execute chain: cost guard, result cache, streaming tool
+    answer              answer templates | answer prompt | fake model
+
+Optional stages follow main.py's environment variables (ANSWER_TEMPLATES, FEW_SHOT_STORE,
+SQL_TEMPLATES, COLUMN_VALUES, SEMANTIC_CACHE, ...). Sample rows are read with
+SAMPLE_ROWS_MODE=all, as projected sampling uses MySQL functions. Repeated passes hit
+main.py's schema and result caches as repeated questions do in production.
+
+    python benchmarks/benchmark_pipeline.py --repeat 20 --output report.json
+    python benchmarks/benchmark_pipeline.py --baseline report.json   # compare against a saved run
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+sys.path.insert(0, dirname(abspath(__file__)))
+
+from few_shot_examples import order_few_shot
+
+QUESTIONS = [
+    {"input": "How many employees are there?", "query": "SELECT COUNT(*) FROM employees;"},
+    {"input": "How many customers are in the USA?", "query": "SELECT COUNT(*) FROM customers WHERE country = 'USA';"},
+    {"input": "What is the total amount of all payments?", "query": "SELECT SUM(amount) FROM payments;"},
+    {"input": "List every order line", "query": "SELECT orderNumber, productCode, quantityOrdered FROM orderdetails;"},
+] + [{"input": example["input"], "query": example["query"]} for example in order_few_shot]
+
+
+def load_pipeline(latency_s, real_embeddings, metrics_path):
+    """
+    Imports main.py against the local SQLite engine with the fake model and returns the module.
+    """
+    os.environ.update(LAZY_STARTUP="true", STARTUP_WARM_UP="false", METRICS_ENABLED="true",
+                      METRICS_JSONL_PATH=metrics_path, READ_REPLICA="off", SUMMARY_TABLES="false")
+    os.environ.setdefault("SAMPLE_ROWS_MODE", "all")
+
+    from db_engine import use_engine
+    from local_database import DUMP_PATH, create_local_engine
+    use_engine(create_local_engine())
+
+    import main
+    from fake_llm import FakeSQLChatModel
+    from table_router import TableRouter
+
+    main.llm.override(FakeSQLChatModel(sql_by_question={q["input"]: q["query"] for q in QUESTIONS}, latency_s=latency_s))
+    if real_embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        main.embedding_model.override(HuggingFaceEmbeddings(model_name=main.EMBEDDING_MODEL_NAME))
+    else:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        main.embedding_model.override(DeterministicFakeEmbedding(size=384))
+    main.table_router.override(TableRouter.from_dump(main.embedding_model, DUMP_PATH, main.TABLE_DESCRIPTIONS_CSV))
+    return main
+
+
+def run_question(main, question):
+    main.answer_chain.invoke({"question": question["input"], "table_info": main.table_info, "top_k": main.few_shot_prompt})
+
+
+def read_stage_samples(metrics_path):
+    """
+    {stage: [ms, ...]} from the JSONL lines pipeline_metrics wrote, then empties the file.
+    """
+    samples = {}
+    with open(metrics_path) as metrics_file:
+        for line in metrics_file:
+            record = json.loads(line)
+            samples.setdefault(record["stage"], []).append(record["duration_s"] * 1000)
+    open(metrics_path, "w").close()
+    return samples
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+        "n": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated LLM latency per call")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the question set")
+    parser.add_argument("--real-embeddings", action="store_true", help="use all-MiniLM-L6-v2 instead of fake embeddings")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    args = parser.parse_args()
+
+    metrics_file, metrics_path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(metrics_file)
+    try:
+        start = time.perf_counter()
+        pipeline = load_pipeline(args.latency_ms / 1000, args.real_embeddings, metrics_path)
+        setup_ms = (time.perf_counter() - start) * 1000
+
+        for question in QUESTIONS:  # warm-up pass, not recorded
+            run_question(pipeline, question)
+        read_stage_samples(metrics_path)
+        for _ in range(args.repeat):
+            for question in QUESTIONS:
+                run_question(pipeline, question)
+        timings = read_stage_samples(metrics_path)
+    finally:
+        os.remove(metrics_path)
+
+    from pipeline_metrics import STAGES
+    stages = [stage for stage in STAGES if stage in timings]
+    report = {
+        "config": {"latency_ms": args.latency_ms, "repeat": args.repeat, "questions": len(QUESTIONS),
+                   "real_embeddings": args.real_embeddings, "python": platform.python_version()},
+        "setup_ms": round(setup_ms, 1),
+        "stages": {stage: summarize(timings[stage]) for stage in stages},
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f"setup (load dump, import main.py): {report['setup_ms']:.1f} ms\n")
+    print(f"{'stage':<18} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}" + (f" {'p50 vs base':>12}" if baseline else ""))
+    for stage, stats in report["stages"].items():
+        line = f"{stage:<18} {stats['mean_ms']:>10.3f} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f}"
+        if baseline and stage in baseline["stages"]:
+            base = baseline["stages"][stage]["p50_ms"]
+            line += f" {((stats['p50_ms'] - base) / base * 100 if base else 0):>+11.1f}%"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
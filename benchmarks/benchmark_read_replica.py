@@ -0,0 +1,89 @@
+"""
+Side-by-side latency of the few-shot queries on MySQL and on the in-process read replica.
+
+The replica is loaded from database_dump.sql (default) or snapshotted from the configured
+MySQL database (--source mysql). Every query runs through the same row-capped streaming path
+the pipeline uses. Without a reachable MySQL server (or with --offline) only the replica is timed.
+
+    python benchmarks/benchmark_read_replica.py --repeat 50
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from few_shot_examples import order_few_shot
+from read_replica import ReadReplica, translate_query
+from streaming_query import run_streaming
+
+ROW_CAP = 100
+MAX_BYTES = 16000
+
+QUERIES = [example["query"] for example in order_few_shot] + [
+    "SELECT COUNT(*) FROM customers WHERE country = 'USA';",
+    "SELECT YEAR(orderDate) AS orderYear, COUNT(*) FROM orders GROUP BY YEAR(orderDate);",
+    "SELECT productLine, SUM(quantityInStock) / COUNT(*) AS avgStock FROM products GROUP BY productLine;",
+]
+
+
+def time_query(engine, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_streaming(engine, sql, ROW_CAP, MAX_BYTES)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), sorted(samples)[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["dump", "mysql"], default="dump", help="what the replica is loaded from")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--offline", action="store_true", help="do not connect to MySQL")
+    args = parser.parse_args()
+
+    source_engine = None
+    if not args.offline or args.source == "mysql":
+        from db_engine import get_engine
+        source_engine = get_engine()
+        try:
+            with source_engine.connect():
+                pass
+        except SQLAlchemyError as e:
+            if args.source == "mysql":
+                raise
+            print(f"MySQL not reachable ({e.__class__.__name__}), timing the replica only\n")
+            source_engine = None
+
+    start = time.perf_counter()
+    replica = ReadReplica.from_source(source_engine) if args.source == "mysql" else ReadReplica.from_dump()
+    print(f"replica built from {args.source} in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    header = f"{'query':<50} {'replica p50':>12} {'replica p95':>12}"
+    if source_engine is not None:
+        header += f" {'mysql p50':>10} {'mysql p95':>10} {'speedup':>8}"
+    print(header)
+
+    for sql in QUERIES:
+        label = " ".join(sql.split())[:48]
+        translated = translate_query(sql, replica.decimal_names)
+        if translated is None:
+            print(f"{label:<50} {'ineligible, runs on MySQL':>25}")
+            continue
+        run_streaming(replica.engine, translated, ROW_CAP, MAX_BYTES)  # warm-up
+        replica_p50, replica_p95 = time_query(replica.engine, translated, args.repeat)
+        line = f"{label:<50} {replica_p50:>10.3f}ms {replica_p95:>10.3f}ms"
+        if source_engine is not None:
+            run_streaming(source_engine, sql, ROW_CAP, MAX_BYTES)
+            source_p50, source_p95 = time_query(source_engine, sql, args.repeat)
+            line += f" {source_p50:>8.3f}ms {source_p95:>8.3f}ms {source_p50 / replica_p50:>7.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Answer-prompt tokens of SQL results in the repr format (SQLDatabase.run) vs. the compact format
+(result_format.py), per query.
+
+Queries run through StreamingQuerySQLDataBaseTool with the same row cap and byte budget the
+pipeline uses. By default they run on database_dump.sql loaded into SQLite, where dates come
+back as strings and DECIMAL as float, so the repr is smaller than on MySQL: use --mysql for
+the real Decimal('...') / datetime.date(...) wrappers.
+
+    python benchmarks/benchmark_result_format.py --show 2
+"""
+import argparse
+import sys
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from langchain_community.utilities.sql_database import SQLDatabase
+
+from few_shot_examples import order_few_shot
+from local_database import create_local_engine
+from pipeline_metrics import count_result_rows
+from result_format import result_format_stats
+from streaming_query import StreamingQuerySQLDataBaseTool
+
+QUERIES = [
+    "SELECT COUNT(*) FROM employees;",
+    "SELECT customerName, creditLimit FROM customers WHERE country = 'France';",
+    "SELECT orderNumber, orderDate, requiredDate, shippedDate, status FROM orders ORDER BY orderDate LIMIT 10;",
+    "SELECT checkNumber, paymentDate, amount FROM payments;",
+    "SELECT productCode, productName, buyPrice, MSRP FROM products;",
+] + [" ".join(example["query"].split()) for example in order_few_shot]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mysql", action="store_true", help="run against the configured MySQL database")
+    parser.add_argument("--show", type=int, default=0, help="print both renderings of the first N queries")
+    args = parser.parse_args()
+
+    if args.mysql:
+        from db_engine import get_engine
+        engine = get_engine()
+    else:
+        engine = create_local_engine()
+    db = SQLDatabase(engine)
+    tools = {name: StreamingQuerySQLDataBaseTool(db=db, result_format=name) for name in ("repr", "compact")}
+
+    print(f"{'query':<60} {'rows':>6} {'repr tok':>9} {'compact tok':>12} {'saved':>7}")
+    totals = {"repr": 0, "compact": 0}
+    for i, sql in enumerate(QUERIES):
+        outputs = {name: tool.invoke(sql) for name, tool in tools.items()}
+        tokens = {name: result_format_stats.count_tokens(output) for name, output in outputs.items()}
+        for name in totals:
+            totals[name] += tokens[name]
+        rows = count_result_rows(outputs["compact"])
+        saved = 1 - tokens["compact"] / tokens["repr"] if tokens["repr"] else 0.0
+        print(f"{sql[:58]:<60} {rows:>6} {tokens['repr']:>9} {tokens['compact']:>12} {saved:>6.0%}")
+        if i < args.show:
+            for name, output in outputs.items():
+                print(f"\n--- {name} ---\n{output[:1500]}")
+            print()
+
+    saved = 1 - totals["compact"] / totals["repr"]
+    print(f"\n{'total':<60} {'':>6} {totals['repr']:>9} {totals['compact']:>12} {saved:>6.0%}")
+    print(f"token counts from {'tiktoken cl100k_base' if result_format_stats._encoding else 'characters / 4'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Sample rows for the schema context: SELECT * ... LIMIT 3 against the projected, representative
+sampling of get_sample_data, per table, on the configured MySQL database. Reports fetch time,
+the size of the fetched values and the tokens of the rendered PrettyTable block, and the time of
+a snapshot hit (same DDL checksum).
+
+    python benchmarks/benchmark_sample_rows.py --repeat 5 --show
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+import util_custom_prompt_table_info as table_info
+from result_format import result_format_stats
+
+TABLES = ["customers", "employees", "offices", "orderdetails", "orders", "payments", "productlines", "products"]
+
+
+def value_bytes(rows):
+    return sum(len(value) if isinstance(value, (bytes, bytearray, memoryview)) else len(str(value))
+               for row in rows for value in row)
+
+
+def fetch(mode, table, checksum=None):
+    table_info.SAMPLE_ROWS_MODE = mode
+    start = time.perf_counter()
+    rows, headers = table_info.get_sample_data(table, checksum=checksum)
+    return rows, list(headers), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--show", action="store_true", help="print both sample blocks per table")
+    args = parser.parse_args()
+
+    checksums = {table: checksum for table, _, checksum in table_info.get_schema_fingerprint(TABLES)}
+    print(f"{'table':<14} {'all ms':>7} {'all bytes':>10} {'all tok':>8} {'proj ms':>8} {'proj bytes':>11} {'proj tok':>9} {'hit us':>7}")
+    for table in TABLES:
+        results = {}
+        for mode in ("all", "projected"):
+            times = [fetch(mode, table)[2] for _ in range(args.repeat)]
+            rows, headers, _ = fetch(mode, table)
+            block = table_info.format_output({table: ""}, {table: (rows, headers)}, {})
+            results[mode] = (statistics.median(times) * 1000, value_bytes(rows), result_format_stats.count_tokens(block), block)
+        fetch("projected", table, checksums[table])
+        hit_us = statistics.median(fetch("projected", table, checksums[table])[2] for _ in range(args.repeat)) * 1e6
+        (all_ms, all_bytes, all_tokens, all_block), (ms, size, tokens, block) = results["all"], results["projected"]
+        print(f"{table:<14} {all_ms:>7.1f} {all_bytes:>10} {all_tokens:>8} {ms:>8.1f} {size:>11} {tokens:>9} {hit_us:>7.1f}")
+        if args.show:
+            print(f"{all_block}\n{block}")
+    print(f"\nsnapshot counters: {table_info.get_schema_cache_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compares per-table schema introspection (SQLAlchemy inspector / SHOW CREATE TABLE)
+with the bulk information_schema path at 8, 100 and 1000 tables, and fails unless both
+produce identical columns and DDL.
+
+Creates a scratch schema (BENCH_DB_NAME, default 'langchain_sql_bench') on the
+configured MySQL server, fills it with synthetic tables and drops it afterwards.
+
+    python benchmarks/benchmark_schema_introspection.py
+"""
+import os
+import re
+import sys
+import time
+from os.path import join, dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, inspect, text
+
+from util_schema_introspection import fetch_schema_metadata, render_column_info, render_table_ddl
+
+dotenv_path = join(dirname(dirname(abspath(__file__))), '.env')
+load_dotenv(dotenv_path)
+
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'langchain_sql_bench')
+TABLE_COUNTS = [8, 100, 1000]
+SERVER_URI = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}"
+
+
+def create_tables(engine, count):
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE bench_parent (
+              parentCode varchar(15),
+              name varchar(70) NOT NULL,
+              PRIMARY KEY (parentCode)
+            )
+        """))
+        for i in range(count - 1):
+            connection.execute(text(f"""
+                CREATE TABLE bench_table_{i} (
+                  id int NOT NULL AUTO_INCREMENT,
+                  parentCode varchar(15) NOT NULL,
+                  label varchar(50) DEFAULT NULL COMMENT 'display label',
+                  description text,
+                  quantity smallint NOT NULL,
+                  price decimal(10,2) NOT NULL,
+                  status enum('open','on hold','closed') NOT NULL DEFAULT 'open',
+                  createdAt datetime DEFAULT CURRENT_TIMESTAMP,
+                  PRIMARY KEY (id),
+                  KEY status_idx (status, createdAt),
+                  UNIQUE KEY label_idx (label),
+                  FOREIGN KEY (parentCode) REFERENCES bench_parent (parentCode)
+                )
+            """))
+
+
+def per_table_introspection(engine, tables):
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    columns = {table: [{"name": col["name"], "type": str(col["type"])} for col in inspector.get_columns(table)]
+               for table in tables if table in table_names}
+    with engine.connect() as connection:
+        ddl = {table: connection.execute(text(f"SHOW CREATE TABLE {table};")).fetchone()[1] for table in tables}  # type: ignore
+    return columns, ddl
+
+
+def without_auto_increment(ddl):
+    # render_table_ddl leaves out the AUTO_INCREMENT counter on purpose
+    return re.sub(r" AUTO_INCREMENT=\d+", "", ddl)
+
+
+def bulk_introspection(engine, tables):
+    with engine.connect() as connection:
+        metadata = fetch_schema_metadata(connection, tables)
+    columns = {table: render_column_info(metadata[table]) for table in tables if table in metadata}
+    ddl = {table: render_table_ddl(table, metadata[table]) for table in tables if table in metadata}
+    return columns, ddl
+
+
+def run(count):
+    server = create_engine(SERVER_URI)
+    with server.begin() as connection:
+        connection.execute(text(f"DROP DATABASE IF EXISTS {BENCH_DB_NAME}"))
+        connection.execute(text(f"CREATE DATABASE {BENCH_DB_NAME}"))
+    engine = create_engine(f"{SERVER_URI}/{BENCH_DB_NAME}")
+    try:
+        create_tables(engine, count)
+        tables = ["bench_parent"] + [f"bench_table_{i}" for i in range(count - 1)]
+
+        start = time.perf_counter()
+        per_table_columns, per_table_ddl = per_table_introspection(engine, tables)
+        per_table_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bulk_columns, bulk_ddl = bulk_introspection(engine, tables)
+        bulk_time = time.perf_counter() - start
+
+        columns_match = per_table_columns == bulk_columns
+        ddl_mismatches = sum(
+            1 for table in tables
+            if without_auto_increment(per_table_ddl[table]) != bulk_ddl[table]
+        )
+        print(f"{count:>5} tables | per_table {per_table_time * 1000:9.1f} ms | bulk {bulk_time * 1000:8.1f} ms | "
+              f"speedup {per_table_time / bulk_time:6.1f}x | columns identical: {columns_match} | ddl mismatches: {ddl_mismatches}")
+        assert columns_match, [(table, per_table_columns.get(table), bulk_columns.get(table))
+                               for table in tables if per_table_columns.get(table) != bulk_columns.get(table)][:1]
+        assert ddl_mismatches == 0, [(per_table_ddl[table], bulk_ddl[table]) for table in tables
+                                     if without_auto_increment(per_table_ddl[table]) != bulk_ddl[table]][:1]
+    finally:
+        engine.dispose()
+        with server.begin() as connection:
+            connection.execute(text(f"DROP DATABASE IF EXISTS {BENCH_DB_NAME}"))
+        server.dispose()
+
+
+if __name__ == "__main__":
+    for count in TABLE_COUNTS:
+        run(count)
@@ -0,0 +1,131 @@
+"""
+SQL-generation latency with and without the question-to-SQL template fast path.
+
+database_dump.sql is loaded into SQLite and ChatOpenAI is replaced by the fake model with
+--latency-ms per call. Each question family below is answered once through the LLM (the
+template is learned from that run), then every other question of the family goes through
+the wrapped chain. The script reports template hits, whether the rendered SQL equals what the
+model would have generated, and the p50 of the SQL step for LLM generation vs. templates.
+Probe questions that must not match (extra conditions, unknown entities) count as false hits.
+
+    python benchmarks/benchmark_sql_templates.py --latency-ms 800 --per-family 20
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+sys.path.insert(0, dirname(abspath(__file__)))
+
+from langchain.chains import create_sql_query_chain
+from langchain_community.utilities.sql_database import SQLDatabase
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import text
+
+from fake_llm import FakeSQLChatModel
+from local_database import create_local_engine
+from sql_templates import SQLTemplateStore
+from streaming_query import StreamingQuerySQLDataBaseTool
+from util import canonicalize_sql, repair_sql_query
+
+FAMILIES = [
+    {
+        "question": "Show the orders for customer {}",
+        "sql": "SELECT o.orderNumber, o.orderDate, o.status FROM orders o JOIN customers c "
+               "ON o.customerNumber = c.customerNumber WHERE c.customerName = '{}';",
+        "values": "SELECT DISTINCT c.customerName FROM customers c JOIN orders o ON o.customerNumber = c.customerNumber",
+    },
+    {
+        "question": "How many customers are in {}?",
+        "sql": "SELECT COUNT(*) FROM customers WHERE country = '{}';",
+        "values": "SELECT DISTINCT country FROM customers",
+    },
+    {
+        "question": "Top {} products by quantity ordered",
+        "sql": "SELECT p.productName, SUM(od.quantityOrdered) AS quantity FROM products p JOIN orderdetails od "
+               "ON p.productCode = od.productCode GROUP BY p.productName ORDER BY quantity DESC LIMIT {};",
+        "values": [3, 5, 10, 15, 20, 25, 50],
+    },
+    {
+        "question": "List the products in the {} product line",
+        "sql": "SELECT productName, buyPrice FROM products WHERE productLine = '{}';",
+        "values": "SELECT productLine FROM productlines",
+    },
+]
+
+# Near misses that a template must not answer
+PROBES = [
+    "Show the orders for customer Atelier graphique in 2004",
+    "Show the orders for customer Nonexistent Traders",
+    "How many employees are in France?",
+    "Top 5 customers by payments",
+    "List the products in the Classic Cars product line sorted by price",
+]
+
+
+def family_values(engine, family, limit):
+    values = family["values"]
+    if isinstance(values, str):
+        with engine.connect() as connection:
+            values = [row[0] for row in connection.execute(text(values))]
+    return values[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="simulated LLM latency per call")
+    parser.add_argument("--per-family", type=int, default=20, help="questions per family")
+    parser.add_argument("--threshold", type=float, default=None, help="SQL_TEMPLATE_THRESHOLD override")
+    args = parser.parse_args()
+
+    engine = create_local_engine()
+    db = SQLDatabase(engine)
+    questions = []
+    for family in FAMILIES:
+        for value in family_values(engine, family, args.per_family):
+            questions.append((family["question"].format(value), family["sql"].format(str(value).replace("'", "''"))))
+    llm = FakeSQLChatModel(sql_by_question=dict(questions), latency_s=args.latency_ms / 1000)
+
+    sql_chain = create_sql_query_chain(llm, db) | RunnableLambda(lambda response: repair_sql_query(response)[0])
+    store = SQLTemplateStore(engine, threshold=args.threshold, path="")
+    templated_chain = store.wrap(sql_chain)
+    execute_query = StreamingQuerySQLDataBaseTool(db=db)
+
+    llm_ms, template_ms = [], []
+    correct = wrong = 0
+    for question, expected_sql in questions:
+        hits = store.stats["hits"]
+        start = time.perf_counter()
+        sql_query = templated_chain.invoke({"question": question})
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if store.stats["hits"] > hits:
+            template_ms.append(elapsed_ms)
+            if canonicalize_sql(sql_query) == canonicalize_sql(expected_sql):
+                correct += 1
+            else:
+                wrong += 1
+                print(f"  mismatch: {question}\n    {sql_query}\n    {expected_sql}")
+        else:
+            llm_ms.append(elapsed_ms)
+        store.observe({"question": question, "sql_query": sql_query, "sql_result": execute_query.invoke(sql_query)})
+
+    false_hits = [probe for probe in PROBES if store.render(probe) is not None]
+
+    stats = store.get_stats()
+    print(f"{len(questions)} questions in {len(FAMILIES)} families, {stats['templates']} templates learned, "
+          f"threshold {store.threshold}")
+    print(f"template hits {len(template_ms)} ({len(template_ms) / len(questions):.0%}), "
+          f"rendered SQL identical to the model's {correct}/{correct + wrong}")
+    print(f"probes answered by a template (should be 0): {len(false_hits)} {false_hits if false_hits else ''}\n")
+    print(f"{'SQL step':<22} {'n':>5} {'p50 ms':>10} {'mean ms':>10}")
+    for label, samples in (("LLM generation", llm_ms), ("template", template_ms)):
+        if samples:
+            print(f"{label:<22} {len(samples):>5} {statistics.median(samples):>10.3f} {statistics.mean(samples):>10.3f}")
+    print(f"\nestimated latency saved: {stats['saved_latency_s']:.2f} s "
+          f"({len(template_ms)} SQL-generation LLM calls skipped)")
+
+
+if __name__ == "__main__":
+    main()
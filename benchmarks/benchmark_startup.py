@@ -0,0 +1,117 @@
+"""
+Cold start of main.py: import time and first-request latency in fresh interpreters.
+
+Each mode runs in a new process so nothing is cached in memory between runs:
+
+    eager     LAZY_STARTUP=false (models, router and DB connection built at import)
+    lazy      LAZY_STARTUP=true  (built by the first request)
+    warm-up   LAZY_STARTUP=true STARTUP_WARM_UP=true, first request after --idle seconds
+
+The first request is either the table routing step (--request route, needs MySQL but no
+LLM) or the full chain (--request full, also calls OPENAI_API_HOST). The slowest imports
+from python -X importtime are listed for the eager run.
+
+    python benchmarks/benchmark_startup.py --runs 3 --output startup.json
+    python benchmarks/benchmark_startup.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from os.path import dirname, abspath
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+QUESTION = "List of Employees with the concern customers"
+
+MODES = {
+    "eager": {"LAZY_STARTUP": "false", "STARTUP_WARM_UP": "false"},
+    "lazy": {"LAZY_STARTUP": "true", "STARTUP_WARM_UP": "false"},
+    "warm-up": {"LAZY_STARTUP": "true", "STARTUP_WARM_UP": "true"},
+}
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+import_s = time.perf_counter() - start
+time.sleep(float(sys.argv[1]))
+start = time.perf_counter()
+if sys.argv[2] == "full":
+    main.rephrased_chain.invoke({"question": sys.argv[3], "table_info": main.table_info, "top_k": main.few_shot_prompt})
+else:
+    main.find_relevant_group(sys.argv[3])
+first_request_s = time.perf_counter() - start
+from lazy_startup import load_times
+print(json.dumps({"import_s": import_s, "first_request_s": first_request_s, "load_times": load_times}))
+"""
+
+
+def run_child(mode, idle, request, importtime=False):
+    env = dict(os.environ, **MODES[mode])
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, str(idle), request, QUESTION]
+    completed = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(importtime_log, top=10):
+    """
+    Top-level packages by cumulative import time from a python -X importtime log.
+    """
+    packages = {}
+    for line in importtime_log.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match and len(match.group(2)) <= 1:
+            package = match.group(3).split(".")[0]
+            packages[package] = packages.get(package, 0) + int(match.group(1)) / 1e6
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per mode")
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds between import and first request")
+    parser.add_argument("--request", choices=["route", "full"], default="route")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    args = parser.parse_args()
+
+    report = {"config": {"runs": args.runs, "idle_s": args.idle, "request": args.request}, "modes": {}}
+    for mode in MODES:
+        samples = [run_child(mode, args.idle, args.request)[0] for _ in range(args.runs)]
+        report["modes"][mode] = {
+            "import_s": round(statistics.median(s["import_s"] for s in samples), 3),
+            "first_request_s": round(statistics.median(s["first_request_s"] for s in samples), 3),
+            "load_times": samples[-1]["load_times"],
+        }
+    _, importtime_log = run_child("eager", 0, args.request, importtime=True)
+    report["slowest_imports_s"] = {package: round(seconds, 3) for package, seconds in slowest_imports(importtime_log)}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f"{'mode':<10} {'import s':>10} {'first request s':>16} {'import + first s':>17}")
+    for mode, stats in report["modes"].items():
+        line = f"{mode:<10} {stats['import_s']:>10.3f} {stats['first_request_s']:>16.3f} {stats['import_s'] + stats['first_request_s']:>17.3f}"
+        if baseline and mode in baseline["modes"]:
+            base = baseline["modes"][mode]
+            line += f"   (baseline {base['import_s']:.3f} / {base['first_request_s']:.3f})"
+        print(line)
+    print("\nslowest imports (eager):")
+    for package, seconds in report["slowest_imports_s"].items():
+        print(f"  {package:<30} {seconds:>8.3f} s")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Aggregate queries on the base tables vs. the same queries rewritten onto summary tables,
+as orderdetails grows.
+
+database_dump.sql is loaded into SQLite and orders / orderdetails are replicated with
+shifted orderNumbers up to each scale factor (1x = 2,996 order lines). For every scale the
+script reports the full summary build, a refresh without changes (on SQLite the table
+versions hash the rows; MySQL reads UPDATE_TIME), an incremental refresh after one new order, the
+refresh after existing order lines are updated, deleted and added to (which the summaries
+must detect and rebuild for), and the p50 latency of each query before and after the
+rewrite (results are compared).
+
+    python benchmarks/benchmark_summary_tables.py --scales 1 10 100
+"""
+import argparse
+import statistics
+import sys
+import time
+from os.path import dirname, abspath
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from sqlalchemy import text
+
+from few_shot_examples import order_few_shot
+from local_database import create_local_engine
+from summary_tables import SummaryTableManager
+
+ORDER_OFFSET = 100000
+
+QUERIES = [
+    order_few_shot[3]["query"],  # Find the total sales per product
+    """SELECT c.customerName, SUM(od.quantityOrdered * od.priceEach) AS revenue
+       FROM customers c JOIN orders o ON c.customerNumber = o.customerNumber
+       JOIN orderdetails od ON o.orderNumber = od.orderNumber
+       GROUP BY c.customerNumber ORDER BY revenue DESC LIMIT 5""",
+    """SELECT p.productLine, SUM(od.quantityOrdered) AS quantity, COUNT(*) AS orderLines
+       FROM products p JOIN orderdetails od ON p.productCode = od.productCode
+       GROUP BY p.productLine ORDER BY quantity DESC""",
+    """SELECT c.customerName, p.productName, SUM(od.quantityOrdered) AS quantity
+       FROM customers c JOIN orders o ON c.customerNumber = o.customerNumber
+       JOIN orderdetails od ON o.orderNumber = od.orderNumber JOIN products p ON od.productCode = p.productCode
+       GROUP BY c.customerNumber, p.productCode ORDER BY quantity DESC LIMIT 5""",
+    """SELECT c.customerName, COUNT(*) AS delayedOrders
+       FROM orders o JOIN customers c ON o.customerNumber = c.customerNumber
+       WHERE o.shippedDate > o.requiredDate GROUP BY c.customerName ORDER BY delayedOrders DESC LIMIT 5""",
+]
+
+
+def grow(engine, scale, current):
+    """
+    Adds copies of the original orders and order lines until there are `scale` copies.
+    """
+    with engine.begin() as connection:
+        for copy in range(current, scale):
+            offset = copy * ORDER_OFFSET
+            connection.execute(text(f"""
+                INSERT INTO orders SELECT orderNumber + {offset}, orderDate, requiredDate, shippedDate, status, comments, customerNumber
+                FROM orders WHERE orderNumber < {ORDER_OFFSET}"""))
+            connection.execute(text(f"""
+                INSERT INTO orderdetails SELECT orderNumber + {offset}, productCode, quantityOrdered, priceEach, orderLineNumber
+                FROM orderdetails WHERE orderNumber < {ORDER_OFFSET}"""))
+
+
+def append_order(engine):
+    with engine.begin() as connection:
+        new_number = connection.execute(text("SELECT MAX(orderNumber) + 1 FROM orders")).scalar()
+        connection.execute(text(f"""
+            INSERT INTO orders SELECT {new_number}, orderDate, requiredDate, shippedDate, status, comments, customerNumber
+            FROM orders WHERE orderNumber = 10100"""))
+        connection.execute(text(f"""
+            INSERT INTO orderdetails SELECT {new_number}, productCode, quantityOrdered, priceEach, orderLineNumber
+            FROM orderdetails WHERE orderNumber = 10100"""))
+
+
+def change_existing_lines(engine):
+    """
+    Changes below the watermark: an UPDATE, a DELETE and a new line on an existing order.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE orderdetails SET quantityOrdered = quantityOrdered + 10 WHERE orderNumber = 10101"))
+        connection.execute(text("DELETE FROM orderdetails WHERE orderNumber = 10102 AND orderLineNumber = 1"))
+        connection.execute(text("""
+            INSERT INTO orderdetails SELECT 10103, productCode, quantityOrdered, priceEach, 99
+            FROM orderdetails WHERE orderNumber = 10100 AND productCode NOT IN
+                (SELECT productCode FROM orderdetails WHERE orderNumber = 10103) LIMIT 1"""))
+
+
+def run(engine, sql):
+    with engine.connect() as connection:
+        return connection.execute(text(sql)).fetchall()
+
+
+def time_query(engine, sql, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(engine, sql)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def same_rows(left, right):
+    def normalize(rows):
+        return sorted(tuple(round(value, 2) if isinstance(value, float) else value for value in row) for row in rows)
+    return normalize(left) == normalize(right)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_local_engine()
+    current = 1
+    for scale in sorted(args.scales):
+        grow(engine, scale, current)
+        current = scale
+        lines = run(engine, "SELECT COUNT(*) FROM orderdetails")[0][0]
+
+        manager = SummaryTableManager(engine)
+        start = time.perf_counter()
+        manager.refresh(full=True)
+        build_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        manager.refresh()
+        idle_ms = (time.perf_counter() - start) * 1000
+        append_order(engine)
+        start = time.perf_counter()
+        manager.refresh()
+        delta_ms = (time.perf_counter() - start) * 1000
+        change_existing_lines(engine)
+        start = time.perf_counter()
+        manager.refresh()
+        changed_ms = (time.perf_counter() - start) * 1000
+        rebuilt = manager.get_stats()["inconsistent"]
+
+        print(f"\nscale {scale}x: {lines} order lines, full build {build_ms:.1f} ms, "
+              f"refresh without changes {idle_ms:.1f} ms, incremental refresh after one new order {delta_ms:.1f} ms, "
+              f"refresh after changing existing lines {changed_ms:.1f} ms ({rebuilt} summaries rebuilt)")
+        print(f"  {'query':<48} {'base ms':>10} {'summary ms':>11} {'speedup':>8}  results")
+        for sql in QUERIES:
+            label = " ".join(sql.split())[:46]
+            matched = manager.match(sql)
+            if matched is None:
+                print(f"  {label:<48} not rewritten")
+                continue
+            base_ms = time_query(engine, sql, args.repeat)
+            summary_ms = time_query(engine, matched[1], args.repeat)
+            match = "same" if same_rows(run(engine, sql), run(engine, matched[1])) else "DIFFERENT"
+            print(f"  {label:<48} {base_ms:>10.2f} {summary_ms:>11.2f} {base_ms / summary_ms:>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
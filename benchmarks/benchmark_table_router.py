@@ -0,0 +1,94 @@
+"""
+Offline accuracy / latency benchmark for the embedding table router against the
+keyword-based find_relevant_group. Uses database_dump.sql and
+database_table_descriptions.csv only - no database or LLM needed.
+
+    python benchmarks/benchmark_table_router.py
+"""
+import statistics
+import sys
+import time
+from os.path import join, dirname, abspath
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from few_shot_examples import order_few_shot
+from table_router import TableRouter
+from util import extract_referenced_tables
+
+# Keyword baseline, as find_relevant_group did it before routing
+TABLE_GROUPS = {
+    "Customer Order": ["customers", "orders", "orderdetails"],
+    "Order Details": ["orders", "orderdetails", "products", "productlines"],
+    "Sales Detailed Report": ["customers", "employees", "orders", "orderdetails", "products", "productlines"],
+}
+
+
+def keyword_route(question):
+    if "Customer" in question:
+        return TABLE_GROUPS["Customer Order"]
+    elif "Product" in question or "Order" in question:
+        return TABLE_GROUPS["Order Details"]
+    return TABLE_GROUPS["Sales Detailed Report"]
+
+
+LABELED_QUESTIONS = [
+    ("How many employees are there?", {"employees"}),
+    ("List all offices in the USA", {"offices"}),
+    ("Which city has the most offices?", {"offices"}),
+    ("What is the total amount of payments received in 2004?", {"payments"}),
+    ("Show the largest payment made by each customer", {"payments", "customers"}),
+    ("Which employees work in the Paris office?", {"employees", "offices"}),
+    ("Who does each employee report to?", {"employees"}),
+    ("List the product lines and their descriptions", {"productlines"}),
+    ("How many products are in each product line?", {"products", "productlines"}),
+    ("Which products have fewer than 100 units in stock?", {"products"}),
+    ("Which customers have a credit limit above 100000?", {"customers"}),
+    ("Which sales rep manages the most customers?", {"customers", "employees"}),
+    ("How many orders are still in process?", {"orders"}),
+    ("Which orders were cancelled and which customers placed them?", {"orders", "customers"}),
+] + [
+    (example["input"], extract_referenced_tables(example["query"])) for example in order_few_shot
+]
+
+
+def evaluate(name, route):
+    exact, covered, sizes = 0, 0, []
+    for question, expected in LABELED_QUESTIONS:
+        routed = set(route(question))
+        exact += routed == expected
+        covered += expected <= routed
+        sizes.append(len(routed))
+    total = len(LABELED_QUESTIONS)
+    print(f"{name:<18} exact {exact / total:6.1%} | recall {covered / total:6.1%} | avg tables {statistics.mean(sizes):.2f}")
+
+
+def timed_us(func, questions, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            func(question)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    start = time.perf_counter()
+    router = TableRouter.from_dump(embedding_model, join(ROOT, "database_dump.sql"), join(ROOT, "database_table_descriptions.csv"))
+    print(f"router build (8 table embeddings): {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    evaluate("keyword", keyword_route)
+    evaluate("embedding router", router.route)
+
+    questions = [question for question, _ in LABELED_QUESTIONS]
+    vectors = {question: router.embed_question(question) for question in questions}
+    p50, p99 = timed_us(lambda q: router.route(q, vectors[q]), questions)
+    print(f"\nroute (question vector given)     p50 {p50:8.1f} us | p99 {p99:8.1f} us")
+    p50, p99 = timed_us(router.route, questions, repeat=3)
+    print(f"route (including question embed)  p50 {p50:8.1f} us | p99 {p99:8.1f} us")
@@ -0,0 +1,41 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeSQLChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI. SQL-generation prompts are answered with the SQL
+    registered for the question they contain, answer prompts with a fixed sentence, after
+    sleeping `latency_s` to emulate the network round trip.
+    """
+
+    sql_by_question: Dict[str, str] = {}
+    default_sql: str = "SELECT COUNT(*) FROM customers;"
+    latency_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sql-chat-model"
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        prompt = "\n".join(str(message.content) for message in messages)
+
+        if "SQL Result:" in prompt:
+            content = "Here is the answer based on the SQL result."
+        else:
+            # Longest question first, so a question that contains another one still matches itself;
+            # the question is looked up in the last message, as few-shot examples precede it
+            question_text = str(messages[-1].content) if messages else prompt
+            matches = [question for question in sorted(self.sql_by_question, key=len, reverse=True) if question in question_text]
+            content = f"SQLQuery: {self.sql_by_question[matches[0]] if matches else self.default_sql}"
+
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))],
+                          llm_output={"token_usage": usage})
@@ -0,0 +1,321 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from sqlalchemy import String, Text, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from db_engine import is_internal_table
+from util import find_literals, resolve_column, table_aliases
+
+
+# Column-value index
+# Distinct values of low-cardinality string columns (at most COLUMN_VALUES_MAX_DISTINCT) and of
+# name-like ones (customerName, productLine, country, status, ...; up to
+# COLUMN_VALUES_MAX_NAME_DISTINCT) are held in memory with exact, prefix, trigram and acronym
+# lookups. The pipeline uses them twice:
+#   - values the question mentions are put into the SQL prompt ({column_values})
+#   - a string literal compared with an indexed column but not among its values ('United States'
+#     for customers.country) is replaced by the closest stored value ('USA') before execution
+# Tables are re-read only when their UPDATE_TIME (row count outside MySQL) changes.
+# Opt-in with COLUMN_VALUES=true.
+
+COLUMN_VALUES_ENABLED = os.getenv('COLUMN_VALUES', 'false').lower() in ('1', 'true', 'yes')
+
+NAME_COLUMN_PATTERN = re.compile(r"(name|title|line|country|city|state|status|type|category)$", re.IGNORECASE)
+STOPWORDS = frozenset("""a an and any are as at be by did do does for from has have how in is it list many me much
+    of on or our show that the their there to was were what when where which who whose with all""".split())
+MAX_VALUE_LENGTH = 100
+
+TABLE_VERSIONS_QUERY = text("""
+    SELECT TABLE_NAME, UPDATE_TIME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+""")
+
+
+def trigrams(value):
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def acronym(value):
+    """
+    Initials of a multi-word value ("united states of america" -> "usa"), else None.
+    """
+    words = [word for word in re.findall(r"\w+", value) if word not in ("of", "and", "the")]
+    return "".join(word[0] for word in words) if len(words) > 1 else None
+
+
+class ValueSnapshot:
+    """
+    Immutable lookup structures over {(table, column): {lowercased value: value}}; the index swaps
+    in a new snapshot after each refresh so lookups never take a lock.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.exact = {}
+        for key, values in columns.items():
+            for lower in values:
+                self.exact.setdefault(lower, []).append(key)
+        self.sorted = sorted(self.exact)
+        self.trigrams = {}
+        self.sizes = {}
+        self.acronyms = {}
+        for lower in self.exact:
+            grams = trigrams(lower)
+            self.sizes[lower] = len(grams)
+            for gram in grams:
+                self.trigrams.setdefault(gram, []).append(lower)
+            initials = acronym(lower)
+            if initials:
+                self.acronyms.setdefault(initials, []).append(lower)
+
+
+class ColumnValueIndex:
+    """
+    In-memory index of the distinct values of low-cardinality and name-like string columns.
+    Keys are lowercased (table, column) pairs; values keep their stored spelling.
+    """
+
+    def __init__(self, engine, max_distinct=None, max_name_distinct=None, fuzzy_threshold=None, prompt_limit=None):
+        self.engine = engine
+        self.max_distinct = max_distinct if max_distinct is not None else int(os.getenv('COLUMN_VALUES_MAX_DISTINCT', '100'))
+        self.max_name_distinct = max_name_distinct if max_name_distinct is not None else int(os.getenv('COLUMN_VALUES_MAX_NAME_DISTINCT', '10000'))
+        self.fuzzy_threshold = fuzzy_threshold if fuzzy_threshold is not None else float(os.getenv('COLUMN_VALUES_FUZZY_THRESHOLD', '0.6'))
+        self.prompt_limit = prompt_limit if prompt_limit is not None else int(os.getenv('COLUMN_VALUES_PROMPT_LIMIT', '10'))
+        self.snapshot = ValueSnapshot({})
+        self.names = {}
+        self.versions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {"refreshes": 0, "tables_read": 0, "refresh_errors": 0, "prompt_hints": 0,
+                      "corrections": 0, "build_s": 0.0}
+
+    # ------------------- Building -------------------
+
+    def table_versions(self):
+        """
+        UPDATE_TIME per table on MySQL, row counts elsewhere.
+        """
+        with self.engine.connect() as connection:
+            if self.engine.dialect.name == "mysql":
+                versions = dict(connection.execute(TABLE_VERSIONS_QUERY).fetchall())
+            else:
+                quote = self.engine.dialect.identifier_preparer.quote
+                versions = {table: connection.execute(text(f"SELECT COUNT(*) FROM {quote(table)}")).scalar()
+                            for table in inspect(connection).get_table_names()}
+        return {table: version for table, version in versions.items() if not is_internal_table(table)}
+
+    def read_table(self, connection, table):
+        """
+        {(table, column): {lower: value}} for the indexable columns of one table.
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        columns = {}
+        for column in inspect(connection).get_columns(table):
+            if not isinstance(column["type"], String) or isinstance(column["type"], Text):
+                continue
+            name = column["name"]
+            cap = self.max_name_distinct if NAME_COLUMN_PATTERN.search(name) else self.max_distinct
+            rows = connection.execute(text(
+                f"SELECT DISTINCT {quote(name)} FROM {quote(table)} WHERE {quote(name)} IS NOT NULL LIMIT {cap + 1}"
+            )).fetchall()
+            if len(rows) > cap:
+                continue
+            values = {str(row[0]).lower(): str(row[0]) for row in rows if 0 < len(str(row[0])) <= MAX_VALUE_LENGTH}
+            if values:
+                key = (table.lower(), name.lower())
+                columns[key] = values
+                self.names[key] = f"{table}.{name}"
+        return columns
+
+    def refresh(self):
+        """
+        Re-reads the tables whose version changed (and drops dropped ones). Tables without an
+        UPDATE_TIME are re-read every time. Returns the set of re-read tables.
+        """
+        start = time.perf_counter()
+        versions = self.table_versions()
+        changed = {table for table, version in versions.items()
+                   if table not in self.versions or version is None or version != self.versions[table]}
+        kept = {table.lower() for table in set(versions) - changed}
+        if not changed and len(kept) == len(self.versions):
+            self.versions = versions
+            return set()
+
+        columns = {key: values for key, values in self.snapshot.columns.items() if key[0] in kept}
+        with self.engine.connect() as connection:
+            for table in sorted(changed):
+                columns.update(self.read_table(connection, table))
+        snapshot = ValueSnapshot(columns)
+        with self._lock:
+            self.snapshot = snapshot
+            self.versions = versions
+            self.stats["refreshes"] += 1
+            self.stats["tables_read"] += len(changed)
+            self.stats["build_s"] += time.perf_counter() - start
+        return changed
+
+    def start_refresh_thread(self, interval=None):
+        """
+        Refreshes every COLUMN_VALUES_REFRESH_INTERVAL seconds in a daemon thread, starting with the initial build.
+        """
+        interval = interval or float(os.getenv('COLUMN_VALUES_REFRESH_INTERVAL', '300'))
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except SQLAlchemyError as e:
+                    self.stats["refresh_errors"] += 1
+                    print(f"Column value index refresh failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        threading.Thread(target=loop, name="column-values-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------- Lookups -------------------
+
+    def _key(self, column):
+        return (column[0].lower(), column[1].lower()) if column else None
+
+    def _results(self, snapshot, lowers, key):
+        results = []
+        for lower in lowers:
+            for column in ([key] if key else snapshot.exact[lower]):
+                if lower in snapshot.columns.get(column, ()):
+                    results.append((self.names[column], snapshot.columns[column][lower]))
+        return results
+
+    def exact(self, value, column=None):
+        """
+        [(table.column, stored value)] equal to value ignoring case, optionally within one (table, column).
+        """
+        snapshot = self.snapshot
+        lower = value.lower()
+        return self._results(snapshot, [lower] if lower in snapshot.exact else [], self._key(column))
+
+    def prefix(self, value, column=None, limit=10):
+        snapshot = self.snapshot
+        lower = value.lower()
+        position = bisect_left(snapshot.sorted, lower)
+        matches = []
+        while position < len(snapshot.sorted) and snapshot.sorted[position].startswith(lower) and len(matches) < limit * 4:
+            matches.append(snapshot.sorted[position])
+            position += 1
+        return self._results(snapshot, matches, self._key(column))[:limit]
+
+    def fuzzy(self, value, column=None, limit=5, threshold=None):
+        """
+        [(score, table.column, stored value)] best first: trigram Dice similarity, with acronyms
+        ("United States" -> "USA", "UK" -> "United Kingdom") scored 0.9.
+        """
+        snapshot = self.snapshot
+        key = self._key(column)
+        threshold = self.fuzzy_threshold if threshold is None else threshold
+        lower = value.lower()
+        grams = trigrams(lower)
+        shared = Counter(candidate for gram in grams for candidate in snapshot.trigrams.get(gram, ()))
+        scores = {candidate: 2 * count / (len(grams) + snapshot.sizes[candidate]) for candidate, count in shared.items()}
+
+        initials = acronym(lower)
+        for candidate in snapshot.acronyms.get(re.sub(r"\W", "", lower), ()):
+            scores[candidate] = max(scores.get(candidate, 0), 0.9)
+        if initials and len(initials) > 1:
+            # Stored acronyms, also when they extend the initials ("us" -> "USA")
+            position = bisect_left(snapshot.sorted, initials)
+            while position < len(snapshot.sorted) and snapshot.sorted[position].startswith(initials):
+                candidate = snapshot.sorted[position]
+                if len(candidate) <= len(initials) + 1 and candidate.isalpha():
+                    scores[candidate] = max(scores.get(candidate, 0), 0.9)
+                position += 1
+
+        ranked = sorted(((score, candidate) for candidate, score in scores.items() if score >= threshold), reverse=True)
+        results = []
+        for score, candidate in ranked:
+            for name, stored in self._results(snapshot, [candidate], key):
+                results.append((round(score, 3), name, stored))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    # ------------------- Pipeline hooks -------------------
+
+    def match_question(self, question):
+        """
+        [(table.column, stored value)] for the phrases of the question that are column values:
+        exact matches of 1-4 word phrases first (longest first), then fuzzy matches of the words left.
+        """
+        words = re.findall(r"\w[\w'&.-]*\w|\w", question)
+        covered = [False] * len(words)
+        found = []
+        for size in range(min(4, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                span = range(start, start + size)
+                phrase = " ".join(words[start:start + size])
+                if any(covered[i] for i in span) or all(words[i].lower() in STOPWORDS for i in span):
+                    continue
+                matches = self.exact(phrase)
+                if not matches and size > 1:
+                    matches = [(name, stored) for _, name, stored in self.fuzzy(phrase, limit=3, threshold=0.85)]
+                if matches:
+                    found += matches
+                    for i in span:
+                        covered[i] = True
+        for i, word in enumerate(words):
+            if not covered[i] and len(word) > 3 and word.lower() not in STOPWORDS:
+                found += [(name, stored) for _, name, stored in self.fuzzy(word, limit=2, threshold=0.75)]
+        return list(dict.fromkeys(found))[:self.prompt_limit]
+
+    def prompt_hint(self, question):
+        """
+        Text for the {column_values} prompt variable: stored values the question refers to, by column.
+        """
+        by_column = {}
+        for name, stored in self.match_question(question):
+            by_column.setdefault(name, []).append(stored)
+        if not by_column:
+            return ""
+        self.stats["prompt_hints"] += 1
+        lines = [f"- {name}: " + ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+                 for name, values in by_column.items()]
+        return "Stored values matching the question (use them verbatim in filters):\n" + "\n".join(lines)
+
+    def correct_literals(self, sql_query):
+        """
+        Replaces string literals compared with an indexed column that are not among its values by
+        the closest stored value, when one clearly wins. Returns the (possibly) corrected SQL.
+        """
+        snapshot = self.snapshot
+        if not snapshot.columns:
+            return sql_query
+        aliases = table_aliases(sql_query)
+        replacements = []
+        for start, end, kind, value in find_literals(sql_query):
+            if kind != "string":
+                continue
+            column = resolve_column(sql_query, start, aliases)
+            key = self._key(column)
+            if key not in snapshot.columns or value.lower() in snapshot.columns[key]:
+                continue
+            candidates = self.fuzzy(value, column, limit=2)
+            if candidates and (len(candidates) == 1 or candidates[0][0] - candidates[1][0] >= 0.1):
+                replacements.append((start, end, "'" + candidates[0][2].replace("'", "''") + "'"))
+        for start, end, literal in reversed(replacements):
+            sql_query = sql_query[:start] + literal + sql_query[end:]
+        if replacements:
+            with self._lock:
+                self.stats["corrections"] += len(replacements)
+        return sql_query
+
+    def get_stats(self):
+        snapshot = self.snapshot
+        return dict(self.stats, columns=len(snapshot.columns), values=sum(len(v) for v in snapshot.columns.values()))
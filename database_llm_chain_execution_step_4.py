@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+from sql_result_cache import CachedQuerySQLDataBaseTool
 from langchain_core.runnables import RunnableLambda
 from util import extract_sql_query
 
@@ -24,7 +24,7 @@ sql_chain = create_sql_query_chain(llm, db)
 clean_sql_chain = sql_chain | RunnableLambda(lambda x: extract_sql_query(x)) # type: ignore
 
 # Execute Query - This will execute the SQL Query and give result
-execute_query = QuerySQLDataBaseTool(db=db)
+execute_query = CachedQuerySQLDataBaseTool(db=db)
 
 # Chain the Query and Execute Query
 chain = clean_sql_chain | execute_query 
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+from sql_result_cache import CachedQuerySQLDataBaseTool
 # Part 2 - Passing the result & question to LLM with prompt
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
@@ -32,7 +32,7 @@ sql_chain = create_sql_query_chain(llm, db)
 clean_sql_chain = sql_chain | RunnableLambda(lambda x: extract_sql_query(x)) # type: ignore
 
 # Execute Query - This will execute the SQL Query and give result
-execute_query = QuerySQLDataBaseTool(db=db)
+execute_query = CachedQuerySQLDataBaseTool(db=db)
 
 # Custom Prompt
 answer_prompt = PromptTemplate.from_template(
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+from sql_result_cache import CachedQuerySQLDataBaseTool
 # Part 2 - Passing the result & question to LLM with prompt
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
@@ -17,8 +17,7 @@ from util import extract_sql_query
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, FewShotChatMessagePromptTemplate
 from few_shot_examples import order_few_shot
 # Part 4 - Dynamic Few Shot Learning
-from langchain_community.vectorstores import FAISS
-from langchain_core.example_selectors import SemanticSimilarityExampleSelector
+from few_shot_index import load_example_selector
 #from langchain_openai import OpenAIEmbeddings
 from langchain_huggingface import HuggingFaceEmbeddings
 
@@ -38,7 +37,7 @@ sql_chain = create_sql_query_chain(llm, db)
 clean_sql_chain = sql_chain | RunnableLambda(lambda x: extract_sql_query(x)) # type: ignore
 
 # Execute Query - This will execute the SQL Query and give result
-execute_query = QuerySQLDataBaseTool(db=db)
+execute_query = CachedQuerySQLDataBaseTool(db=db)
 
 # Custom Prompt
 answer_prompt = PromptTemplate.from_template(
@@ -70,12 +69,13 @@ example_prompt = ChatPromptTemplate.from_messages(
  )
 
 # Dynamic Few Shot Learning
-faiss_vectorstore = FAISS
-embedding_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-dynamic_example_selector = SemanticSimilarityExampleSelector.from_examples(
+embedding_model_name = "all-MiniLM-L6-v2"
+embedding_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+# The FAISS index is persisted and only re-embedded when the examples or the model change
+dynamic_example_selector = load_example_selector(
     order_few_shot,
     embedding_model,
-    faiss_vectorstore,
+    embedding_model_name,
     k=2,
     input_keys=["input"]
 )
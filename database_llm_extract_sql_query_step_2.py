@@ -7,7 +7,6 @@ from langchain_openai import ChatOpenAI
 from langchain_community.utilities.sql_database import SQLDatabase
 from langchain.chains import create_sql_query_chain
 from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-from langchain_core.runnables import RunnableLambda
 from util import extract_sql_query
 
 
@@ -23,7 +22,7 @@ llm = ChatOpenAI(temperature=0, model=os.environ.get('OPENAI_MODEL'), api_key=os
 
 # Query Chain
 sql_chain = create_sql_query_chain(llm, db)
-clean_sql_chain = sql_chain | RunnableLambda(lambda x: x.replace('```', '').replace('sql', ''))
+clean_sql_chain = sql_chain  # code fences and prefixes are handled by extract_sql_query
 
 # Query - This will return the SQL Query
 clean_response = clean_sql_chain.invoke({"question":"How many employees are there?"})
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from os.path import join, dirname
+from dotenv import load_dotenv
+
+from langchain_community.utilities.sql_database import SQLDatabase
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.pool import QueuePool
+
+from lazy_startup import LAZY_STARTUP
+
+# Loading the environment variables
+dotenv_path = join(dirname(__file__), '.env')
+load_dotenv(dotenv_path)
+
+# Database connection parameters
+DATABASE_URI = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+
+_engine = None
+_database = None
+_engine_lock = threading.RLock()
+
+# Tables the application maintains in the database itself (summary_tables.py); they are
+# hidden from SQLDatabase, so they never reach the prompt, the table router or sql_repair
+INTERNAL_TABLE_PREFIX = "summary_"
+
+pool_stats = {"checkouts": 0, "total_wait_s": 0.0, "max_wait_s": 0.0}
+_pool_stats_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waits for a connection,
+    including the time to open a new one when the pool grows.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            with _pool_stats_lock:
+                pool_stats["checkouts"] += 1
+                pool_stats["total_wait_s"] += wait
+                pool_stats["max_wait_s"] = max(pool_stats["max_wait_s"], wait)
+
+
+def get_engine():
+    """
+    Returns the process-wide SQLAlchemy engine shared by SQLDatabase and the schema helpers.
+    Pool behaviour is configured with DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT and DB_POOL_PRE_PING.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    DATABASE_URI,
+                    poolclass=TimedQueuePool,
+                    pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+                    max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+                    pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '3600')),
+                    pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                    pool_pre_ping=os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+                )
+    return _engine
+
+
+def use_engine(engine):
+    """
+    Makes get_engine() return `engine` (e.g. the local SQLite copy of the offline benchmarks).
+    Call it before importing the modules that take the engine at import, such as main.py.
+    """
+    global _engine
+    with _engine_lock:
+        _engine = engine
+
+
+def is_internal_table(table):
+    return table.lower().startswith(INTERNAL_TABLE_PREFIX)
+
+
+def create_database(engine, **kwargs):
+    """
+    SQLDatabase over the application's tables, without the internal ones.
+    """
+    internal = [table for table in inspect(engine).get_table_names() if is_internal_table(table)]
+    return SQLDatabase(engine, ignore_tables=internal or None, **kwargs)
+
+
+class LazySQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that connects and reflects the table names on first use instead of at
+    construction. Passes isinstance checks (e.g. QuerySQLDataBaseTool's db field).
+    """
+
+    def __init__(self, engine_factory, **kwargs):
+        self.__dict__["_lazy_init"] = (engine_factory, kwargs)
+
+    @property
+    def dialect(self) -> str:
+        # Known from the engine URL, without connecting
+        init = self.__dict__.get("_lazy_init")
+        return (init[0]() if init else self._engine).dialect.name
+
+    def __getattr__(self, name):
+        # Only reached for attributes SQLDatabase.__init__ has not set yet
+        if name.startswith("__"):
+            raise AttributeError(name)
+        with _engine_lock:
+            if name in self.__dict__:
+                return self.__dict__[name]
+            init = self.__dict__.pop("_lazy_init", None)
+            if init is None:
+                raise AttributeError(name)
+            engine_factory, kwargs = init
+            try:
+                engine = engine_factory()
+                internal = [table for table in inspect(engine).get_table_names() if is_internal_table(table)]
+                SQLDatabase.__init__(self, engine, ignore_tables=internal or None, **kwargs)
+            except Exception:
+                self.__dict__["_lazy_init"] = init
+                raise
+        return getattr(self, name)
+
+    def load(self):
+        return self._all_tables
+
+
+def get_database():
+    """
+    Returns a SQLDatabase bound to the shared engine; with LAZY_STARTUP it connects on first use.
+    """
+    global _database
+    if _database is None:
+        with _engine_lock:
+            if _database is None:
+                _database = LazySQLDatabase(get_engine) if LAZY_STARTUP else create_database(get_engine())
+    return _database
+
+
+def get_pool_stats():
+    pool = get_engine().pool
+    with _pool_stats_lock:
+        stats = dict(pool_stats)
+    stats["avg_wait_s"] = stats["total_wait_s"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    stats.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())  # type: ignore
+    return stats
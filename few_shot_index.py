@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from os.path import join, dirname, exists
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.example_selectors import SemanticSimilarityExampleSelector
+
+
+# Persisted few-shot index
+# The FAISS index, the example metadata and the raw embeddings are saved under
+# FEW_SHOT_INDEX_DIR, keyed by a hash of the example set and the embedding model name.
+# A matching hash loads everything from disk (memory-mapped where FAISS/numpy allow);
+# otherwise only new or changed examples are embedded and the index is rebuilt.
+FEW_SHOT_INDEX_DIR = os.getenv('FEW_SHOT_INDEX_DIR', join(dirname(__file__), '.few_shot_index'))
+
+
+def example_to_text(example, input_keys):
+    """
+    Same text SemanticSimilarityExampleSelector.from_examples embeds for an example.
+    """
+    values = {key: example[key] for key in input_keys} if input_keys else example
+    return " ".join(values[key] for key in sorted(values))
+
+
+def hash_example(example, input_keys, model_name):
+    payload = json.dumps({"example": example, "input_keys": input_keys, "model": model_name}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def hash_example_set(example_hashes, model_name):
+    return hashlib.sha256((model_name + "\n" + "\n".join(example_hashes)).encode("utf-8")).hexdigest()
+
+
+def _index_paths(index_dir, name):
+    base = join(index_dir, name)
+    return {
+        "manifest": base + ".manifest.json",
+        "index": base + ".faiss",
+        "embeddings": base + ".embeddings.npy",
+    }
+
+
+def _read_manifest(paths):
+    if not exists(paths["manifest"]):
+        return None
+    with open(paths["manifest"]) as manifest_file:
+        return json.load(manifest_file)
+
+
+def _read_faiss_index(path):
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        # Not every index type supports memory-mapped reads
+        return faiss.read_index(path)
+
+
+def _build_vectorstore(examples, texts, index, embedding_model):
+    docstore = InMemoryDocstore({
+        str(i): Document(page_content=text, metadata=example)
+        for i, (example, text) in enumerate(zip(examples, texts))
+    })
+    return FAISS(
+        embedding_function=embedding_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id={i: str(i) for i in range(len(examples))},
+    )
+
+
+def load_example_selector(examples, embedding_model, model_name, k=2, input_keys=None,
+                          name="few_shot", index_dir=None, stats=None):
+    """
+    Returns a SemanticSimilarityExampleSelector equivalent to
+    SemanticSimilarityExampleSelector.from_examples(examples, embedding_model, FAISS, k=k, input_keys=input_keys),
+    reusing the persisted index when the example set and model are unchanged.
+    """
+    index_dir = index_dir or FEW_SHOT_INDEX_DIR
+    paths = _index_paths(index_dir, name)
+    texts = [example_to_text(example, input_keys) for example in examples]
+    example_hashes = [hash_example(example, input_keys, model_name) for example in examples]
+    set_hash = hash_example_set(example_hashes, model_name)
+    stats = stats if stats is not None else {}
+
+    manifest = _read_manifest(paths)
+    if manifest and manifest["set_hash"] == set_hash and exists(paths["index"]):
+        index = _read_faiss_index(paths["index"])
+        stats.update(source="disk", embedded=0)
+        vectorstore = _build_vectorstore(examples, texts, index, embedding_model)
+        return SemanticSimilarityExampleSelector(vectorstore=vectorstore, k=k, input_keys=input_keys)
+
+    # Reuse stored embeddings for examples that are unchanged since the last save
+    previous = {}
+    if manifest and manifest.get("model") == model_name and exists(paths["embeddings"]):
+        stored = np.load(paths["embeddings"], mmap_mode="r")
+        previous = {example_hash: stored[i] for i, example_hash in enumerate(manifest["example_hashes"])}
+
+    missing = [i for i, example_hash in enumerate(example_hashes) if example_hash not in previous]
+    new_vectors = embedding_model.embed_documents([texts[i] for i in missing]) if missing else []
+    fresh = dict(zip(missing, new_vectors))
+    vectors = np.array(
+        [fresh[i] if i in fresh else previous[example_hashes[i]] for i in range(len(examples))],
+        dtype=np.float32,
+    )
+
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(paths["embeddings"], vectors)
+    faiss.write_index(index, paths["index"])
+    with open(paths["manifest"], "w") as manifest_file:
+        json.dump({"set_hash": set_hash, "model": model_name, "example_hashes": example_hashes}, manifest_file)
+
+    stats.update(source="rebuilt", embedded=len(missing))
+    vectorstore = _build_vectorstore(examples, texts, index, embedding_model)
+    return SemanticSimilarityExampleSelector(vectorstore=vectorstore, k=k, input_keys=input_keys)
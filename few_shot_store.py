@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from os.path import join, dirname, exists
+
+import faiss
+import numpy as np
+from langchain_core.example_selectors import BaseExampleSelector
+
+from few_shot_index import example_to_text
+
+
+# Few-shot example store
+# Question/SQL examples live on disk under FEW_SHOT_STORE_DIR, so the set can grow to
+# thousands of pairs across domains without being hard-coded:
+#   examples.jsonl   one record per example ({"example", "domain", "source", "added_at"}), append-only
+#   embeddings.f32   normalized float32 embeddings in the same order, append-only
+#   index.faiss      HNSW index (inner product) saved every FEW_SHOT_SAVE_EVERY additions;
+#                    vectors appended after the last save are re-added when the store is opened
+#   manifest.json    embedding model name and dimension
+# New examples are added to the index in place. An example whose embedding is within
+# FEW_SHOT_DEDUP_SIMILARITY of a stored one is dropped as a near-duplicate.
+
+FEW_SHOT_STORE_ENABLED = os.getenv('FEW_SHOT_STORE', 'false').lower() in ('1', 'true', 'yes')
+FEW_SHOT_LEARN_ANSWERED = os.getenv('FEW_SHOT_LEARN_ANSWERED', 'false').lower() in ('1', 'true', 'yes')
+FEW_SHOT_STORE_DIR = os.getenv('FEW_SHOT_STORE_DIR', join(dirname(__file__), '.few_shot_store'))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class FewShotExampleStore(BaseExampleSelector):
+    """
+    Disk-backed example selector with an HNSW index. Drop-in for SemanticSimilarityExampleSelector
+    (select_examples / add_example) that also takes incremental, deduplicated additions.
+    """
+
+    def __init__(self, embedding_model, model_name, store_dir=None, k=None, input_keys=None,
+                 dedup_similarity=None, hnsw_m=32, ef_search=None, save_every=None):
+        self.embedding_model = embedding_model
+        self.model_name = model_name
+        self.store_dir = store_dir or FEW_SHOT_STORE_DIR
+        self.k = k if k is not None else int(os.getenv('FEW_SHOT_K', '2'))
+        self.input_keys = input_keys or ["input"]
+        self.dedup_similarity = dedup_similarity if dedup_similarity is not None else float(os.getenv('FEW_SHOT_DEDUP_SIMILARITY', '0.95'))
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search if ef_search is not None else int(os.getenv('FEW_SHOT_EF_SEARCH', '64'))
+        self.save_every = save_every if save_every is not None else int(os.getenv('FEW_SHOT_SAVE_EVERY', '1000'))
+        self.paths = {name: join(self.store_dir, file_name) for name, file_name in (
+            ("examples", "examples.jsonl"), ("embeddings", "embeddings.f32"),
+            ("index", "index.faiss"), ("manifest", "manifest.json"))}
+        self.records = []
+        self.index = None
+        self.dim = None
+        self._hashes = set()
+        self._unsaved = 0
+        self._lock = threading.RLock()
+        self.stats = {"added": 0, "dropped_duplicates": 0, "selections": 0, "select_s": 0.0, "replayed": 0}
+        self._open()
+
+    def _hash(self, example):
+        return hashlib.sha256(json.dumps(example, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _new_index(self, dim):
+        index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = self.ef_search
+        return index
+
+    def _open(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        manifest = None
+        if exists(self.paths["manifest"]):
+            with open(self.paths["manifest"]) as manifest_file:
+                manifest = json.load(manifest_file)
+        if exists(self.paths["examples"]):
+            with open(self.paths["examples"]) as examples_file:
+                self.records = [json.loads(line) for line in examples_file if line.strip()]
+
+        if manifest is None or manifest["model"] != self.model_name:
+            # Different embedding model (or a fresh store): re-embed whatever examples are on disk
+            records, self.records = self.records, []
+            for name in ("examples", "embeddings", "index"):
+                if exists(self.paths[name]):
+                    os.remove(self.paths[name])
+            if records:
+                self._append(records, _normalize(self.embedding_model.embed_documents(
+                    [example_to_text(record["example"], self.input_keys) for record in records])))
+                self.save()
+            return
+
+        self.dim = manifest["dim"]
+        vectors = np.fromfile(self.paths["embeddings"], dtype=np.float32).reshape(-1, self.dim) \
+            if exists(self.paths["embeddings"]) else np.zeros((0, self.dim), dtype=np.float32)
+        count = min(len(self.records), len(vectors))
+        if count != len(self.records) or count != len(vectors):
+            # An interrupted append left one file longer than the other
+            self.records, vectors = self.records[:count], vectors[:count]
+            self._rewrite(vectors)
+        self._hashes = {self._hash(record["example"]) for record in self.records}
+
+        self.index = faiss.read_index(self.paths["index"]) if exists(self.paths["index"]) else None
+        if self.index is None or self.index.ntotal > count:
+            self.index = self._new_index(self.dim)
+        if isinstance(self.index, faiss.IndexHNSW):
+            self.index.hnsw.efSearch = self.ef_search
+        if self.index.ntotal < count:
+            self.stats["replayed"] = count - self.index.ntotal
+            self.index.add(np.ascontiguousarray(vectors[self.index.ntotal:]))
+            self.save()
+
+    def _rewrite(self, vectors):
+        with open(self.paths["examples"], "w") as examples_file:
+            examples_file.writelines(json.dumps(record) + "\n" for record in self.records)
+        vectors.astype(np.float32).tofile(self.paths["embeddings"])
+
+    def _append(self, records, vectors):
+        if self.index is None:
+            self.dim = vectors.shape[1]
+            self.index = self._new_index(self.dim)
+            with open(self.paths["manifest"], "w") as manifest_file:
+                json.dump({"model": self.model_name, "dim": self.dim}, manifest_file)
+        with open(self.paths["examples"], "a") as examples_file:
+            examples_file.writelines(json.dumps(record) + "\n" for record in records)
+        with open(self.paths["embeddings"], "ab") as embeddings_file:
+            embeddings_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        self.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        self.records.extend(records)
+        self._hashes.update(self._hash(record["example"]) for record in records)
+        self._unsaved += len(records)
+        if self._unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        """
+        Writes the index so the next open does not have to re-add the appended vectors.
+        """
+        with self._lock:
+            if self.index is None:
+                return
+            temporary = self.paths["index"] + ".tmp"
+            faiss.write_index(self.index, temporary)
+            os.replace(temporary, self.paths["index"])
+            self._unsaved = 0
+
+    def add_examples(self, examples, domain=None, source="seed", chunk_size=1000):
+        """
+        Adds examples, dropping exact and near-duplicates (of stored examples and of each other).
+        Returns the number added.
+        """
+        with self._lock:
+            added = 0
+            for offset in range(0, len(examples), chunk_size):
+                added += self._add_chunk(examples[offset:offset + chunk_size], domain, source)
+            return added
+
+    def _add_chunk(self, examples, domain, source):
+        candidates = [example for example in examples if self._hash(example) not in self._hashes]
+        if not candidates:
+            self.stats["dropped_duplicates"] += len(examples)
+            return 0
+        vectors = _normalize(self.embedding_model.embed_documents(
+            [example_to_text(example, self.input_keys) for example in candidates]))
+
+        keep = np.ones(len(candidates), dtype=bool)
+        if self.index is not None and self.index.ntotal:
+            similarities, _ = self.index.search(vectors, 1)
+            keep &= similarities[:, 0] < self.dedup_similarity
+        # Within the chunk, a later example close to a kept earlier one is dropped
+        within = vectors @ vectors.T
+        for i in range(1, len(candidates)):
+            if keep[i] and (within[i, :i][keep[:i]] >= self.dedup_similarity).any():
+                keep[i] = False
+
+        now = time.time()
+        records = [{"example": example, "domain": domain, "source": source, "added_at": now}
+                   for example, kept in zip(candidates, keep) if kept]
+        if records:
+            self._append(records, vectors[keep])
+        self.stats["added"] += len(records)
+        self.stats["dropped_duplicates"] += len(examples) - len(records)
+        return len(records)
+
+    def add_example(self, example, domain=None, source="verified"):
+        return self.add_examples([example], domain=domain, source=source)
+
+    def add_verified(self, question, sql_query, domain=None):
+        """
+        Adds a question/SQL pair confirmed in production. Returns True unless it was a duplicate.
+        """
+        return self.add_example({"input": question, "query": sql_query}, domain=domain) > 0
+
+    def seed(self, examples_by_domain):
+        """
+        Loads the built-in examples (SqlSamples.examples) into an empty store.
+        """
+        if self.records:
+            return 0
+        return sum(self.add_examples(examples, domain=domain) for domain, examples in examples_by_domain.items())
+
+    def observe(self, state):
+        """
+        Takes the chain state after execution and returns it unchanged, adding the question and
+        its SQL as an example when the query ran and returned rows.
+        """
+        result = str(state.get("sql_result", ""))
+        if not result.startswith("Error:") and result.strip() not in ("", "[]"):
+            self.add_verified(state["question"], state["sql_query"])
+        return state
+
+    def select_examples(self, input_variables, question_vector=None):
+        """
+        The k examples closest to the input. question_vector, when given, is the embedding of
+        the input text (as the semantic answer cache computed it) and is not recomputed.
+        """
+        start = time.perf_counter()
+        if question_vector is None:
+            values = {key: input_variables[key] for key in self.input_keys} if self.input_keys else input_variables
+            question_vector = self.embedding_model.embed_query(" ".join(values[key] for key in sorted(values)))
+        vector = _normalize([question_vector])
+        with self._lock:
+            if self.index is None or not self.index.ntotal:
+                return []
+            _, ids = self.index.search(vector, min(self.k, self.index.ntotal))
+            selected = [self.records[i]["example"] for i in ids[0] if i >= 0]
+            self.stats["selections"] += 1
+            self.stats["select_s"] += time.perf_counter() - start
+        return selected
+
+    def get_stats(self):
+        with self._lock:
+            selections = self.stats["selections"]
+            return dict(self.stats, examples=len(self.records),
+                        avg_select_s=self.stats["select_s"] / selections if selections else 0.0)
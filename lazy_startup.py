@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.runnables import Runnable
+
+
+# Lazy startup
+# With LAZY_STARTUP set, main.py builds its chains around placeholders: the OpenAI client,
+# the sentence-transformers model, the table router and the database connection are only
+# created (and their packages imported) the first time a request needs them.
+# STARTUP_WARM_UP additionally loads them in a background thread right after import, so the
+# first request finds them ready without blocking startup.
+
+LAZY_STARTUP = os.getenv('LAZY_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+STARTUP_WARM_UP = os.getenv('STARTUP_WARM_UP', 'false').lower() in ('1', 'true', 'yes')
+
+# name -> seconds spent building each lazy object, for the startup benchmark
+load_times = {}
+
+
+class LazyProxy:
+    """
+    Stands in for the object returned by factory() and builds it on first attribute access.
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "lazy")
+        self._target = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    start = time.perf_counter()
+                    self._target = self._factory()
+                    load_times[self._name] = time.perf_counter() - start
+        return self._target
+
+    def is_loaded(self):
+        return self._target is not None
+
+    def override(self, target):
+        """
+        Uses target instead of building it (e.g. a fake model in the offline benchmarks).
+        """
+        with self._lock:
+            self._target = target
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+class LazyRunnable(Runnable):
+    """
+    Runnable wrapper for a model built on first use, so it can be piped and bound (as
+    the query chain in main.py does with stop words) before the model exists.
+    """
+
+    def __init__(self, factory, name=None):
+        self.proxy = LazyProxy(factory, name)
+
+    @property
+    def InputType(self) -> Any:
+        return Any
+
+    @property
+    def OutputType(self) -> Any:
+        return Any
+
+    def load(self):
+        return self.proxy.load()
+
+    def is_loaded(self):
+        return self.proxy.is_loaded()
+
+    def override(self, target):
+        self.proxy.override(target)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.load().invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.load().ainvoke(input, config, **kwargs)
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        return self.load().batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        return await self.load().abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.load().stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.load().astream(input, config, **kwargs):
+            yield chunk
+
+
+def warm_up(*loaders):
+    """
+    Calls each loader in turn, logging failures instead of raising: a request retries the load.
+    """
+    for loader in loaders:
+        try:
+            loader()
+        except Exception as e:
+            print(f"Warm-up of {getattr(loader, '__qualname__', loader)} failed: {e}")
+
+
+def start_warm_up(*loaders):
+    """
+    Runs warm_up(*loaders) in a daemon thread and returns the thread.
+    """
+    thread = threading.Thread(target=warm_up, args=loaders, name="startup-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,118 @@
+import re
+from os.path import join, dirname
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from util import SQL_TOKEN_PATTERN, split_sql_statements
+
+
+# Local database loaded from database_dump.sql
+# Translates the MySQL dump into statements SQLite accepts (comments, CREATE DATABASE / USE,
+# backslash escapes in string literals) so the pipeline can run without a MySQL server.
+
+DUMP_PATH = join(dirname(__file__), 'database_dump.sql')
+
+# Text columns compare case-insensitively, like MySQL's default collations
+TEXT_COLUMN_PATTERN = re.compile(r"^(\s*\w+\s+(?:(?:var)?char\(\d+\)|(?:tiny|medium|long)?text))", re.IGNORECASE | re.MULTILINE)
+
+# With exact_decimals, DECIMAL(p,s) columns are declared DECIMAL_AS_TEXT(p,s): TEXT affinity keeps
+# the exact value ('227600.00') instead of a REAL (227600, 8853839.229999999 once summed)
+DECIMAL_COLUMN_PATTERN = re.compile(r"^(\s*\w+\s+)(?:decimal|numeric)(\(\s*\d+\s*,\s*\d+\s*\))", re.IGNORECASE | re.MULTILINE)
+DECIMAL_TEXT_TYPE = "DECIMAL_AS_TEXT"
+
+MYSQL_ESCAPES = {"\\'": "''", '\\"': '"', "\\n": "\n", "\\r": "\r", "\\t": "\t", "\\0": "", "\\\\": "\\"}
+
+
+def translate_string_literal(literal):
+    """
+    Converts a MySQL single-quoted literal with backslash escapes into a standard SQL literal.
+    """
+    body = re.sub(r"\\.", lambda m: MYSQL_ESCAPES.get(m.group(0), m.group(0)[1]), literal[1:-1])
+    return f"'{body}'"
+
+
+def translate_mysql_statement(statement, exact_decimals=False):
+    """
+    Rewrites one MySQL statement for SQLite, or returns None when it should be skipped.
+    """
+    parts = []
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(statement):
+        parts.append(statement[position:match.start()])
+        token = match.group(0)
+        if match.group("string") and token.startswith("'"):
+            parts.append(translate_string_literal(token))
+        elif match.group("comment"):
+            parts.append(" ")
+        else:
+            parts.append(token)
+        position = match.end()
+    parts.append(statement[position:])
+    statement = "".join(parts).strip()
+
+    if not statement or re.match(r"(CREATE DATABASE|USE)\b", statement, re.IGNORECASE):
+        return None
+    # Table options such as ENGINE=InnoDB DEFAULT CHARSET=... after the closing parenthesis
+    statement = re.sub(r"\)\s*(ENGINE|DEFAULT CHARSET|CHARSET|COLLATE|AUTO_INCREMENT)\b[^()]*$", ")", statement, flags=re.IGNORECASE)
+    if re.match(r"CREATE TABLE\b", statement, re.IGNORECASE):
+        statement = TEXT_COLUMN_PATTERN.sub(r"\1 COLLATE NOCASE", statement)
+        if exact_decimals:
+            statement = DECIMAL_COLUMN_PATTERN.sub(rf"\1{DECIMAL_TEXT_TYPE}\2", statement)
+    return statement
+
+
+def read_dump_statements(dump_path=None, exact_decimals=False):
+    with open(dump_path or DUMP_PATH, encoding="utf-8") as dump_file:
+        dump = dump_file.read()
+    statements = (translate_mysql_statement(statement["text"], exact_decimals) for statement in split_sql_statements(dump))
+    return [statement for statement in statements if statement]
+
+
+def decimal_columns(connection):
+    """
+    {(table, column): scale} of the DECIMAL_AS_TEXT columns of a SQLite database.
+    """
+    columns = {}
+    tables = [row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in tables:
+        for row in connection.exec_driver_sql(f'PRAGMA table_info("{table}")'):
+            match = re.match(rf"{DECIMAL_TEXT_TYPE}\(\s*\d+\s*,\s*(\d+)\s*\)", row[2], re.IGNORECASE)
+            if match:
+                columns[(table, row[1])] = int(match.group(1))
+    return columns
+
+
+def load_dump(engine, dump_path=None, exact_decimals=False):
+    """
+    Executes the translated dump against an engine (SQLite or any database accepting standard SQL).
+    With exact_decimals the dump's numeric literals, stored as text, are padded to the column scale.
+    """
+    statements = read_dump_statements(dump_path, exact_decimals)
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if exact_decimals:
+            for (table, column), scale in decimal_columns(connection).items():
+                connection.exec_driver_sql(f'UPDATE "{table}" SET "{column}" = printf(\'%.{scale}f\', "{column}") '
+                                           f'WHERE "{column}" IS NOT NULL')
+    return len(statements)
+
+
+def create_sqlite_engine(url="sqlite://"):
+    """
+    Returns an empty engine. The default in-memory database is shared by all threads
+    through a single static connection.
+    """
+    if url == "sqlite://":
+        return create_engine(url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+
+def create_local_engine(dump_path=None, url="sqlite://"):
+    """
+    Returns a SQLite engine loaded from the dump.
+    """
+    engine = create_sqlite_engine(url)
+    load_dump(engine, dump_path)
+    return engine
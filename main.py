@@ -1,23 +1,52 @@
 import os
+import sys
 from os.path import join, dirname
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_community.utilities.sql_database import SQLDatabase
-from langchain.chains import create_sql_query_chain
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+from db_engine import get_database, get_engine
+from sql_result_cache import CachedQuerySQLDataBaseTool
+from query_cost_guard import QueryCostGuard
+from sql_repair import SQLRepairer
 # Part 2 - Passing the result & question to LLM with prompt
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from operator import itemgetter
 from langchain_core.runnables import RunnableLambda
-from util import extract_sql_query
 # Part 3 - Few shot learning
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, FewShotChatMessagePromptTemplate
 from few_shot_examples import order_few_shot
 # Part 4 - Custom Prompt 
-from util_custom_prompt_table_info import process_query
+from util_custom_prompt_table_info import process_query, find_relevant_group, prompt_table_info, set_table_router, TABLE_DESCRIPTIONS_CSV
+# Part 5 - Semantic answer cache
+from semantic_answer_cache import SEMANTIC_CACHE_ENABLED, SemanticAnswerCache
+# Part 6 - Table routing
+from table_router import TableRouter
+from util_schema_introspection import fetch_schema_metadata
+# Part 7 - Streamed answers
+from streaming_answer import stream_answer
+# Part 8 - Instrumentation
+from pipeline_metrics import pipeline_metrics, get_callbacks
+from sql_result_cache import sql_result_cache
+from util_custom_prompt_table_info import get_schema_cache_stats, get_table_info_stats
+from db_engine import get_pool_stats
+# Part 9 - Read replica
+from read_replica import get_read_replica
+# Part 10 - Lazy startup (langchain_openai and langchain_huggingface are imported on first use)
+from lazy_startup import LAZY_STARTUP, STARTUP_WARM_UP, LazyProxy, LazyRunnable, start_warm_up
+# Part 11 - Summary tables
+from summary_tables import SUMMARY_TABLES_ENABLED, SummaryTableManager
+# Part 12 - Question-to-SQL templates
+from sql_templates import SQL_TEMPLATES_ENABLED, SQLTemplateStore
+# Part 13 - Few-shot example store
+from few_shot_examples import SqlSamples
+from few_shot_store import FEW_SHOT_STORE_ENABLED, FEW_SHOT_LEARN_ANSWERED, FewShotExampleStore
+# Part 14 - Column-value index
+from column_values import COLUMN_VALUES_ENABLED, ColumnValueIndex
+# Part 15 - Compact result format
+from result_format import result_format_stats
+# Part 16 - Deterministic answers
+from answer_templates import ANSWER_TEMPLATES_ENABLED, AnswerTemplates
 
 
 # Loading the environment variables
@@ -25,22 +54,54 @@ dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
 # Database connection parameters
-db = SQLDatabase.from_uri(f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}")
+db = get_database()  # Shared, pooled engine (see db_engine.py); with LAZY_STARTUP it connects on first use
 
 # LLM Model
-llm = ChatOpenAI(temperature=0, model=os.environ.get('OPENAI_MODEL'), api_key=os.environ.get('OPENAI_API_KEY'), base_url=os.environ.get('OPENAI_API_HOST'))  # type: ignore
+def create_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(temperature=0, model=os.environ.get('OPENAI_MODEL'), api_key=os.environ.get('OPENAI_API_KEY'), base_url=os.environ.get('OPENAI_API_HOST'))  # type: ignore
+
+# Embedding Model - shared by the table router, the few-shot example store and the semantic answer cache
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def create_embedding_model():
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+
+# Table Router - scores tables against the question by embedding similarity and joins them along foreign keys
+def create_table_router():
+    with get_engine().connect() as connection:
+        schema_metadata = fetch_schema_metadata(connection, db.get_usable_table_names())
+    return TableRouter.from_metadata(embedding_model, schema_metadata, TABLE_DESCRIPTIONS_CSV)
+
+# With LAZY_STARTUP each of these is built by the first request that needs it
+llm = LazyRunnable(create_llm, "llm") if LAZY_STARTUP else create_llm()
+embedding_model = LazyProxy(create_embedding_model, "embedding_model") if LAZY_STARTUP else create_embedding_model()
+table_router = LazyProxy(create_table_router, "table_router") if LAZY_STARTUP else create_table_router()
+set_table_router(table_router)
 
 # ------------------- Table Info + Few Shot Example -------------------
-# Table info
-table_info = process_query("Sales")
+# Table info - informational only, the query chain renders the routed tables' info per question
+table_info = "" if LAZY_STARTUP else process_query("Sales")
 
 # Few Shot Learning
 few_shot_prompt = order_few_shot
 
+# Few-shot example store - examples on disk with an HNSW index, seeded with SqlSamples.examples (FEW_SHOT_STORE=true).
+# The examples closest to each question replace the fixed order_few_shot list in {top_k}
+def create_few_shot_store():
+    store = FewShotExampleStore(embedding_model, EMBEDDING_MODEL_NAME)
+    store.seed(SqlSamples.examples)
+    return store
+
+few_shot_store = None
+if FEW_SHOT_STORE_ENABLED:
+    few_shot_store = LazyProxy(create_few_shot_store, "few_shot_store") if LAZY_STARTUP else create_few_shot_store()
+
 # Final Prompt
 custom_prompt = ChatPromptTemplate.from_messages(
      [
-         ("system", """You are a MySQL expert. Given an input question, first create a syntactically correct MySQL query to run, then look at the results of the query and return the answer to the input question. \n\nHere is the relevant table info: {table_info}\n\n
+         ("system", """You are a MySQL expert. Given an input question, first create a syntactically correct MySQL query to run, then look at the results of the query and return the answer to the input question. \n\nHere is the relevant table info: {table_info}\n\n{column_values}\n\n
 
          \n\nBelow are a number of examples of questions and their corresponding SQL queries.
          {top_k} \n\n
@@ -62,15 +123,35 @@ custom_prompt = ChatPromptTemplate.from_messages(
           """),
          ("human", "{input}"),
      ]
- )
+ ).partial(column_values="")  # filled per question when the column-value index is enabled
 # ------------------- End => Few Shot + Dynamic selector + Custom Prompt -------------------
 
-# Query Chain
-sql_chain = create_sql_query_chain(llm, db, custom_prompt) 
-clean_sql_chain = sql_chain | RunnableLambda(lambda x: extract_sql_query(x)) # type: ignore
+# Read Replica - in-process SQLite copy for read-only queries (READ_REPLICA=dump|mysql), None when disabled
+replica = get_read_replica()
+
+# Summary Tables - pre-aggregated sales and delay summaries that matching aggregate queries read instead (SUMMARY_TABLES=true)
+summary_tables = SummaryTableManager(get_engine()) if SUMMARY_TABLES_ENABLED else None
+if summary_tables is not None:
+    summary_tables.start_refresh_thread()
+
+# Column Values - distinct values of low-cardinality and name-like columns, for the prompt and literal correction (COLUMN_VALUES=true)
+column_values = ColumnValueIndex(get_engine()) if COLUMN_VALUES_ENABLED else None
+if column_values is not None:
+    column_values.start_refresh_thread()
 
 # Execute Query - This will execute the SQL Query and give result
-execute_query = QuerySQLDataBaseTool(db=db)
+execute_query = CachedQuerySQLDataBaseTool(db=db, cost_guard=QueryCostGuard(get_engine()), replica=replica,  # replica first, EXPLAIN-checked on MySQL
+                                           summaries=summary_tables)
+
+# SQL Repair - local repair of the LLM output, plus bounded error-feedback retries on MySQL errors
+sql_repairer = SQLRepairer(llm, execute_query, db)
+
+# Query Chain - create_sql_query_chain fills {table_info} from db.get_table_info; here it is the cached
+# schema context of the routed tables, rendered by the schema_context stage below
+sql_chain = RunnablePassthrough.assign(input=lambda x: x["question"] + "\nSQLQuery: ") | custom_prompt | llm.bind(stop=["\nSQLResult:"]) | StrOutputParser()
+clean_sql_chain = sql_chain | RunnableLambda(sql_repairer.extract) # type: ignore
+if column_values is not None:
+    clean_sql_chain = clean_sql_chain | RunnableLambda(column_values.correct_literals)  # 'United States' -> 'USA'
 
 # Custom Prompt
 answer_prompt = PromptTemplate.from_template(
@@ -87,20 +168,108 @@ answer_prompt = PromptTemplate.from_template(
     """
 )
 
-# Chain
-rephrased_answer_chain = answer_prompt | llm | StrOutputParser()
+# Chain - each stage carries a run_name so pipeline_metrics can time it
+llm_answer_chain = answer_prompt | llm | StrOutputParser()
 
-rephrased_chain = (
-    RunnablePassthrough.assign(sql_query=clean_sql_chain).assign(
-        sql_result=itemgetter("sql_query") | execute_query
-        )
-        | rephrased_answer_chain 
+# Deterministic answers - empty, scalar, single-row and short-list results are answered from a
+# template and only results that need interpretation go to the LLM (ANSWER_TEMPLATES=false disables)
+answer_templates = AnswerTemplates() if ANSWER_TEMPLATES_ENABLED else None
+if answer_templates is not None:
+    rephrased_answer_chain = answer_templates.wrap(llm_answer_chain).with_config(run_name="answer")
+else:
+    rephrased_answer_chain = llm_answer_chain.with_config(run_name="answer")
+
+# Route each question to its tables and render their table info (cached schema entries, projected
+# sample rows, TABLE_INFO_TOKEN_BUDGET pruning), so the schema_context stage times both
+# question_embedding is set by the semantic answer cache, so the question is embedded once per request
+def schema_context(x):
+    tables = find_relevant_group(x["question"], x.get("question_embedding"))
+    return {"table_names_to_use": tables, "table_info": prompt_table_info(x["question"], tables)}
+
+schema_context_chain = RunnableLambda(schema_context).with_config(run_name="schema_context")
+sql_context = {"schema_context": schema_context_chain}
+if few_shot_store is not None:
+    sql_context["top_k"] = RunnableLambda(lambda x: few_shot_store.select_examples({"input": x["question"]}, x.get("question_embedding"))).with_config(run_name="example_selection")
+if column_values is not None:
+    sql_context["column_values"] = RunnableLambda(lambda x: column_values.prompt_hint(x["question"]))
+routed_sql_chain = (
+    RunnablePassthrough.assign(**sql_context)
+        | RunnableLambda(lambda x: {**x, **x["schema_context"]})  # table_names_to_use, table_info
+        | clean_sql_chain.with_config(run_name="sql_generation")
     )
 
+# SQL Templates - questions that only differ in an entity or number from an answered one get their SQL
+# rendered from a learned template instead of routing + generation (SQL_TEMPLATES=true)
+sql_templates = SQLTemplateStore(get_engine()) if SQL_TEMPLATES_ENABLED else None
+if sql_templates is not None:
+    routed_sql_chain = sql_templates.wrap(routed_sql_chain)
+
+# Runs the SQL and retries with the MySQL error on failure - sets sql_result, the repaired sql_query and
+# executed_sql_query (the cost guard's bounded rewrite when it changed the query)
+execute_chain = RunnableLambda(sql_repairer.execute_with_retry, afunc=sql_repairer.aexecute_with_retry)
+if sql_templates is not None:
+    execute_chain = execute_chain | RunnableLambda(sql_templates.observe)  # learns from successful SQL
+if few_shot_store is not None and FEW_SHOT_LEARN_ANSWERED:
+    execute_chain = execute_chain | RunnableLambda(lambda state: few_shot_store.observe(state))  # answered pairs become examples
+execute_chain = execute_chain.with_config(run_name="sql_execution")
+
+answer_chain = (
+    RunnablePassthrough.assign(sql_query=routed_sql_chain)
+        | execute_chain
+        | RunnablePassthrough.assign(answer=rephrased_answer_chain)
+    ).with_config(callbacks=get_callbacks())
+
+rephrased_chain = answer_chain | itemgetter("answer")
+
+# Semantic Answer Cache - reworded questions reuse the stored SQL and answer without calling the LLM
+# (SEMANTIC_CACHE=true; numbers, quoted values and proper nouns of the questions must match)
+answer_cache = SemanticAnswerCache(embedding_model) if SEMANTIC_CACHE_ENABLED else None
+cached_chain = answer_cache.wrap(answer_chain) if answer_cache is not None else rephrased_chain
+
+# Cache and pool counters exported next to the stage histograms
+pipeline_metrics.add_source("sql_result_cache", sql_result_cache.get_stats)
+pipeline_metrics.add_source("schema_cache", get_schema_cache_stats)
+pipeline_metrics.add_source("table_info", get_table_info_stats)
+pipeline_metrics.add_source("sql_repair", sql_repairer.get_stats)
+pipeline_metrics.add_source("cost_guard", execute_query.cost_guard.get_stats)
+pipeline_metrics.add_source("db_pool", get_pool_stats)
+pipeline_metrics.add_source("result_format", result_format_stats.get_stats)
+
+# Tables reloaded by a replica refresh changed on MySQL, so cached results and answers for them are stale
+if replica is not None:
+    replica.on_change.append(sql_result_cache.invalidate_tables)
+    if answer_cache is not None:
+        replica.on_change.append(answer_cache.invalidate_tables)
+    pipeline_metrics.add_source("read_replica", replica.get_stats)
+if answer_cache is not None:
+    pipeline_metrics.add_source("semantic_cache", answer_cache.get_stats)
+if summary_tables is not None:
+    pipeline_metrics.add_source("summary_tables", summary_tables.get_stats)
+if sql_templates is not None:
+    pipeline_metrics.add_source("sql_templates", sql_templates.get_stats)
+if few_shot_store is not None:
+    pipeline_metrics.add_source("few_shot_store", lambda: few_shot_store.get_stats())
+if column_values is not None:
+    pipeline_metrics.add_source("column_values", column_values.get_stats)
+if answer_templates is not None:
+    pipeline_metrics.add_source("answer_templates", answer_templates.get_stats)
+
+# Background warm-up - loads what LAZY_STARTUP deferred without holding up the import
+if LAZY_STARTUP and STARTUP_WARM_UP:
+    start_warm_up(llm.load, db.load, embedding_model.load, table_router.load,
+                  *([few_shot_store.load] if few_shot_store is not None else []))
+
 
 # Calling the LLM with the final prompt
-print(rephrased_chain.invoke({
-    "question": "List of Employees with the concern customers", 
-    "table_info": table_info, 
-    "top_k": few_shot_prompt
-}))
+if __name__ == "__main__":
+    inputs = {
+        "question": "List of Employees with the concern customers", 
+        "table_info": table_info, 
+        "top_k": few_shot_prompt
+    }
+    if "--stream" in sys.argv:
+        # Prints the SQL, the result preview and then the answer tokens as they arrive
+        for event in stream_answer(inputs, routed_sql_chain, execute_query, rephrased_answer_chain):
+            print(event)
+    else:
+        print(cached_chain.invoke(inputs))
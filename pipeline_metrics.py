@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.example_selectors import BaseExampleSelector
+
+from result_format import MORE_ROWS_PATTERN, marker_total
+
+
+# Per-stage pipeline instrumentation
+# Stages are runnables named with .with_config(run_name=...); the callback handler times
+# them, attributes LLM token usage to the enclosing stage and counts rows returned by
+# execution. Metrics are exported as Prometheus text histograms and, when
+# METRICS_JSONL_PATH is set, appended as one JSON line per stage run. Nothing is attached
+# unless METRICS_ENABLED is set, so the disabled path costs nothing.
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+METRICS_JSONL_PATH = os.getenv('METRICS_JSONL_PATH')
+
+STAGES = ("schema_context", "example_selection", "sql_generation", "sql_execution", "answer")
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 10000)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def count_result_rows(result):
+    """
+    Number of rows in a QuerySQLDataBaseTool result string: the total from the more-rows marker
+    (a lower bound when the total could not be counted), else the rows shown.
+    """
+    result = str(result)
+    more = MORE_ROWS_PATTERN.search(result)
+    if more:
+        return marker_total(more)
+    if not result or result.startswith("Error:"):
+        return 0
+    if result.startswith("[("):
+        return result.count("), (") + 1
+    # Compact format (result_format.py): a header line, then one line per row up to the column summaries
+    return len(result.split("\ncolumn summaries")[0].splitlines()) - 1
+
+
+class PipelineMetrics:
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self.histograms = {}
+        self.sources = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, metric, stage, buckets):
+        key = (metric, stage)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        return self.histograms[key]
+
+    def record(self, stage, duration_s, prompt_tokens=0, completion_tokens=0, rows=None):
+        with self._lock:
+            self._histogram("duration_seconds", stage, DURATION_BUCKETS).observe(duration_s)
+            if prompt_tokens or completion_tokens:
+                self._histogram("prompt_tokens", stage, TOKEN_BUCKETS).observe(prompt_tokens)
+                self._histogram("completion_tokens", stage, TOKEN_BUCKETS).observe(completion_tokens)
+            if rows is not None:
+                self._histogram("rows", stage, ROW_BUCKETS).observe(rows)
+        if self.jsonl_path:
+            line = json.dumps({"ts": time.time(), "stage": stage, "duration_s": duration_s,
+                               "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "rows": rows})
+            with self._lock, open(self.jsonl_path, "a") as jsonl_file:
+                jsonl_file.write(line + "\n")
+
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def add_source(self, name, get_stats):
+        """
+        Registers a cache (or any component) whose get_stats() counters are exported as gauges.
+        """
+        self.sources[name] = get_stats
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            by_metric = {}
+            for (metric, stage), histogram in self.histograms.items():
+                by_metric.setdefault(metric, []).append((stage, histogram))
+            for metric, entries in sorted(by_metric.items()):
+                name = f"sqlqa_stage_{metric}"
+                lines.append(f"# TYPE {name} histogram")
+                for stage, histogram in entries:
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+        for source, get_stats in self.sources.items():
+            for key, value in get_stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'sqlqa_{source}_{key} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times every run whose name is one of STAGES and attributes nested LLM token usage to it.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._stage_of_run = {}
+        self._open = {}
+
+    def _start(self, run_id, parent_run_id, name):
+        if name in STAGES:
+            self._stage_of_run[run_id] = run_id
+            self._open[run_id] = {"stage": name, "start": time.perf_counter(), "prompt_tokens": 0, "completion_tokens": 0}
+        elif parent_run_id in self._stage_of_run:
+            self._stage_of_run[run_id] = self._stage_of_run[parent_run_id]
+
+    def _end(self, run_id, outputs=None):
+        stage_run = self._stage_of_run.pop(run_id, None)
+        if stage_run != run_id:
+            return
+        entry = self._open.pop(run_id)
+        rows = None
+        if entry["stage"] == "sql_execution" and outputs is not None:
+            rows = count_result_rows(outputs.get("sql_result", "") if isinstance(outputs, dict) else outputs)
+        self.metrics.record(entry["stage"], time.perf_counter() - entry["start"],
+                            entry["prompt_tokens"], entry["completion_tokens"], rows)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id, outputs)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, output)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage_run = self._stage_of_run.get(run_id)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if stage_run in self._open:
+            self._open[stage_run]["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self._open[stage_run]["completion_tokens"] += usage.get("completion_tokens", 0)
+        self._end(run_id)
+
+
+class TimedExampleSelector(BaseExampleSelector):
+    """
+    Wraps an example selector so select_examples is recorded as the example_selection stage.
+    """
+
+    def __init__(self, selector, metrics):
+        self.selector = selector
+        self.metrics = metrics
+
+    def add_example(self, example):
+        return self.selector.add_example(example)
+
+    def select_examples(self, input_variables):
+        with self.metrics.timed("example_selection"):
+            return self.selector.select_examples(input_variables)
+
+
+pipeline_metrics = PipelineMetrics(METRICS_JSONL_PATH)
+
+
+def get_callbacks():
+    """
+    Callback handlers to pass in the chain config; empty when metrics are disabled.
+    """
+    return [MetricsCallbackHandler(pipeline_metrics)] if METRICS_ENABLED else []
+
+
+def timed_example_selector(selector):
+    """
+    The selector wrapped in a TimedExampleSelector, or the plain selector when metrics are disabled.
+    """
+    return TimedExampleSelector(selector, pipeline_metrics) if METRICS_ENABLED else selector
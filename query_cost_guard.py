@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from util import canonicalize_sql, find_closing_paren
+
+
+# EXPLAIN-based cost guard
+# Before generated SQL runs, EXPLAIN estimates the rows it will examine (the product of the
+# per-table row estimates within each SELECT, summed over SELECTs). Queries within the budget
+# run unchanged, queries up to QUERY_COST_REJECT_FACTOR x the budget are rewritten with a
+# LIMIT and a MAX_EXECUTION_TIME hint, anything larger is rejected before it reaches MySQL.
+# For WITH queries the hint goes on the main SELECT after the CTE definitions. Rewrites are
+# remembered per canonical query, so the caller can report the SQL that actually ran.
+
+CTE_NAME_PATTERN = re.compile(r"\s*(?:RECURSIVE\s+)?`?\w+`?\s*(?:\([^)]*\)\s*)?AS\s*\(", re.IGNORECASE)
+
+
+def main_select_position(sql):
+    """
+    Index of the SELECT keyword of the top-level query block: the first SELECT, or for a
+    WITH query the SELECT after the last CTE definition. None when it cannot be found.
+    """
+    match = re.match(r"\s*WITH\b", sql, re.IGNORECASE)
+    if not match:
+        select = re.match(r"\s*\(?\s*SELECT\b", sql, re.IGNORECASE)
+        return select.end() - len("SELECT") if select else None
+    position = match.end()
+    while True:
+        cte = CTE_NAME_PATTERN.match(sql, position)
+        if not cte:
+            return None
+        position = find_closing_paren(sql, cte.end())
+        if position < 0:
+            return None
+        separator = re.match(r"\s*,", sql[position:])
+        if not separator:
+            break
+        position += separator.end()
+    select = re.match(r"\s*\(?\s*SELECT\b", sql[position:], re.IGNORECASE)
+    return position + select.end() - len("SELECT") if select else None
+
+
+class QueryCostGuard:
+
+    def __init__(self, engine, row_budget=None, reject_factor=None, max_execution_ms=None, rewrite_limit=None, history_size=1000):
+        self.engine = engine
+        self.row_budget = row_budget or int(os.getenv('QUERY_COST_ROW_BUDGET', '1000000'))
+        self.reject_factor = reject_factor or float(os.getenv('QUERY_COST_REJECT_FACTOR', '100'))
+        self.max_execution_ms = max_execution_ms or int(os.getenv('QUERY_MAX_EXECUTION_MS', '5000'))
+        self.rewrite_limit = rewrite_limit or int(os.getenv('QUERY_COST_REWRITE_LIMIT', '1000'))
+        self.history = deque(maxlen=history_size)
+        self.stats = {"allowed": 0, "rewritten": 0, "rejected": 0, "unexplained": 0}
+        self._estimates = {}
+        self._rewrites = {}
+        self._lock = threading.Lock()
+
+    def estimate_rows(self, sql):
+        """
+        Returns the estimated number of rows examined, or None when EXPLAIN fails.
+        """
+        key = canonicalize_sql(sql)
+        with self._lock:
+            if key in self._estimates:
+                return self._estimates[key]
+
+        try:
+            with self.engine.connect() as connection:
+                rows = connection.execute(text(f"EXPLAIN {sql.strip().rstrip(';')}")).mappings().fetchall()
+        except SQLAlchemyError:
+            return None
+
+        per_select = {}
+        for row in rows:
+            estimate = row.get("rows") or 1
+            per_select[row.get("id")] = per_select.get(row.get("id"), 1) * int(estimate)
+        total = sum(per_select.values())
+
+        with self._lock:
+            if len(self._estimates) >= 10000:
+                self._estimates.clear()
+            self._estimates[key] = total
+        return total
+
+    def rewrite(self, sql):
+        """
+        Bounds a query with a top-level LIMIT (when it has none) and a MAX_EXECUTION_TIME hint.
+        """
+        rewritten = sql.strip().rstrip(";").rstrip()
+        if not re.search(r"\bLIMIT\s+\d+(\s*,\s*\d+)?(\s+OFFSET\s+\d+)?\s*$", rewritten, re.IGNORECASE):
+            rewritten += f"\nLIMIT {self.rewrite_limit}"
+        position = main_select_position(rewritten)
+        if position is not None:
+            position += len("SELECT")
+            rewritten = f"{rewritten[:position]} /*+ MAX_EXECUTION_TIME({self.max_execution_ms}) */{rewritten[position:]}"
+        return rewritten + ";"
+
+    def record_rewrite(self, sql):
+        """
+        Remembers rewrite(sql) as the SQL that runs for sql, and returns it.
+        """
+        rewritten = self.rewrite(sql)
+        with self._lock:
+            if len(self._rewrites) >= 10000:
+                self._rewrites.clear()
+            self._rewrites[canonicalize_sql(sql)] = rewritten
+        return rewritten
+
+    def rewritten_sql(self, sql):
+        """
+        The bounded SQL a query was rewritten to, or None when it ran unchanged.
+        """
+        with self._lock:
+            return self._rewrites.get(canonicalize_sql(sql))
+
+    def check(self, sql):
+        """
+        Returns (decision, sql_to_run, estimated_rows) with decision one of 'allow', 'rewrite' or 'reject'.
+        """
+        start = time.perf_counter()
+        estimate = self.estimate_rows(sql)
+
+        if estimate is None:
+            # Let execution surface the real error
+            decision, sql_to_run, stat = "allow", sql, "unexplained"
+        elif estimate <= self.row_budget:
+            decision, sql_to_run, stat = "allow", sql, "allowed"
+        elif estimate <= self.row_budget * self.reject_factor:
+            decision, sql_to_run, stat = "rewrite", self.record_rewrite(sql), "rewritten"
+        else:
+            decision, sql_to_run, stat = "reject", None, "rejected"
+
+        with self._lock:
+            self.stats[stat] += 1
+            self.history.append({
+                "sql": sql,
+                "estimated_rows": estimate,
+                "decision": decision,
+                "check_ms": round((time.perf_counter() - start) * 1000, 2),
+            })
+        return decision, sql_to_run, estimate
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,407 @@
+import datetime
+import decimal
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
+
+from db_engine import is_internal_table
+from local_database import (create_sqlite_engine, load_dump, decimal_columns, translate_string_literal,
+                            DECIMAL_TEXT_TYPE, MYSQL_ESCAPES)
+from result_format import ResultSummary
+from streaming_query import run_streaming, format_streamed_result
+from util import SQL_TOKEN_PATTERN, find_closing_paren, split_top_level
+from util_schema_introspection import fetch_schema_metadata, fetch_table_versions
+
+
+# In-process read replica
+# Read-only questions are answered from a SQLite copy of the database, loaded from
+# database_dump.sql or snapshotted from the live MySQL database. A snapshot refreshes
+# table by table when the table's UPDATE_TIME changes (see fetch_table_versions for what that
+# needs from MySQL), or its CHECKSUM TABLE value with REPLICA_CHECKSUM=true, which scans every
+# table on every refresh. Generated MySQL is translated
+# for SQLite; queries that cannot be translated, that fail on the replica, or that arrive while
+# the snapshot is older than REPLICA_MAX_LAG_S run on MySQL instead.
+# DECIMAL columns are stored as exact text. Queries that filter, sort or compute with them
+# would work on text or REAL values there, so they run on MySQL; only bare select-list reads
+# of DECIMAL columns are served by the replica.
+# The default in-memory replica is a single static connection, so its queries run one at a
+# time under the replica lock; a file REPLICA_URL gives each thread its own connection and
+# only refreshes take the lock.
+
+TABLES_QUERY = text("""
+    SELECT TABLE_NAME
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+""")
+
+REPLICA_CHECKSUM = os.getenv('REPLICA_CHECKSUM', 'false').lower() in ('1', 'true', 'yes')
+
+# Constructs without a SQLite equivalent, or with different results there
+MYSQL_ONLY_PATTERN = re.compile(
+    r"\b(DATE_FORMAT|DATE_ADD|DATE_SUB|ADDDATE|SUBDATE|DATEDIFF|TIMESTAMPDIFF|STR_TO_DATE|MONTHNAME|DAYNAME"
+    r"|WEEK|QUARTER|LAST_DAY|INTERVAL|SEPARATOR|REGEXP|RLIKE|DIV|XOR|SOUNDS|ROLLUP|OUTFILE|DUMPFILE"
+    r"|SQL_CALC_FOUND_ROWS|FOUND_ROWS|MATCH|LOCK|FOR\s+UPDATE|FOR\s+SHARE)\b|\|\||&&",
+    re.IGNORECASE,
+)
+
+DATE_PART_FORMATS = {"YEAR": "%Y", "MONTH": "%m", "DAY": "%d", "DAYOFMONTH": "%d", "HOUR": "%H", "MINUTE": "%M", "SECOND": "%S"}
+
+COPY_BATCH_SIZE = 1000
+
+
+def rewrite_calls(code, name, render):
+    """
+    Replaces every call to function `name` in code (string literals already masked) by render(args).
+    """
+    pattern = re.compile(rf"\b{name}\s*\(", re.IGNORECASE)
+    match = pattern.search(code)
+    while match:
+        end = find_closing_paren(code, match.end())
+        if end < 0:
+            raise ValueError(f"Unbalanced parentheses after {name}")
+        code = code[:match.start()] + render(split_top_level(code[match.end():end - 1])) + code[end:]
+        match = pattern.search(code, match.start())
+    return code
+
+
+def translate_double_quoted_literal(literal):
+    body = re.sub(r"\\.", lambda m: m.group(0)[1] if m.group(0) == "\\'" else MYSQL_ESCAPES.get(m.group(0), m.group(0)[1]),
+                  literal[1:-1].replace('""', '"'))
+    return "'" + body.replace("'", "''") + "'"
+
+
+def find_top_level_from(code, start):
+    """
+    Index of the FROM keyword that closes the select list starting at `start`, or len(code).
+    """
+    depth = 0
+    for match in re.finditer(r"[()]|\bFROM\b", code[start:], re.IGNORECASE):
+        token = match.group(0)
+        if token in "()":
+            depth += 1 if token == "(" else -1
+        elif depth == 0:
+            return start + match.start()
+    return len(code)
+
+
+def decimal_use_is_exact(code, decimal_names):
+    """
+    True when the DECIMAL columns named in decimal_names are only read as bare select-list items
+    (optionally qualified or aliased), so the replica returns their stored exact text.
+    code has its string literals masked.
+    """
+    if not decimal_names:
+        return True
+    names = set(decimal_names)
+
+    def references(code_part):
+        pattern = r'(?<![\w"])"?(' + "|".join(re.escape(name) for name in names) + r')"?(?![\w"])'
+        return re.search(pattern, code_part, re.IGNORECASE) is not None
+
+    select = re.match(r"SELECT\s+(?:DISTINCT\s+)?", code, re.IGNORECASE)
+    if not select:
+        return not references(code)
+    end = find_top_level_from(code, select.end())
+    kept, bare = [], False
+    for item in split_top_level(code[select.end():end]):
+        match = re.fullmatch(r'(?:"?\w+"?\s*\.\s*)?"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', item, re.IGNORECASE)
+        if item.endswith("*"):
+            bare = True  # may include DECIMAL columns
+        elif match and match.group(1).lower() in names:
+            bare = True
+            if match.group(2):
+                names.add(match.group(2).lower())  # sorting by the alias sorts the text
+            continue
+        kept.append(item)
+    rest = code[end:]
+    if references(", ".join(kept) + " " + rest):
+        return False
+    order_by = re.search(r"\bORDER\s+BY\s+(.*?)(?:\bLIMIT\b|$)", rest, re.IGNORECASE | re.DOTALL)
+    if bare and order_by and any(re.fullmatch(r"\d+(?:\s+(?:ASC|DESC))?", item, re.IGNORECASE)
+                                 for item in split_top_level(order_by.group(1))):
+        return False
+    return True
+
+
+def translate_query(sql, decimal_names=()):
+    """
+    Translates a generated MySQL query for SQLite. Returns None when the query is not
+    eligible for the replica: not a single SELECT, using MySQL-only constructs, or using the
+    DECIMAL columns in decimal_names other than as bare select-list items.
+    """
+    literals = []
+    parts = []
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        parts.append(sql[position:match.start()])
+        token = match.group(0)
+        if match.group("string"):
+            # MySQL reads double-quoted text as a string, SQLite as an identifier
+            literals.append(translate_double_quoted_literal(token) if token.startswith('"') else translate_string_literal(token))
+            parts.append(f"\x00{len(literals) - 1}\x00")
+        elif match.group("identifier"):
+            parts.append('"' + token[1:-1].replace('"', '""') + '"')
+        else:
+            parts.append(" ")
+        position = match.end()
+    parts.append(sql[position:])
+    code = "".join(parts).strip().rstrip(";").strip()
+
+    if ";" in code or not re.match(r"(SELECT|WITH)\b", code, re.IGNORECASE) or MYSQL_ONLY_PATTERN.search(code):
+        return None
+    if not decimal_use_is_exact(code, decimal_names):
+        return None
+
+    try:
+        for name, date_format in DATE_PART_FORMATS.items():
+            code = rewrite_calls(code, name, lambda args, f=date_format: f"CAST(strftime('{f}', {args[0]}) AS INTEGER)")
+        code = rewrite_calls(code, "CONCAT", lambda args: "(" + " || ".join(args) + ")")
+        code = rewrite_calls(code, "IF", lambda args: f"(CASE WHEN {args[0]} THEN {args[1]} ELSE {args[2]} END)")
+    except (ValueError, IndexError):
+        return None
+    code = re.sub(r"\b(NOW|CURRENT_TIMESTAMP|SYSDATE)\s*\(\s*\)", "datetime('now')", code, flags=re.IGNORECASE)
+    code = re.sub(r"\b(CURDATE|CURRENT_DATE)\s*\(\s*\)", "date('now')", code, flags=re.IGNORECASE)
+    # MySQL '/' always returns a decimal, SQLite truncates integer division
+    code = code.replace("/", "* 1.0 /")
+
+    return re.sub(r"\x00(\d+)\x00", lambda m: literals[int(m.group(1))], code)
+
+
+def replica_column_type(column_type):
+    column_type = re.sub(r"\b(unsigned|zerofill)\b", "", column_type.lower()).strip()
+    if column_type.startswith(("enum", "set")) or "char" in column_type or "text" in column_type:
+        return "TEXT COLLATE NOCASE"
+    if column_type.startswith(("decimal", "numeric")):
+        return DECIMAL_TEXT_TYPE + column_type[column_type.index("("):] if "(" in column_type else DECIMAL_TEXT_TYPE + "(10,0)"
+    return column_type
+
+
+def replica_value(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    return value
+
+
+class ReadReplica:
+    """
+    SQLite copy of the database that answers eligible queries in-process.
+    on_change callbacks receive the set of tables reloaded by a refresh, so result and
+    answer caches can drop what they hold for them.
+    """
+
+    def __init__(self, engine, source_engine=None, max_lag_s=None, checksum=None):
+        self.engine = engine
+        self.source_engine = source_engine
+        self.max_lag_s = max_lag_s if max_lag_s is not None else float(os.getenv('REPLICA_MAX_LAG_S', '300'))
+        self.checksum = REPLICA_CHECKSUM if checksum is None else checksum
+        self.versions = {}
+        self.decimal_names = set()
+        self.refreshed_at = time.time()
+        self.on_change = []
+        self.stats = {"replica_queries": 0, "source_queries": 0, "ineligible": 0, "stale": 0, "fallbacks": 0,
+                      "refreshes": 0, "tables_reloaded": 0, "refresh_errors": 0, "unverified": 0}
+        # Guards the stats and refreshes; reads take it too when they share the one static connection,
+        # so a refresh never interleaves with a read on it
+        self._lock = threading.RLock()
+        self._read_lock = self._lock if isinstance(engine.pool, StaticPool) else nullcontext()
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_dump(cls, dump_path=None, url="sqlite://"):
+        engine = create_sqlite_engine(url)
+        load_dump(engine, dump_path, exact_decimals=True)
+        replica = cls(engine)
+        replica.update_decimal_names()
+        return replica
+
+    @classmethod
+    def from_source(cls, source_engine, url="sqlite://"):
+        replica = cls(create_sqlite_engine(url), source_engine)
+        replica.refresh()
+        return replica
+
+    def update_decimal_names(self):
+        with self._lock, self.engine.connect() as replica:
+            self.decimal_names = {column.lower() for _, column in decimal_columns(replica)}
+
+    def table_versions(self):
+        """
+        {table: version} for the source's base tables: UPDATE_TIME (fetch_table_versions), or with
+        checksum the CHECKSUM TABLE value, None when it cannot be read. The checksum also survives
+        restarts, but costs a scan of each table per refresh.
+        """
+        with self.source_engine.connect() as connection:
+            if not self.checksum:
+                return {table: version for table, version in fetch_table_versions(connection).items()
+                        if not is_internal_table(table)}
+            tables = [row[0] for row in connection.execute(TABLES_QUERY) if not is_internal_table(row[0])]
+            if not tables:
+                return {}
+            rows = connection.exec_driver_sql("CHECKSUM TABLE " + ", ".join(f"`{table}`" for table in tables)).fetchall()
+        checksums = {name.split(".", 1)[-1]: checksum for name, checksum in rows}
+        return {table: checksums.get(table) for table in tables}
+
+    def copy_table(self, table):
+        """
+        Copies one table from the source into a shadow table, then swaps it in.
+        """
+        with self.source_engine.connect() as connection:
+            table_meta = fetch_schema_metadata(connection, [table]).get(table)
+        if table_meta is None:
+            return
+
+        shadow = f"{table}__refresh"
+        columns = [column["name"] for column in table_meta["columns"]]
+        definitions = [f'"{column["name"]}" {replica_column_type(column["column_type"])}' for column in table_meta["columns"]]
+        primary = table_meta["indexes"].get("PRIMARY")
+        if primary:
+            key = ", ".join('"' + column.strip("`").split("`")[0] + '"' for column in primary["columns"])
+            definitions.append(f"PRIMARY KEY ({key})")
+        insert = text(f'INSERT INTO "{shadow}" VALUES ({", ".join(f":c{i}" for i in range(len(columns)))})')
+
+        with self._lock, self.engine.begin() as replica:
+            replica.exec_driver_sql(f'DROP TABLE IF EXISTS "{shadow}"')
+            replica.exec_driver_sql(f'CREATE TABLE "{shadow}" ({", ".join(definitions)})')
+
+        with self.source_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                text(f"SELECT {', '.join(f'`{column}`' for column in columns)} FROM `{table}`"))
+            while True:
+                batch = result.fetchmany(COPY_BATCH_SIZE)
+                if not batch:
+                    break
+                rows = [{f"c{i}": replica_value(value) for i, value in enumerate(row)} for row in batch]
+                # Commit per batch: the shared connection is rolled back whenever a reader returns it
+                with self._lock, self.engine.begin() as replica:
+                    replica.execute(insert, rows)
+
+        with self._lock, self.engine.begin() as replica:
+            replica.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+            replica.exec_driver_sql(f'ALTER TABLE "{shadow}" RENAME TO "{table}"')
+
+    def refresh(self):
+        """
+        Reloads the tables whose version changed since the last refresh. A table whose checksum
+        cannot be read is left as it is, and the refresh does not count towards the replica's lag,
+        so queries move to MySQL once REPLICA_MAX_LAG_S passes without a complete check.
+        Returns the set of reloaded tables.
+        """
+        if self.source_engine is None:
+            return set()
+        versions = self.table_versions()
+        unknown = {table for table, version in versions.items() if version is None} if self.checksum else set()
+        changed = {table for table, version in versions.items()
+                   if table not in unknown and (table not in self.versions or version != self.versions[table])}
+        for table in sorted(changed):
+            self.copy_table(table)
+        if changed:
+            self.update_decimal_names()
+        with self._lock:
+            for table in set(self.versions) - set(versions):
+                with self.engine.begin() as replica:
+                    replica.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+            self.versions = {table: self.versions.get(table) if table in unknown else version
+                             for table, version in versions.items()}
+            if not unknown:
+                self.refreshed_at = time.time()
+            self.stats["refreshes"] += 1
+            self.stats["tables_reloaded"] += len(changed)
+            self.stats["unverified"] += len(unknown)
+
+        if changed and self.stats["refreshes"] > 1:
+            for callback in self.on_change:
+                callback(changed)
+        return changed
+
+    def start_refresh_thread(self, interval=None):
+        """
+        Refreshes from the source every REPLICA_REFRESH_INTERVAL seconds in a daemon thread.
+        """
+        interval = interval or float(os.getenv('REPLICA_REFRESH_INTERVAL', '60'))
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except SQLAlchemyError as e:
+                    self.stats["refresh_errors"] += 1
+                    print(f"Read replica refresh failed: {e}")
+
+        threading.Thread(target=loop, name="read-replica-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def lag_s(self):
+        return time.time() - self.refreshed_at if self.source_engine is not None else 0.0
+
+    def run(self, query, row_cap=sys.maxsize, max_bytes=sys.maxsize, max_string_length=300, result_format="repr"):
+        """
+        Runs the query on the replica and returns the result formatted as `result_format`
+        ("repr" or "compact"), or None when it has to run on the source instead (ineligible,
+        replica too stale, or failed on the replica).
+        """
+        translated = translate_query(query, self.decimal_names)
+        with self._lock:
+            if translated is None:
+                self.stats["ineligible"] += 1
+                self.stats["source_queries"] += 1
+                return None
+            if self.lag_s() > self.max_lag_s:
+                self.stats["stale"] += 1
+                self.stats["source_queries"] += 1
+                return None
+        try:
+            summary = ResultSummary() if result_format == "compact" else None
+            with self._read_lock:
+                rows, total = run_streaming(self.engine, translated, row_cap, max_bytes, max_string_length, summary)
+        except SQLAlchemyError:
+            with self._lock:
+                self.stats["fallbacks"] += 1
+                self.stats["source_queries"] += 1
+            return None
+        with self._lock:
+            self.stats["replica_queries"] += 1
+        return format_streamed_result(rows, total, summary)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, lag_s=round(self.lag_s(), 1), tables=len(self.versions))
+
+
+_replica = None
+_replica_lock = threading.Lock()
+
+
+def get_read_replica():
+    """
+    Returns the process-wide replica selected by READ_REPLICA: 'dump' loads database_dump.sql,
+    'mysql' snapshots the configured database and keeps refreshing it; unset or 'off' returns None.
+    REPLICA_URL picks the SQLite database (in-memory by default).
+    """
+    global _replica
+    source = os.getenv('READ_REPLICA', 'off').lower()
+    if source not in ('dump', 'mysql'):
+        return None
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                url = os.getenv('REPLICA_URL', 'sqlite://')
+                if source == 'dump':
+                    _replica = ReadReplica.from_dump(os.getenv('REPLICA_DUMP_PATH'), url)
+                else:
+                    from db_engine import get_engine
+                    _replica = ReadReplica.from_source(get_engine(), url)
+                    _replica.start_refresh_thread()
+    return _replica
@@ -0,0 +1,181 @@
+import datetime
+import decimal
+import json
+import os
+import re
+import threading
+from collections import deque
+
+
+# Compact result format
+# QUERY_RESULT_FORMAT=compact (the default) renders SQL results for the answer prompt as a
+# header line with the column names followed by one " | "-separated line per row, with values
+# in their plain form (2003-01-06, 1234.50, NULL) instead of the repr of a list of tuples
+# (datetime.date(2003, 1, 6), Decimal('1234.50'), None). Results with more than
+# RESULT_SUMMARY_MIN_ROWS rows also get count / distinct / min / max / sum per column, computed
+# over the rows read (the streaming mode stops reading at its row cap). QUERY_RESULT_FORMAT=repr
+# keeps the previous output.
+
+RESULT_FORMAT = os.getenv('QUERY_RESULT_FORMAT', 'compact').lower()
+RESULT_SUMMARY_MIN_ROWS = int(os.getenv('RESULT_SUMMARY_MIN_ROWS', '20'))
+RESULT_SUMMARY_MAX_ROWS = int(os.getenv('RESULT_SUMMARY_MAX_ROWS', '100000'))
+MAX_DISTINCT = 1000
+
+# Appended after the rows when the query had more rows than were kept: with the true total
+# when it was counted, else with the lower bound "more than N rows"
+MORE_ROWS_PATTERN = re.compile(r"\n\((?:\d+ more rows not shown, (?P<total>\d+) rows in total"
+                               r"|more than (?P<shown>\d+) rows, only the first \d+ shown)\)")
+
+
+def more_rows_marker(shown, total=None):
+    if total is None:
+        return f"(more than {shown} rows, only the first {shown} shown)"
+    return f"({total - shown} more rows not shown, {total} rows in total)"
+
+
+def marker_total(match):
+    """
+    Row count of a MORE_ROWS_PATTERN match: the counted total, or shown + 1 (a lower bound).
+    """
+    return int(match.group("total")) if match.group("total") else int(match.group("shown")) + 1
+
+
+def format_value(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, decimal.Decimal):
+        return format(value, "f")
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    text = str(value)
+    # Quote strings that would be ambiguous in a " | "-separated line
+    if not text or text == "NULL" or "|" in text or "\n" in text or text != text.strip() or text.startswith('"'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class ColumnStats:
+    __slots__ = ("count", "distinct", "min", "max", "sum")
+
+    def __init__(self):
+        self.count = 0
+        self.distinct = set()
+        self.min = self.max = self.sum = None
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        if len(self.distinct) <= MAX_DISTINCT:
+            try:
+                self.distinct.add(value)
+            except TypeError:
+                pass
+        try:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        except TypeError:
+            pass
+        if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+            self.sum = value if self.sum is None else self.sum + value
+
+
+class ResultSummary:
+    """
+    Column names and per-column statistics of a result, fed the rows run_streaming keeps.
+    """
+
+    def __init__(self, max_rows=None):
+        self.max_rows = max_rows if max_rows is not None else RESULT_SUMMARY_MAX_ROWS
+        self.columns = []
+        self.column_stats = []
+        self.rows = 0
+        # Set by run_streaming when it stopped before the last row (the statistics cover the rows read)
+        self.truncated = False
+
+    def set_columns(self, columns):
+        self.columns = list(columns)
+        self.column_stats = [ColumnStats() for _ in self.columns]
+
+    def add(self, row):
+        self.rows += 1
+        if self.rows > self.max_rows:
+            return
+        for stats, value in zip(self.column_stats, row):
+            stats.add(value)
+
+    def render(self):
+        if self.rows > self.max_rows:
+            scope = f" (first {self.max_rows} rows)"
+        else:
+            scope = f" (first {self.rows} rows)" if self.truncated else ""
+        lines = [f"column summaries{scope}:", "column | count | distinct | min | max | sum"]
+        for column, stats in zip(self.columns, self.column_stats):
+            distinct = f">{MAX_DISTINCT}" if len(stats.distinct) > MAX_DISTINCT else str(len(stats.distinct))
+            extremes = [format_value(value)[:50] if value is not None else "" for value in (stats.min, stats.max)]
+            total = format_value(stats.sum) if stats.sum is not None else ""
+            lines.append(" | ".join([column, str(stats.count), distinct] + extremes + [total]))
+        return "\n".join(lines)
+
+
+def format_compact(rows, total, summary):
+    """
+    Header line, one line per row, the more-rows marker and, for large results, column summaries.
+    total is None when the query had more rows than were kept but they were not counted.
+    """
+    lines = [" | ".join(summary.columns)]
+    lines += [" | ".join(format_value(value) for value in row) for row in rows]
+    if total is None or total > len(rows):
+        lines.append(more_rows_marker(len(rows), total))
+    if summary.rows > RESULT_SUMMARY_MIN_ROWS:
+        lines.append(summary.render())
+    return "\n".join(lines)
+
+
+class ResultFormatStats:
+    """
+    Prompt tokens of the compact format against the repr format for the same rows, per query
+    (the last 100) and in total. Counted with tiktoken's cl100k_base when it can be loaded,
+    else estimated as characters / 4. The query tool only records with METRICS_ENABLED; the
+    benchmark calls count_tokens directly.
+    """
+
+    def __init__(self):
+        self._encoding = None
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=100)
+        self.stats = {"results": 0, "repr_tokens": 0, "compact_tokens": 0}
+
+    def count_tokens(self, text):
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = False
+        return len(self._encoding.encode(text)) if self._encoding else len(text) // 4
+
+    def record(self, repr_text, compact_text):
+        repr_tokens, compact_tokens = self.count_tokens(repr_text), self.count_tokens(compact_text)
+        with self._lock:
+            self.stats["results"] += 1
+            self.stats["repr_tokens"] += repr_tokens
+            self.stats["compact_tokens"] += compact_tokens
+            self.recent.append({"repr_tokens": repr_tokens, "compact_tokens": compact_tokens,
+                                "saved_tokens": repr_tokens - compact_tokens})
+        return repr_tokens - compact_tokens
+
+    def get_stats(self):
+        with self._lock:
+            saved = self.stats["repr_tokens"] - self.stats["compact_tokens"]
+            return dict(self.stats, saved_tokens=saved,
+                        saved_ratio=saved / self.stats["repr_tokens"] if self.stats["repr_tokens"] else 0.0)
+
+
+result_format_stats = ResultFormatStats()
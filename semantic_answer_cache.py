@@ -0,0 +1,185 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_community.callbacks import get_openai_callback
+from langchain_core.runnables import RunnableLambda
+
+from util import extract_referenced_tables
+
+# Off by default: questions differing only in a year or a customer embed almost identically
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE', 'false').lower() in ('1', 'true', 'yes')
+
+
+def question_entities(question):
+    """
+    Numbers, quoted strings and capitalized words (after the first) of a question, lowercased.
+    Two questions can only share an answer when these match exactly.
+    """
+    quoted = [a or b for a, b in re.findall(r"'([^']+)'|\"([^\"]+)\"", question)]
+    rest = re.sub(r"'[^']+'|\"[^\"]+\"", " ", question)
+    numbers = re.findall(r"\d+(?:\.\d+)?", rest)
+    words = re.findall(r"[A-Za-z][\w'-]*", rest)
+    proper_nouns = [word for word in words[1:] if word[0].isupper()]
+    return frozenset(value.lower() for value in quoted + numbers + proper_nouns)
+
+
+class SemanticAnswerCache:
+    """
+    Caches (question, SQL, answer) triples keyed on question embeddings, so a reworded
+    question whose embedding is within `threshold` cosine similarity of a cached one is
+    answered without calling the LLM or the database. The numbers, quoted strings and proper
+    nouns of both questions must also match ("orders in 2003" never answers "orders in 2004").
+    The question's embedding is computed once per request: wrap() passes it to the wrapped
+    chain as inputs["question_embedding"] for the table router and the few-shot store.
+    """
+
+    def __init__(self, embedding_model, threshold=None, ttl=None, max_entries=None):
+        self.embedding_model = embedding_model
+        self.threshold = threshold if threshold is not None else float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SEMANTIC_CACHE_TTL', '3600'))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000'))
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0,
+                      "entity_mismatches": 0, "saved_latency_s": 0.0, "saved_tokens": 0}
+
+    def embed(self, question):
+        """
+        The normalized question embedding, to pass to lookup(), store() and the wrapped chain.
+        """
+        vector = np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._matrix = None
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            self._remove(key)
+
+    def lookup(self, question, vector=None):
+        """
+        Returns the cached entry most similar to the question, or None.
+        """
+        if vector is None:
+            vector = self.embed(question)
+        with self._lock:
+            self._expire(time.time())
+            if not self._entries:
+                self.stats["misses"] += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries.keys())
+                self._matrix = np.stack([self._entries[key]["embedding"] for key in self._keys])
+            scores = self._matrix @ vector
+            entities = question_entities(question)
+            best = None
+            for index in np.argsort(-scores):
+                if scores[index] < self.threshold:
+                    break
+                if self._entries[self._keys[index]]["entities"] == entities:
+                    best = int(index)
+                    break
+                self.stats["entity_mismatches"] += 1
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+
+            key = self._keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["saved_latency_s"] += entry["latency_s"]
+            self.stats["saved_tokens"] += entry["tokens"]
+            return dict(entry, similarity=float(scores[best]))
+
+    def store(self, question, sql_query, answer, latency_s=0.0, tokens=0, vector=None):
+        entry = {
+            "question": question,
+            "entities": question_entities(question),
+            "embedding": self.embed(question) if vector is None else vector,
+            "sql_query": sql_query,
+            "answer": answer,
+            "tables": extract_referenced_tables(sql_query),
+            "latency_s": latency_s,
+            "tokens": tokens,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate_tables(self, tables):
+        """
+        Drops every cached answer whose SQL reads from any of the given tables.
+        """
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["tables"] & tables]
+            for key in stale:
+                self._remove(key)
+            self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries),
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
+
+    def wrap(self, answer_chain, answer_only=True):
+        """
+        Wraps a chain that returns {"sql_query", "answer", ...} into one that returns the
+        answer string, serving it from the cache when a similar question was already answered.
+        With answer_only=False it returns {"answer", "sql_query", "cached"} instead.
+        """
+        def output(answer, sql_query, cached):
+            return answer if answer_only else {"answer": answer, "sql_query": sql_query, "cached": cached}
+
+        def invoke(inputs, config=None):
+            vector = self.embed(inputs["question"])
+            cached = self.lookup(inputs["question"], vector)
+            if cached:
+                return output(cached["answer"], cached["sql_query"], True)
+
+            start = time.perf_counter()
+            with get_openai_callback() as callback:
+                result = answer_chain.invoke(dict(inputs, question_embedding=vector), config)
+            self.store(inputs["question"], result["sql_query"], result["answer"],
+                       latency_s=time.perf_counter() - start, tokens=callback.total_tokens, vector=vector)
+            return output(result["answer"], result["sql_query"], False)
+
+        async def ainvoke(inputs, config=None):
+            vector = await asyncio.to_thread(self.embed, inputs["question"])
+            cached = await asyncio.to_thread(self.lookup, inputs["question"], vector)
+            if cached:
+                return output(cached["answer"], cached["sql_query"], True)
+
+            start = time.perf_counter()
+            with get_openai_callback() as callback:
+                result = await answer_chain.ainvoke(dict(inputs, question_embedding=vector), config)
+            await asyncio.to_thread(self.store, inputs["question"], result["sql_query"], result["answer"],
+                                    time.perf_counter() - start, callback.total_tokens, vector)
+            return output(result["answer"], result["sql_query"], False)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
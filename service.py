@@ -0,0 +1,260 @@
+"""
+Async serving entry point for the SQL QA chain defined in main.py.
+
+The chain is built once at startup and every request goes through `ainvoke`, with
+separate concurrency limits for LLM calls (SQL generation and answer rephrasing) and
+database calls, a per-request timeout and graceful shutdown that drains in-flight
+requests. Point OPENAI_API_HOST at any OpenAI-compatible endpoint (including a local
+fake) and DB_* at a local database to run it end to end.
+
+    python service.py            # serves POST /ask on SERVICE_HOST:SERVICE_PORT
+"""
+import asyncio
+import importlib
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from pydantic import BaseModel
+
+from batch_questions import RequestCoalescer, aanswer_questions, normalize_question
+from db_engine import get_engine
+from pipeline_metrics import get_callbacks, pipeline_metrics
+from streaming_answer import astream_answer
+
+
+class ServiceShuttingDown(Exception):
+    pass
+
+
+def limit_concurrency(runnable, semaphore):
+    """
+    Wraps a runnable so that at most semaphore's value invocations run at the same time.
+    """
+    async def ainvoke(inputs, config=None):
+        async with semaphore:
+            return await runnable.ainvoke(inputs, config)
+
+    return RunnableLambda(lambda inputs: runnable.invoke(inputs), afunc=ainvoke)
+
+
+def batch_error(error):
+    """
+    The per-question entry of a batch answer for a question that raised.
+    """
+    if isinstance(error, ServiceShuttingDown):
+        return {"error": str(error), "status": 503}
+    if isinstance(error, asyncio.TimeoutError):
+        return {"error": "Request timed out.", "status": 504}
+    return {"error": str(error) or type(error).__name__, "status": 500}
+
+
+class SQLQAService:
+
+    def __init__(self, llm_concurrency=None, db_concurrency=None, request_timeout=None):
+        self.llm_concurrency = llm_concurrency or int(os.getenv('SERVICE_LLM_CONCURRENCY', '8'))
+        self.db_concurrency = db_concurrency or int(os.getenv('SERVICE_DB_CONCURRENCY', '4'))
+        self.request_timeout = request_timeout or float(os.getenv('SERVICE_REQUEST_TIMEOUT', '60'))
+        self.pipeline = None
+        self.chain = None
+        self.cached_chain = None
+        self._in_flight = 0
+        self._idle = None
+        self._closing = False
+        self.coalescer = RequestCoalescer()
+
+    async def start(self):
+        """
+        Builds the chain once. Importing main connects to the database and loads the
+        models (unless LAZY_STARTUP defers them to the first request), so it runs in a
+        worker thread to keep the event loop free.
+        """
+        self.pipeline = await asyncio.to_thread(importlib.import_module, "main")
+        self.llm_semaphore = llm_semaphore = asyncio.Semaphore(self.llm_concurrency)
+        self.db_semaphore = db_semaphore = asyncio.Semaphore(self.db_concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # Each query holds a DB slot until its worker thread finishes (also after a timeout) and
+        # each repair retry takes an LLM slot
+        self.pipeline.sql_repairer.set_limits(llm_semaphore, db_semaphore)
+
+        answer_chain = limit_concurrency(self.pipeline.rephrased_answer_chain, llm_semaphore)
+        if self.pipeline.answer_templates is not None:
+            # Template-rendered answers do not wait for an LLM slot
+            answer_chain = self.pipeline.answer_templates.wrap(
+                limit_concurrency(self.pipeline.llm_answer_chain, llm_semaphore)).with_config(run_name="answer")
+        self.chain = (
+            RunnablePassthrough.assign(sql_query=limit_concurrency(self.pipeline.routed_sql_chain, llm_semaphore))
+                | self.pipeline.execute_chain
+                | RunnablePassthrough.assign(answer=answer_chain)
+            )
+        # The semantic answer cache (SEMANTIC_CACHE=true) in front of the chain, as in main.cached_chain
+        cache = self.pipeline.answer_cache
+        self.cached_chain = cache.wrap(self.chain, answer_only=False) if cache is not None else self.chain
+
+    async def answer(self, question):
+        """
+        Answers one question; identical questions already in flight share that execution.
+        """
+        if self._closing or self.chain is None:
+            raise ServiceShuttingDown("Service is not accepting requests.")
+        return await self.coalescer.run(normalize_question(question), lambda: self._answer(question))
+
+    async def answer_batch(self, questions, max_concurrency=None):
+        """
+        Answers a batch of questions, running each distinct question once. A question that
+        fails or times out gets an {"error", "status"} entry; the others are still answered.
+        """
+        if self._closing or self.chain is None:
+            raise ServiceShuttingDown("Service is not accepting requests.")
+        answers = await aanswer_questions(self.answer, questions, max_concurrency or self.llm_concurrency)
+        return [batch_error(answer) if isinstance(answer, BaseException) else answer for answer in answers]
+
+    async def astream(self, question):
+        """
+        Yields sql / result / token / done events for one question as each stage completes.
+        """
+        if self._closing or self.chain is None:
+            raise ServiceShuttingDown("Service is not accepting requests.")
+
+        self._in_flight += 1
+        self._idle.clear()  # type: ignore
+        try:
+            inputs = {
+                "question": question,
+                "table_info": self.pipeline.table_info,  # type: ignore
+                "top_k": self.pipeline.few_shot_prompt,  # type: ignore
+            }
+            async for event in astream_answer(inputs, self.pipeline.routed_sql_chain, self.pipeline.execute_query,  # type: ignore
+                                              self.pipeline.rephrased_answer_chain, self.llm_semaphore, self.db_semaphore,  # type: ignore
+                                              timeout=self.request_timeout):
+                yield event
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()  # type: ignore
+
+    async def _answer(self, question):
+        self._in_flight += 1
+        self._idle.clear()  # type: ignore
+        try:
+            inputs = {
+                "question": question,
+                "table_info": self.pipeline.table_info,  # type: ignore
+                "top_k": self.pipeline.few_shot_prompt,  # type: ignore
+            }
+            result = await asyncio.wait_for(
+                self.cached_chain.ainvoke(inputs, config={"callbacks": get_callbacks()}),
+                timeout=self.request_timeout,
+            )
+            if self.pipeline.answer_cache is None:  # type: ignore
+                return {"answer": result["answer"], "sql_query": result["sql_query"], "cached": False}
+            return result
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()  # type: ignore
+
+    async def shutdown(self, drain_timeout=None):
+        """
+        Stops accepting requests, waits for in-flight ones to finish and releases the DB pool.
+        """
+        self._closing = True
+        drain_timeout = drain_timeout if drain_timeout is not None else float(os.getenv('SERVICE_DRAIN_TIMEOUT', '30'))
+        if self._idle is not None:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        if self.pipeline is not None:
+            if self.pipeline.replica is not None:
+                self.pipeline.replica.stop()
+            if self.pipeline.summary_tables is not None:
+                self.pipeline.summary_tables.stop()
+            if self.pipeline.column_values is not None:
+                self.pipeline.column_values.stop()
+            get_engine().dispose()
+
+
+service = SQLQAService()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await service.start()
+    yield
+    await service.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+class QuestionRequest(BaseModel):
+    question: str
+
+
+class BatchRequest(BaseModel):
+    questions: list[str]
+
+
+class ExampleRequest(BaseModel):
+    question: str
+    sql_query: str
+    domain: Optional[str] = None
+
+
+@app.post("/ask")
+async def ask(request: QuestionRequest):
+    try:
+        return await service.answer(request.question)
+    except ServiceShuttingDown as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Request timed out.")
+
+
+@app.post("/ask/stream")
+async def ask_stream(request: QuestionRequest):
+    if service._closing:
+        raise HTTPException(status_code=503, detail="Service is not accepting requests.")
+
+    async def events():
+        async for event in service.astream(request.question):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchRequest):
+    try:
+        return await service.answer_batch(request.questions)
+    except ServiceShuttingDown as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/examples")
+async def add_example(request: ExampleRequest):
+    """
+    Adds a verified question/SQL pair to the few-shot example store (near-duplicates are dropped).
+    """
+    store = getattr(service.pipeline, "few_shot_store", None)
+    if store is None:
+        raise HTTPException(status_code=404, detail="The few-shot example store is disabled (FEW_SHOT_STORE).")
+    added = await asyncio.to_thread(store.add_verified, request.question, request.sql_query, request.domain)
+    return {"added": added}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return pipeline_metrics.to_prometheus()
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=os.getenv('SERVICE_HOST', '127.0.0.1'), port=int(os.getenv('SERVICE_PORT', '8000')))
@@ -0,0 +1,195 @@
+import asyncio
+import os
+import re
+import threading
+from contextlib import nullcontext
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from util import canonicalize_sql, extract_referenced_tables, repair_sql_query
+
+
+repair_prompt = PromptTemplate.from_template(
+    """The following MySQL query was generated for the user question but failed when it was executed.
+    Fix the query so that it answers the question. Return only the corrected MySQL query.
+
+    User Question: {question}
+    Failed SQL Query: {sql_query}
+    MySQL Error: {error}
+    Table Info: {table_info}
+    Corrected SQL Query:
+    """
+)
+
+
+async def run_in_slot(semaphore, func, *args):
+    """
+    Runs func(*args) in a worker thread while holding a semaphore slot. The slot is released when
+    the thread finishes: cancelling the await (asyncio.wait_for) does not stop the thread, so
+    the slot must not be handed to the next request while the query is still running.
+    """
+    if semaphore is None:
+        return await asyncio.to_thread(func, *args)
+    await semaphore.acquire()
+    try:
+        future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: semaphore.release())
+    return await asyncio.shield(future)
+
+
+class SQLRepairer:
+    """
+    Repairs generated SQL instead of regenerating the whole answer:
+    - extract() applies the deterministic local repairs from util.repair_sql_query
+    - execute_with_retry() runs the query and, on a MySQL error, sends the error text back to
+      the LLM for at most SQL_REPAIR_MAX_RETRIES corrected queries. Successful fixes are cached
+      by the canonical form of the failed query and applied directly next time.
+    aexecute_with_retry() is the async version; with set_limits() each query holds a DB slot until
+    its thread finishes and each repair call an LLM slot, so retries count against the LLM limit.
+    """
+
+    def __init__(self, llm, execute_query, db=None, max_retries=None):
+        self.repair_chain = repair_prompt | llm | StrOutputParser()
+        self.execute_query = execute_query
+        self.db = db
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SQL_REPAIR_MAX_RETRIES', '2'))
+        self._fixes = {}
+        self._lock = threading.Lock()
+        self.stats = {"extracted": 0, "repaired": 0, "local_repairs": 0, "retry_attempts": 0, "retry_successes": 0,
+                      "retry_failures": 0, "cached_fixes": 0}
+        self.repair_counts = {}
+        self.llm_semaphore = None
+        self.db_semaphore = None
+
+    def set_limits(self, llm_semaphore=None, db_semaphore=None):
+        """
+        asyncio semaphores bounding aexecute_with_retry's repair calls and queries.
+        """
+        self.llm_semaphore = llm_semaphore
+        self.db_semaphore = db_semaphore
+
+    def extract(self, response):
+        sql, repairs = repair_sql_query(response)
+        with self._lock:
+            self.stats["extracted"] += 1
+            if repairs:
+                self.stats["repaired"] += 1
+                # Only count repairs that the old SELECT ... ; extraction would have failed or mangled
+                strict = re.search(r"(SELECT.*?;)", response, re.DOTALL)
+                if not strict or strict.group(1).strip() != sql:
+                    self.stats["local_repairs"] += 1
+            for repair in repairs:
+                self.repair_counts[repair] = self.repair_counts.get(repair, 0) + 1
+        return sql
+
+    def _table_info(self, sql_query):
+        if self.db is None:
+            return ""
+        tables = [table for table in extract_referenced_tables(sql_query) if table in self.db.get_usable_table_names()]
+        return self.db.get_table_info_no_throw(tables) if tables else ""
+
+    def _cached_fix(self, original):
+        with self._lock:
+            return self._fixes.get(canonicalize_sql(original))
+
+    def _record_cached_fix(self):
+        with self._lock:
+            self.stats["cached_fixes"] += 1
+
+    def _repair_inputs(self, inputs, sql_query, result):
+        with self._lock:
+            self.stats["retry_attempts"] += 1
+        return {
+            "question": inputs["question"],
+            "sql_query": sql_query,
+            "error": str(result)[len("Error:"):].strip(),
+            "table_info": self._table_info(sql_query),
+        }
+
+    def executed_sql(self, sql_query):
+        """
+        The SQL that ran for sql_query: the cost guard's bounded rewrite when it changed the query.
+        """
+        cost_guard = getattr(self.execute_query, "cost_guard", None)
+        return (cost_guard.rewritten_sql(sql_query) if cost_guard is not None else None) or sql_query
+
+    def _record_outcome(self, original, attempts, sql_query, result):
+        with self._lock:
+            if attempts and not str(result).startswith("Error:"):
+                self.stats["retry_successes"] += 1
+                self._fixes[canonicalize_sql(original)] = sql_query
+            elif attempts:
+                self.stats["retry_failures"] += 1
+
+    def execute_with_retry(self, inputs):
+        """
+        Takes the chain state ({"question", "sql_query", ...}) and returns it with "sql_result"
+        set, "sql_query" replaced by the repaired query when a retry fixed it, and
+        "executed_sql_query" set to the SQL that ran (its bounded form when the cost guard
+        rewrote it). sql_query stays the query as generated, which is what the SQL templates
+        and the few-shot store learn from.
+        """
+        original = inputs["sql_query"]
+        cached_fix = self._cached_fix(original)
+        if cached_fix:
+            result = self.execute_query.invoke(cached_fix)
+            if not str(result).startswith("Error:"):
+                self._record_cached_fix()
+                return dict(inputs, sql_query=cached_fix, executed_sql_query=self.executed_sql(cached_fix), sql_result=result)
+
+        sql_query = original
+        result = self.execute_query.invoke(sql_query)
+        attempts = 0
+        while str(result).startswith("Error:") and attempts < self.max_retries:
+            attempts += 1
+            try:
+                sql_query, _ = repair_sql_query(self.repair_chain.invoke(self._repair_inputs(inputs, sql_query, result)))
+            except ValueError:
+                break
+            result = self.execute_query.invoke(sql_query)
+
+        self._record_outcome(original, attempts, sql_query, result)
+        return dict(inputs, sql_query=sql_query, executed_sql_query=self.executed_sql(sql_query), sql_result=result)
+
+    async def aexecute_with_retry(self, inputs):
+        """
+        Async execute_with_retry: queries hold a DB slot, repair calls an LLM slot (see set_limits).
+        """
+        original = inputs["sql_query"]
+        cached_fix = self._cached_fix(original)
+        if cached_fix:
+            result = await run_in_slot(self.db_semaphore, self.execute_query.invoke, cached_fix)
+            if not str(result).startswith("Error:"):
+                self._record_cached_fix()
+                return dict(inputs, sql_query=cached_fix, executed_sql_query=self.executed_sql(cached_fix), sql_result=result)
+
+        sql_query = original
+        result = await run_in_slot(self.db_semaphore, self.execute_query.invoke, sql_query)
+        attempts = 0
+        while str(result).startswith("Error:") and attempts < self.max_retries:
+            attempts += 1
+            repair_inputs = await run_in_slot(self.db_semaphore, self._repair_inputs, inputs, sql_query, result)
+            async with self.llm_semaphore or nullcontext():
+                response = await self.repair_chain.ainvoke(repair_inputs)
+            try:
+                sql_query, _ = repair_sql_query(response)
+            except ValueError:
+                break
+            result = await run_in_slot(self.db_semaphore, self.execute_query.invoke, sql_query)
+
+        self._record_outcome(original, attempts, sql_query, result)
+        return dict(inputs, sql_query=sql_query, executed_sql_query=self.executed_sql(sql_query), sql_result=result)
+
+    def get_stats(self):
+        """
+        Counters plus avoided_regenerations: questions that would otherwise have failed and
+        been rerun end to end (local repairs, successful retries and cached fixes).
+        """
+        with self._lock:
+            stats = dict(self.stats, repairs_by_type=dict(self.repair_counts))
+        stats["avoided_regenerations"] = stats["local_repairs"] + stats["retry_successes"] + stats["cached_fixes"]
+        return stats
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from streaming_query import StreamingQuerySQLDataBaseTool
+from util import canonicalize_sql, extract_referenced_tables
+
+
+class SQLResultCache:
+    """
+    Query result cache keyed by canonical SQL, bounded by the approximate size of the
+    stored results in bytes and invalidated per referenced table. Entries also expire after
+    SQL_RESULT_CACHE_TTL seconds (0 keeps them until invalidated), since only a read replica
+    refresh reports table changes and writes to MySQL would otherwise never be seen.
+    """
+
+    def __init__(self, max_bytes=None, ttl=None):
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('SQL_RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+        self.ttl = ttl if ttl is not None else float(os.getenv('SQL_RESULT_CACHE_TTL', '300'))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expirations": 0}
+
+    def get(self, sql):
+        key = canonicalize_sql(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry["created_at"] > self.ttl:
+                self._bytes -= self._entries.pop(key)["size"]
+                self.stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry["result"]
+
+    def put(self, sql, result):
+        key = canonicalize_sql(sql)
+        size = sys.getsizeof(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)["size"]
+            self._entries[key] = {"result": result, "tables": extract_referenced_tables(key), "size": size,
+                                  "created_at": time.monotonic()}
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["size"]
+                self.stats["evictions"] += 1
+
+    def invalidate_tables(self, tables):
+        """
+        Drops every cached result whose query reads from any of the given tables.
+        """
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["tables"] & tables]
+            for key in stale:
+                self._bytes -= self._entries.pop(key)["size"]
+            self.stats["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+
+# Shared by every CachedQuerySQLDataBaseTool in the process
+sql_result_cache = SQLResultCache()
+
+
+class CachedQuerySQLDataBaseTool(StreamingQuerySQLDataBaseTool):
+    """
+    Drop-in replacement for QuerySQLDataBaseTool that serves repeated queries from a SQLResultCache
+    and executes misses in the row-capped streaming mode. Error results are never cached.
+    """
+
+    cache: Any = None
+
+    def _run(self, query: str, run_manager=None):
+        cache = self.cache or sql_result_cache
+        cached = cache.get(query)
+        if cached is not None:
+            return cached
+
+        result = super()._run(query, run_manager)
+        if isinstance(result, str) and not result.startswith("Error:"):
+            cache.put(query, result)
+        return result
@@ -0,0 +1,409 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from os.path import join, dirname, exists
+
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import text
+
+from batch_questions import normalize_question
+from util import find_literals, resolve_column, table_aliases
+
+
+# Question-to-SQL templates
+# After a generated query answers a question, every literal of the SQL that also appears in
+# the question (a customer name, a country, a LIMIT or a year) becomes a slot, giving a
+# template such as "orders for customer {0}" -> "... WHERE c.customerName = :slot0".
+# A new question is aligned token by token against the stored templates; when the fixed words
+# match with at least SQL_TEMPLATE_THRESHOLD confidence and every string slot value exists in
+# its column, the SQL is rendered from the template and the SQL-generation LLM call is skipped.
+# Only FILLER_WORDS may differ between the fixed words: a substituted or inserted content word
+# ("highest" -> "lowest") or negation ("not in Spain") rejects the template whatever the score.
+# Opt-in with SQL_TEMPLATES=true; templates are kept in SQL_TEMPLATE_PATH across restarts.
+
+SQL_TEMPLATES_ENABLED = os.getenv('SQL_TEMPLATES', 'false').lower() in ('1', 'true', 'yes')
+SQL_TEMPLATE_PATH = os.getenv('SQL_TEMPLATE_PATH', join(dirname(__file__), '.sql_templates.json'))
+
+# Characters ignored at the edges of question tokens ("Ltd." keeps its dot inside slot values)
+TOKEN_STRIP = "\"'“”‘’`?!.,;:()"
+QUOTES = "\"'“”‘’`"
+
+# Fixed words that may be added, dropped or swapped without changing the SQL
+FILLER_WORDS = {"a", "an", "the", "please", "kindly", "me", "us", "i", "you", "can", "could", "would",
+                "show", "list", "give", "get", "find", "display", "tell", "want", "need", "see", "all"}
+NEGATIONS = {"not", "no", "never", "without", "except", "excluding", "none", "nor", "neither"}
+
+
+def tokenize(question):
+    """
+    (key, start, end) for each whitespace-separated token of the question. Keys are lowercased
+    and stripped of surrounding quotes and punctuation; tokens that are only punctuation are dropped.
+    """
+    tokens = []
+    for match in re.finditer(r"\S+", question):
+        key = match.group(0).strip(TOKEN_STRIP).lower()
+        if key:
+            tokens.append((key, match.start(), match.end()))
+    return tokens
+
+
+def build_template(question, sql):
+    """
+    Template learned from a question and the SQL that answered it, or None when no literal
+    of the SQL can be found exactly once in the question.
+    """
+    aliases = table_aliases(sql)
+    occurrences = {}
+    for start, end, kind, value in find_literals(sql):
+        occurrences.setdefault((kind, value), []).append((start, end))
+
+    slots = []
+    for (kind, value), positions in occurrences.items():
+        if not value.strip():
+            continue
+        found = list(re.finditer(rf"(?<![\w.]){re.escape(value)}(?!\w|\.\d)", question, re.IGNORECASE))
+        if len(found) != 1:
+            continue  # absent or ambiguous: the literal stays fixed in the SQL
+        column = None
+        if kind == "string":
+            columns = {resolve_column(sql, start, aliases) for start, _ in positions}
+            if len(columns) != 1 or None in columns:
+                continue
+            column = columns.pop()
+        span = found[0].span()
+        if any(span[0] < slot["span"][1] and slot["span"][0] < span[1] for slot in slots):
+            continue
+        slots.append({"kind": kind, "column": column, "span": span, "positions": positions})
+    if not slots:
+        return None
+
+    slots.sort(key=lambda slot: slot["span"][0])
+    tokens, position = [], 0
+    for index, slot in enumerate(slots):
+        tokens += [key for key, _, _ in tokenize(question[position:slot["span"][0]])]
+        tokens.append(index)
+        position = slot["span"][1]
+    tokens += [key for key, _, _ in tokenize(question[position:])]
+    if sum(isinstance(token, str) for token in tokens) < 2:
+        return None
+
+    # Colons outside the slots are escaped so text() does not read them as bind parameters
+    replacements = sorted((start, end, index) for index, slot in enumerate(slots) for start, end in slot["positions"])
+    parts, position = [], 0
+    for start, end, index in replacements:
+        parts.append(sql[position:start].replace(":", "\\:"))
+        parts.append(f":slot{index}")
+        position = end
+    parts.append(sql[position:].replace(":", "\\:"))
+    sql_template = "".join(parts)
+
+    key = hashlib.sha256(json.dumps([tokens, sql_template]).encode("utf-8")).hexdigest()
+    return {
+        "key": key,
+        "tokens": tokens,
+        "sql": sql_template,
+        "slots": [{"kind": slot["kind"], "column": slot["column"]} for slot in slots],
+        "question": question,
+        "learned": 1,
+        "hits": 0,
+        "last_used": time.time(),
+    }
+
+
+def is_negation(key):
+    return key in NEGATIONS or key.endswith("n't")
+
+
+def align(template_tokens, tokens, question):
+    """
+    Aligns question tokens with a template. Returns (confidence, raw slot values) or None when a
+    slot has no counterpart, a fixed word other than FILLER_WORDS differs or a slot value contains
+    a negation. Confidence is 2M / (F + Q): M matched fixed tokens, F fixed tokens in the template,
+    Q question tokens outside the slots.
+    """
+    keys = [key for key, _, _ in tokens]
+    matched = unmatched = 0
+    values = {}
+    for op, i1, i2, j1, j2 in SequenceMatcher(None, template_tokens, keys, autojunk=False).get_opcodes():
+        if op == "equal":
+            matched += i2 - i1
+            continue
+        slots = [token for token in template_tokens[i1:i2] if isinstance(token, int)]
+        if len(slots) > 1:
+            return None
+        if slots:
+            if j1 == j2 or i2 - i1 > 1 or any(is_negation(key) for key in keys[j1:j2]):
+                return None
+            values[slots[0]] = question[tokens[j1][1]:tokens[j2 - 1][2]]
+        else:
+            if any(key not in FILLER_WORDS for key in template_tokens[i1:i2] + keys[j1:j2]):
+                return None
+            unmatched += (i2 - i1) + (j2 - j1)
+    if not matched:
+        return None
+    return 2 * matched / (2 * matched + unmatched), values
+
+
+def slot_candidates(raw):
+    """
+    Spellings of a raw string slot value to try, most literal first.
+    """
+    candidates = []
+    for value in (raw.rstrip("?!"), raw.strip(QUOTES + "?!"), raw.strip(TOKEN_STRIP)):
+        value = value.strip()
+        if value and value not in candidates:
+            candidates.append(value)
+    return candidates
+
+
+class SQLTemplateStore:
+    """
+    Learns parameterized SQL templates from answered questions and renders the SQL for new
+    questions that fit one of them, so the SQL-generation LLM call can be skipped.
+    String slots are checked against their column with a one-row lookup (cached) before a
+    template is used; without an engine they are accepted as typed.
+    """
+
+    def __init__(self, engine=None, threshold=None, path=None, max_entries=None):
+        self.engine = engine
+        self.threshold = threshold if threshold is not None else float(os.getenv('SQL_TEMPLATE_THRESHOLD', '0.9'))
+        self.path = path if path is not None else SQL_TEMPLATE_PATH
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('SQL_TEMPLATE_MAX_ENTRIES', '1000'))
+        if engine is not None:
+            self.dialect = engine.dialect
+        else:
+            from sqlalchemy.dialects import mysql
+            self.dialect = mysql.dialect()
+        self._templates = {}
+        self._index = {}
+        self._rendered = OrderedDict()
+        self._valid_values = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "misses": 0, "low_confidence": 0, "invalid_values": 0, "learned": 0,
+                      "dropped": 0, "render_s": 0.0, "generation_s": 0.0, "generations": 0}
+        self._load()
+
+    def _load(self):
+        if not self.path or not exists(self.path):
+            return
+        try:
+            with open(self.path) as templates_file:
+                templates = json.load(templates_file)["templates"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring SQL templates in {self.path}: {e}")
+            return
+        for template in templates:
+            self._add(template)
+
+    def _save(self):
+        if not self.path:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as templates_file:
+            json.dump({"version": 1, "templates": list(self._templates.values())}, templates_file)
+        os.replace(temporary, self.path)
+
+    def _add(self, template):
+        self._templates[template["key"]] = template
+        for token in template["tokens"]:
+            if isinstance(token, str):
+                self._index.setdefault(token, set()).add(template["key"])
+
+    def _remove(self, key):
+        template = self._templates.pop(key)
+        for token in template["tokens"]:
+            if isinstance(token, str):
+                self._index.get(token, set()).discard(key)
+
+    def learn(self, question, sql_query):
+        """
+        Adds (or reinforces) the template of a question and the SQL that answered it.
+        Returns the template, or None when nothing in the question maps onto the SQL.
+        """
+        template = build_template(question.strip(), sql_query)
+        if template is None:
+            return None
+        with self._lock:
+            existing = self._templates.get(template["key"])
+            if existing:
+                existing["learned"] += 1
+                existing["last_used"] = time.time()
+                return existing
+            self._add(template)
+            self.stats["learned"] += 1
+            while len(self._templates) > self.max_entries:
+                self._remove(min(self._templates.values(), key=lambda t: t["last_used"])["key"])
+            self._save()
+        return template
+
+    def drop(self, key):
+        with self._lock:
+            if key in self._templates:
+                self._remove(key)
+                self.stats["dropped"] += 1
+                self._save()
+
+    def _is_valid(self, column, value):
+        if self.engine is None:
+            return True
+        table, name = column
+        cache_key = (table, name, value.lower())
+        with self._lock:
+            if cache_key in self._valid_values:
+                self._valid_values.move_to_end(cache_key)
+                return self._valid_values[cache_key]
+        quote = self.dialect.identifier_preparer.quote
+        with self.engine.connect() as connection:
+            valid = connection.execute(text(f"SELECT 1 FROM {quote(table)} WHERE {quote(name)} = :value LIMIT 1"),
+                                       {"value": value}).first() is not None
+        with self._lock:
+            self._valid_values[cache_key] = valid
+            while len(self._valid_values) > 10000:
+                self._valid_values.popitem(last=False)
+        return valid
+
+    def _bind(self, template, raw_values):
+        values = {}
+        for index, slot in enumerate(template["slots"]):
+            raw = raw_values[index]
+            if slot["kind"] == "number":
+                number = raw.strip(TOKEN_STRIP)
+                if not re.fullmatch(r"\d+(?:\.\d+)?", number):
+                    return None
+                values[f"slot{index}"] = float(number) if "." in number else int(number)
+                continue
+            valid = [value for value in slot_candidates(raw) if self._is_valid(slot["column"], value)]
+            if not valid:
+                return None
+            values[f"slot{index}"] = valid[0]
+        return values
+
+    def _candidates(self, tokens):
+        """
+        Templates sharing enough fixed tokens with the question to possibly reach the threshold.
+        """
+        counts = Counter(key for key, _, _ in tokens)
+        with self._lock:
+            keys = set().union(*(self._index.get(key, ()) for key in counts)) if counts else set()
+            templates = [self._templates[key] for key in keys if key in self._templates]
+        candidates = []
+        for template in templates:
+            fixed = Counter(token for token in template["tokens"] if isinstance(token, str))
+            overlap = sum(min(count, counts[token]) for token, count in fixed.items())
+            if 2 * overlap / (sum(fixed.values()) + overlap) >= self.threshold:
+                candidates.append(template)
+        return candidates
+
+    def match(self, question):
+        """
+        Returns (template, confidence, values) for the best template the question fits, or None.
+        """
+        tokens = tokenize(question)
+        scored = []
+        for template in self._candidates(tokens):
+            aligned = align(template["tokens"], tokens, question)
+            if aligned and len(aligned[1]) == len(template["slots"]):
+                scored.append((aligned[0], template["learned"] + template["hits"], template, aligned[1]))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        if scored[0][0] < self.threshold:
+            with self._lock:
+                self.stats["low_confidence"] += 1
+            return None
+        for confidence, _, template, raw_values in scored:
+            if confidence < self.threshold:
+                break
+            values = self._bind(template, raw_values)
+            if values is not None:
+                return template, confidence, values
+        with self._lock:
+            self.stats["invalid_values"] += 1
+        return None
+
+    def render(self, question):
+        """
+        SQL for the question from the best matching template, or None (the LLM generates it).
+        """
+        start = time.perf_counter()
+        matched = self.match(question)
+        if matched is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        template, _, values = matched
+        statement = text(template["sql"]).bindparams(**values)
+        sql_query = str(statement.compile(dialect=self.dialect, compile_kwargs={"literal_binds": True}))
+        with self._lock:
+            template["hits"] += 1
+            template["last_used"] = time.time()
+            self.stats["hits"] += 1
+            self.stats["render_s"] += time.perf_counter() - start
+            self._rendered[normalize_question(question)] = (template["key"], sql_query)
+            while len(self._rendered) > 1000:
+                self._rendered.popitem(last=False)
+        return sql_query
+
+    def observe(self, state):
+        """
+        Takes the chain state after execution ({"question", "sql_query", "sql_result", ...}) and
+        returns it unchanged. Generated SQL that returned rows is learned; a template whose SQL
+        failed or had to be repaired is dropped.
+        """
+        result = str(state.get("sql_result", ""))
+        failed = result.startswith("Error:")
+        with self._lock:
+            rendered = self._rendered.pop(normalize_question(state["question"]), None)
+        if rendered:
+            key, sql_query = rendered
+            if failed or state["sql_query"] != sql_query:
+                self.drop(key)
+        elif not failed and result.strip() not in ("", "[]"):
+            self.learn(state["question"], state["sql_query"])
+        return state
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            generation_s = self.stats["generation_s"] / self.stats["generations"] if self.stats["generations"] else 0.0
+            render_s = self.stats["render_s"] / self.stats["hits"] if self.stats["hits"] else 0.0
+            return dict(self.stats, templates=len(self._templates),
+                        hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+                        avg_generation_s=generation_s, avg_render_s=render_s,
+                        saved_latency_s=max(0.0, generation_s - render_s) * self.stats["hits"])
+
+    def wrap(self, sql_chain):
+        """
+        Wraps the SQL-generation chain so questions that fit a template skip it. LLM generation
+        time is recorded to estimate the latency saved by template hits.
+        """
+        def generate(inputs, config):
+            start = time.perf_counter()
+            sql_query = sql_chain.invoke(inputs, config)
+            with self._lock:
+                self.stats["generations"] += 1
+                self.stats["generation_s"] += time.perf_counter() - start
+            return sql_query
+
+        def invoke(inputs, config=None):
+            sql_query = self.render(inputs["question"])
+            return sql_query if sql_query is not None else generate(inputs, config)
+
+        async def ainvoke(inputs, config=None):
+            sql_query = await asyncio.to_thread(self.render, inputs["question"])
+            if sql_query is not None:
+                return sql_query
+            start = time.perf_counter()
+            sql_query = await sql_chain.ainvoke(inputs, config)
+            with self._lock:
+                self.stats["generations"] += 1
+                self.stats["generation_s"] += time.perf_counter() - start
+            return sql_query
+
+        return RunnableLambda(invoke, afunc=ainvoke)
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from contextlib import nullcontext
+
+from sql_repair import run_in_slot
+
+
+# Streamed answers
+# Emits typed events as soon as each stage finishes instead of waiting for the whole chain:
+#   {"type": "sql", ...}     generated SQL, right after extract_sql_query succeeds
+#   {"type": "result", ...}  result preview, when execute_query returns
+#   {"type": "token", ...}   answer tokens from rephrased_answer_chain as they arrive
+#   {"type": "done", ...}    full answer
+#   {"type": "error", ...}   the async stream ran past its timeout (no "done" follows)
+# Every event carries "elapsed_ms" since the request started, to measure perceived latency.
+
+RESULT_PREVIEW_LENGTH = 500
+
+
+def make_event(event_type, start, **data):
+    return dict(type=event_type, elapsed_ms=round((time.perf_counter() - start) * 1000, 1), **data)
+
+
+def stream_answer(inputs, sql_chain, execute_query, answer_chain):
+    """
+    Synchronous generator of answer events for one question.
+    sql_chain returns the extracted SQL, answer_chain is the streaming answer prompt | llm | parser chain.
+    """
+    start = time.perf_counter()
+    sql_query = sql_chain.invoke(inputs)
+    yield make_event("sql", start, sql_query=sql_query)
+
+    sql_result = execute_query.invoke(sql_query)
+    yield make_event("result", start, preview=str(sql_result)[:RESULT_PREVIEW_LENGTH])
+
+    answer = ""
+    for token in answer_chain.stream(dict(inputs, sql_query=sql_query, sql_result=sql_result)):
+        answer += token
+        yield make_event("token", start, token=token)
+    yield make_event("done", start, answer=answer, sql_query=sql_query)
+
+
+async def astream_answer(inputs, sql_chain, execute_query, answer_chain, llm_semaphore=None, db_semaphore=None,
+                         timeout=None):
+    """
+    Async generator of answer events for one question, optionally holding the service's
+    LLM / DB semaphores around the matching stage. With a timeout (seconds for the whole
+    stream) an overrun ends the stream with an error event.
+    """
+    start = time.perf_counter()
+    deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+
+    def remaining():
+        return None if deadline is None else max(deadline - asyncio.get_running_loop().time(), 0)
+
+    try:
+        async with llm_semaphore or nullcontext():
+            sql_query = await asyncio.wait_for(sql_chain.ainvoke(inputs), remaining())
+        yield make_event("sql", start, sql_query=sql_query)
+
+        # The DB slot is held until the query's thread finishes, even after a timeout
+        sql_result = await asyncio.wait_for(run_in_slot(db_semaphore, execute_query.invoke, sql_query), remaining())
+        yield make_event("result", start, preview=str(sql_result)[:RESULT_PREVIEW_LENGTH])
+
+        answer = ""
+        async with llm_semaphore or nullcontext():
+            tokens = answer_chain.astream(dict(inputs, sql_query=sql_query, sql_result=sql_result)).__aiter__()
+            try:
+                while True:
+                    try:
+                        token = await asyncio.wait_for(tokens.__anext__(), remaining())
+                    except StopAsyncIteration:
+                        break
+                    answer += token
+                    yield make_event("token", start, token=token)
+            finally:
+                await tokens.aclose()
+    except asyncio.TimeoutError:
+        yield make_event("error", start, error="Request timed out.")
+        return
+    yield make_event("done", start, answer=answer, sql_query=sql_query)
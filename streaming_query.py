@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+from typing import Any
+
+from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
+from langchain_community.utilities.sql_database import truncate_word
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from pipeline_metrics import METRICS_ENABLED
+from result_format import RESULT_FORMAT, ResultSummary, format_compact, more_rows_marker, result_format_stats
+
+# Count the true total of results cut at the row cap with a second COUNT(*) query
+COUNT_TOTAL = os.getenv('QUERY_COUNT_TOTAL', 'true').lower() in ('1', 'true', 'yes')
+
+
+# Top-level LIMIT (or a locking clause a LIMIT cannot follow) at the end of a query
+TRAILING_LIMIT_PATTERN = re.compile(r"\b(?:LIMIT\s+\d+(?:\s*,\s*\d+)?(?:\s+OFFSET\s+\d+)?|FOR\s+(?:UPDATE|SHARE)|LOCK\s+IN\s+SHARE\s+MODE)\s*$",
+                                    re.IGNORECASE)
+
+
+def limit_query(query, limit):
+    """
+    Appends LIMIT `limit` to a SELECT / WITH query without a top-level LIMIT of its own, so the
+    server stops producing rows instead of the client draining them when the cursor closes.
+    """
+    stripped = query.strip().rstrip(";").rstrip()
+    if not re.match(r"\(?\s*(?:SELECT|WITH)\b", stripped, re.IGNORECASE) or TRAILING_LIMIT_PATTERN.search(stripped):
+        return query
+    return f"{stripped}\nLIMIT {limit}"
+
+
+def count_query_rows(connection, query):
+    """
+    Total row count of a query, counted on the server, or None when it cannot be counted
+    (e.g. a select list with duplicate column names is not a valid derived table).
+    """
+    try:
+        return connection.execute(text(f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')}) AS counted_rows")).scalar()
+    except SQLAlchemyError:
+        connection.rollback()
+        return None
+
+
+def run_streaming(engine, query, row_cap, max_bytes, max_string_length=300, summary=None, count_total=None):
+    """
+    Executes a query on a server-side (unbuffered) cursor and keeps at most `row_cap` rows
+    or `max_bytes` characters of rendered rows, whichever comes first; the kept rows are fed to
+    `summary` (a result_format.ResultSummary) when given.
+
+    Without a LIMIT of its own, the query is sent with LIMIT row_cap + 1, so the server stops
+    after the rows that can be shown. Closing an unbuffered cursor early (pymysql, mysqlclient)
+    still reads the remaining rows off the wire, so a query with its own large LIMIT costs up to
+    that many rows. When rows were left out, the true total is counted with a COUNT(*) over the
+    query (QUERY_COUNT_TOTAL=false, or a failed count, reports only "more than N rows").
+    Returns (rows, total) with total None when it is not known.
+    """
+    count_total = COUNT_TOTAL if count_total is None else count_total
+    rows = []
+    size = 2  # the surrounding "[]"
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(text(limit_query(query, row_cap + 1)))
+        if not result.returns_rows:
+            connection.commit()
+            return rows, 0
+        if summary is not None:
+            summary.set_columns(result.keys())
+        for row in result:
+            if len(rows) >= row_cap:
+                break
+            values = tuple(truncate_word(value, length=max_string_length) for value in row)
+            row_size = len(repr(values)) + 2
+            if rows and size + row_size > max_bytes:
+                break
+            rows.append(values)
+            size += row_size
+            if summary is not None:
+                summary.add(row)
+        else:
+            return rows, len(rows)
+        result.close()
+        total = count_query_rows(connection, query) if count_total else None
+    if summary is not None:
+        summary.truncated = True
+    return rows, total
+
+
+def format_repr(rows, total):
+    output = str(rows)
+    if total is None or total > len(rows):
+        output += "\n" + more_rows_marker(len(rows), total)
+    return output
+
+
+def format_streamed_result(rows, total, summary=None):
+    """
+    Renders rows like SQLDatabase.run does, followed by a marker when the query had more rows.
+    With a summary the compact format is returned instead; with METRICS_ENABLED the tokens it
+    saves are recorded (which encodes both renderings, so it is skipped otherwise).
+    """
+    if not rows:
+        return ""
+    if summary is None:
+        return format_repr(rows, total)
+    compact = format_compact(rows, total, summary)
+    if METRICS_ENABLED:
+        result_format_stats.record(format_repr(rows, total), compact)
+    return compact
+
+
+class StreamingQuerySQLDataBaseTool(QuerySQLDataBaseTool):
+    """
+    QuerySQLDataBaseTool with a row-capped streaming mode, so a query without LIMIT against a
+    large table cannot load the whole result into memory or into the answer prompt.
+    Configured with QUERY_STREAMING, QUERY_ROW_CAP, QUERY_MAX_BYTES, QUERY_COUNT_TOTAL and
+    QUERY_RESULT_FORMAT.
+    """
+
+    streaming: bool = os.getenv('QUERY_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+    row_cap: int = int(os.getenv('QUERY_ROW_CAP', '100'))
+    max_bytes: int = int(os.getenv('QUERY_MAX_BYTES', '16000'))
+    # "compact" (see result_format.py) or "repr" (the SQLDatabase.run output)
+    result_format: str = RESULT_FORMAT
+    # Optional QueryCostGuard checked before every execution
+    cost_guard: Any = None
+    # Optional read_replica.ReadReplica tried first; None from it means run on the source
+    replica: Any = None
+    # Optional summary_tables.SummaryTableManager rewriting aggregates onto summary tables
+    summaries: Any = None
+
+    def _run(self, query: str, run_manager=None):
+        if self.replica is not None:
+            if self.streaming:
+                result = self.replica.run(query, self.row_cap, self.max_bytes, self.db._max_string_length, self.result_format)
+            else:
+                result = self.replica.run(query, max_string_length=self.db._max_string_length, result_format=self.result_format)
+            if result is not None:
+                return result
+        original = query
+        if self.summaries is not None:
+            query = self.summaries.rewrite(query)
+        if self.cost_guard is not None:
+            decision, query, estimate = self.cost_guard.check(query)
+            if decision == "reject":
+                return (f"Error: Query rejected before execution, it would examine about {estimate} rows "
+                        f"(budget {self.cost_guard.row_budget}). Add filters or a LIMIT.")
+            if decision == "rewrite" and original != query:
+                # Reported as the bounded form of the query as written, not of its summary-table rewrite
+                self.cost_guard.record_rewrite(original)
+        compact = self.result_format == "compact"
+        if not self.streaming and not compact:
+            return super()._run(query, run_manager)
+        row_cap, max_bytes = (self.row_cap, self.max_bytes) if self.streaming else (sys.maxsize, sys.maxsize)
+        summary = ResultSummary() if compact else None
+        try:
+            rows, total = run_streaming(self.db._engine, query, row_cap, max_bytes, self.db._max_string_length, summary)
+        except SQLAlchemyError as e:
+            return f"Error: {e}"
+        return format_streamed_result(rows, total, summary)
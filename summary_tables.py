@@ -0,0 +1,518 @@
+import math
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from db_engine import INTERNAL_TABLE_PREFIX
+from util import SQL_TOKEN_PATTERN, canonicalize_sql, find_closing_paren, split_top_level
+from util_schema_introspection import fetch_table_versions
+
+
+# Materialized summary tables
+# Each SummaryPattern is an aggregate over a fixed join (e.g. products JOIN orderdetails
+# grouped by product). Its summary table holds one row per dimension key with the measures
+# pre-aggregated. Generated SQL over the same join whose columns are all dimensions or
+# registered measures is rewritten to roll the summary up instead of scanning orderdetails:
+#   SUM(od.quantityOrdered * od.priceEach) ... GROUP BY p.productLine
+#   -> SUM(totalRevenue) FROM summary_product_sales GROUP BY productLine
+# Base tables are versioned with fetch_table_versions (UPDATE_TIME on MySQL), as for the
+# read replica, and a refresh does nothing for a summary whose tables did not change.
+# Summaries with a watermark (a column that grows with every new row, like orderNumber)
+# merge only rows past the last watermark when an append table changed and the watermark
+# advanced. When an append table changed without the watermark advancing (an UPDATE or
+# DELETE of appended rows, or a row added below the watermark), the measures of the base rows
+# up to the stored watermark are recomputed and compared with the summary's totals, and a
+# mismatch rebuilds the summary. A change to a non-append base table, or
+# SUMMARY_FULL_REFRESH_INTERVAL elapsing, rebuilds as well; the interval also covers changes
+# that arrive together with appends and changes to the dimension columns of appended rows,
+# which leave the totals unchanged.
+# Summary tables are named INTERNAL_TABLE_PREFIX + name and hidden from SQLDatabase (db_engine.py).
+
+SUMMARY_TABLES_ENABLED = os.getenv('SUMMARY_TABLES', 'false').lower() in ('1', 'true', 'yes')
+
+AGGREGATE_PATTERN = re.compile(r"\b(sum|count|min|max|avg|group_concat|std\w*|var\w*|bit_\w+|json_\w+agg)\(")
+CLAUSE_PATTERN = re.compile(r"\b(select|from|where|group by|having|order by|limit|union|window|over)\b")
+CLAUSES = ("select", "from", "where", "group by", "having", "order by", "limit")
+
+# How a measure is rolled up from summary rows
+ROLLUPS = {"sum": "SUM", "count": "SUM", "min": "MIN", "max": "MAX"}
+
+class NoMatch(Exception):
+    pass
+
+
+class SummaryPattern:
+    """
+    An aggregate to materialize.
+    dimensions: summary column -> expression, keys: key dimension -> dimensions it determines
+    (every dimension is a key or determined by one), measures: summary column -> aggregate.
+    watermark: increasing column of the appended rows; append_tables: tables that only grow
+    past the watermark. Watermarked dimensions must be NOT NULL.
+    """
+
+    def __init__(self, name, from_clause, dimensions, keys, measures, watermark=None, append_tables=()):
+        self.name = name
+        self.table = f"{INTERNAL_TABLE_PREFIX}{name}"
+        self.from_clause = from_clause
+        self.dimensions = dimensions
+        self.keys = keys
+        self.measures = measures
+        self.watermark = watermark
+        self.append_tables = set(append_tables)
+
+
+# Aggregates behind the few-shot examples and their most common variants
+DEFAULT_PATTERNS = [
+    SummaryPattern(
+        "product_sales",
+        "products p JOIN orderdetails od ON p.productCode = od.productCode",
+        dimensions={"productCode": "p.productCode", "productName": "p.productName",
+                    "productLine": "p.productLine", "productVendor": "p.productVendor"},
+        keys={"productCode": ["productName", "productLine", "productVendor"]},
+        measures={"totalQuantitySold": "SUM(od.quantityOrdered)", "totalRevenue": "SUM(od.quantityOrdered * od.priceEach)",
+                  "orderLines": "COUNT(*)"},
+        watermark="od.orderNumber", append_tables=["orderdetails"],
+    ),
+    SummaryPattern(
+        "customer_sales",
+        "customers c JOIN orders o ON c.customerNumber = o.customerNumber JOIN orderdetails od ON o.orderNumber = od.orderNumber",
+        dimensions={"customerNumber": "c.customerNumber", "customerName": "c.customerName", "country": "c.country"},
+        keys={"customerNumber": ["customerName", "country"]},
+        measures={"totalQuantity": "SUM(od.quantityOrdered)", "totalRevenue": "SUM(od.quantityOrdered * od.priceEach)",
+                  "orderLines": "COUNT(*)"},
+        watermark="od.orderNumber", append_tables=["orders", "orderdetails"],
+    ),
+    SummaryPattern(
+        "customer_product_sales",
+        "customers c JOIN orders o ON c.customerNumber = o.customerNumber JOIN orderdetails od ON o.orderNumber = od.orderNumber "
+        "JOIN products p ON od.productCode = p.productCode",
+        dimensions={"customerNumber": "c.customerNumber", "customerName": "c.customerName",
+                    "productCode": "p.productCode", "productName": "p.productName"},
+        keys={"customerNumber": ["customerName"], "productCode": ["productName"]},
+        measures={"totalQuantity": "SUM(od.quantityOrdered)", "totalRevenue": "SUM(od.quantityOrdered * od.priceEach)",
+                  "orderLines": "COUNT(*)"},
+        watermark="od.orderNumber", append_tables=["orders", "orderdetails"],
+    ),
+    SummaryPattern(
+        # Orders change after they are placed (shippedDate, status), so no watermark
+        "order_delays",
+        "orders o JOIN customers c ON o.customerNumber = c.customerNumber",
+        dimensions={"customerNumber": "c.customerNumber", "customerName": "c.customerName", "country": "c.country",
+                    "status": "o.status", "isDelayed": "o.shippedDate > o.requiredDate"},
+        keys={"customerNumber": ["customerName", "country"], "status": [], "isDelayed": []},
+        measures={"orderCount": "COUNT(*)"},
+    ),
+]
+
+
+def mask_literals(sql):
+    """
+    Canonical form of sql (see util.canonicalize_sql) with string literals replaced by
+    \\x00N\\x00 placeholders. Returns (code, literals).
+    """
+    literals = []
+
+    def mask(match):
+        if not match.group("string"):
+            return match.group(0)
+        literals.append(match.group(0))
+        return f"\x00{len(literals) - 1}\x00"
+
+    return SQL_TOKEN_PATTERN.sub(mask, canonicalize_sql(sql)), literals
+
+
+def unmask_literals(code, literals):
+    return re.sub(r"\x00(\d+)\x00", lambda m: literals[int(m.group(1))], code)
+
+
+def split_clauses(code):
+    """
+    Splits a canonical single SELECT into its top-level clauses.
+    """
+    depth = []
+    level = 0
+    for char in code:
+        level += {"(": 1, ")": -1}.get(char, 0)
+        depth.append(level)
+
+    if re.search(r"\bselect\b", code[1:]) or not code.startswith("select "):
+        raise NoMatch("not a single flat SELECT")
+    found = [(m.group(1), m.start(), m.end()) for m in CLAUSE_PATTERN.finditer(code) if depth[m.start()] == 0]
+    names = [name for name, _, _ in found]
+    if any(name not in CLAUSES for name in names) or names != sorted(set(names), key=CLAUSES.index):
+        raise NoMatch("unsupported clause")
+
+    clauses = {}
+    for i, (name, _, end) in enumerate(found):
+        clauses[name] = code[end:found[i + 1][1] if i + 1 < len(found) else len(code)].strip()
+    if clauses["select"].startswith("distinct"):
+        raise NoMatch("DISTINCT")
+    return clauses
+
+
+def normalize(code, aliases, columns):
+    """
+    Qualifies every column reference as table.column, resolving aliases and bare column names
+    (columns maps a lowercase column name to the tables that have it).
+    """
+    def qualified(match):
+        if match.group(1) not in aliases:
+            raise NoMatch(f"unknown table {match.group(1)}")
+        return f"{aliases[match.group(1)]}.{match.group(2)}"
+
+    tables = set(aliases.values())
+
+    def bare(match):
+        owners = [table for table in columns.get(match.group(1), []) if table in tables]
+        if len(owners) > 1:
+            raise NoMatch(f"ambiguous column {match.group(1)}")
+        return f"{owners[0]}.{match.group(1)}" if owners else match.group(1)
+
+    code = re.sub(r"\b([a-z_]\w*)\.([a-z_]\w*)\b", qualified, code)
+    return re.sub(r"(?<![\w.\x00])([a-z_]\w*)(?![\w.(])", bare, code)
+
+
+def parse_from(from_clause, columns):
+    """
+    Returns (tables, aliases, join edges) of an inner-join FROM clause.
+    """
+    if re.search(r"\b(left|right|full|cross|natural|straight_join|using)\b", from_clause) or len(split_top_level(from_clause)) > 1:
+        raise NoMatch("only inner joins are rewritten")
+
+    tables, aliases, conditions = set(), {}, []
+    for i, segment in enumerate(re.split(r"\s(?:inner\s)?join\s", from_clause)):
+        match = re.fullmatch(r"([\w.]+)(?:\s(?:as\s)?(?!on\b)(\w+))?(?:\son\b(.*))?", segment.strip())
+        if not match or (i == 0) != (match.group(3) is None):
+            raise NoMatch("unsupported FROM clause")
+        table = match.group(1).split(".")[-1]
+        tables.add(table)
+        aliases[table] = table
+        aliases[match.group(2) or table] = table
+        if match.group(3):
+            conditions.append(match.group(3))
+
+    edges = set()
+    for condition in conditions:
+        for part in re.split(r"\sand\s", normalize(condition, aliases, columns)):
+            equality = re.fullmatch(r"(\w+\.\w+)=(\w+\.\w+)", part.strip("() "))
+            if not equality:
+                raise NoMatch("join condition is not a column equality")
+            edges.add(frozenset(equality.groups()))
+    return tables, aliases, edges
+
+
+class SummaryTableManager:
+    """
+    Builds and refreshes the summary tables on `engine` and rewrites matching queries to
+    read from them. Only summaries confirmed up to date within SUMMARY_MAX_LAG_S are used.
+    """
+
+    def __init__(self, engine, patterns=None, max_lag_s=None, full_refresh_interval=None):
+        self.engine = engine
+        self.patterns = patterns if patterns is not None else DEFAULT_PATTERNS
+        self.max_lag_s = max_lag_s if max_lag_s is not None else float(os.getenv('SUMMARY_MAX_LAG_S', '120'))
+        self.full_refresh_interval = full_refresh_interval or float(os.getenv('SUMMARY_FULL_REFRESH_INTERVAL', '3600'))
+        self.state = {}
+        self.stats = {"rewrites": 0, "not_matched": 0, "stale": 0, "rebuilds": 0, "delta_merges": 0,
+                      "inconsistent": 0, "refresh_errors": 0}
+        self._compiled = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def compiled(self):
+        """
+        Column map of the base tables and the parsed form of every pattern, built on first use.
+        """
+        if self._compiled is None:
+            inspector = inspect(self.engine)
+            base_tables = set()
+            for pattern in self.patterns:
+                base_tables |= {table.split()[0] for table in re.split(r"(?i)\s(?:inner\s+)?join\s", pattern.from_clause)}
+            columns = {}
+            for table in sorted(base_tables):
+                for column in inspector.get_columns(table):
+                    columns.setdefault(column["name"].lower(), []).append(table.lower())
+
+            compiled = {}
+            for pattern in self.patterns:
+                from_code, _ = mask_literals(pattern.from_clause)
+                tables, aliases, edges = parse_from(from_code, columns)
+
+                def key(expression):
+                    return normalize(mask_literals(expression)[0], aliases, columns)
+
+                compiled[pattern.name] = {
+                    "tables": tables,
+                    "edges": edges,
+                    "dimensions": sorted(((key(expr), name) for name, expr in pattern.dimensions.items()),
+                                         key=lambda item: len(item[0]), reverse=True),
+                    "measures": {key(expr): (name, ROLLUPS[expr.split("(")[0].strip().lower()]) for name, expr in pattern.measures.items()},
+                    "watermark": key(pattern.watermark).split(".") if pattern.watermark else None,
+                }
+            self._compiled = (columns, compiled)
+        return self._compiled
+
+    # ------------------- Building and refreshing -------------------
+
+    def summary_sql(self, pattern, since=False):
+        """
+        The aggregate behind a summary table, bounded by :upto and, for a delta, :since on the watermark.
+        """
+        select = [f"{expr} AS {name}" for name, expr in pattern.dimensions.items()]
+        select += [f"{expr} AS {name}" for name, expr in pattern.measures.items()]
+        sql = f"SELECT {', '.join(select)} FROM {pattern.from_clause}"
+        if pattern.watermark:
+            sql += f" WHERE {pattern.watermark} <= :upto" + (f" AND {pattern.watermark} > :since" if since else "")
+        return sql + f" GROUP BY {', '.join(pattern.dimensions.values())}"
+
+    def table_versions(self, tables):
+        with self.engine.connect() as connection:
+            return fetch_table_versions(connection, sorted(tables))
+
+    def read_watermark(self, pattern):
+        table, column = self.compiled()[1][pattern.name]["watermark"]
+        with self.engine.connect() as connection:
+            return connection.execute(text(f"SELECT MAX({column}) FROM {table}")).scalar() or 0
+
+    def rebuild(self, pattern, versions):
+        """
+        Builds the summary into a shadow table and swaps it in.
+        """
+        table, shadow = pattern.table, f"{pattern.table}__build"
+        params = {}
+        if pattern.watermark:
+            params["upto"] = self.read_watermark(pattern)
+        key = ", ".join(pattern.keys)
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {shadow}")
+            connection.execute(text(f"CREATE TABLE {shadow} AS {self.summary_sql(pattern)}"), params)
+            if self.engine.dialect.name == "mysql":
+                connection.exec_driver_sql(f"CREATE UNIQUE INDEX {table}_key ON {shadow} ({key})")
+                if inspect(connection).has_table(table):
+                    connection.exec_driver_sql(f"RENAME TABLE {table} TO {table}__old, {shadow} TO {table}")
+                    connection.exec_driver_sql(f"DROP TABLE {table}__old")
+                else:
+                    connection.exec_driver_sql(f"RENAME TABLE {shadow} TO {table}")
+            else:
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+                connection.exec_driver_sql(f"ALTER TABLE {shadow} RENAME TO {table}")
+                connection.exec_driver_sql(f"CREATE UNIQUE INDEX {table}_key ON {table} ({key})")
+
+        now = time.time()
+        self.state[pattern.name] = {"versions": versions, "watermark": params.get("upto"), "built_at": now, "checked_at": now}
+        self.stats["rebuilds"] += 1
+
+    def totals_match(self, pattern):
+        """
+        True when the base rows up to the stored watermark still roll up to the summary's totals,
+        i.e. the appended tables only grew past the watermark since the last build or merge.
+        """
+        state = self.state[pattern.name]
+        base_totals = ", ".join(pattern.measures.values())
+        summary_totals = ", ".join(f"{ROLLUPS[expr.split('(')[0].strip().lower()]}({name})"
+                                   for name, expr in pattern.measures.items())
+        with self.engine.connect() as connection:
+            base = connection.execute(text(f"SELECT {base_totals} FROM {pattern.from_clause} WHERE {pattern.watermark} <= :upto"),
+                                      {"upto": state["watermark"]}).fetchone()
+            summary = connection.execute(text(f"SELECT {summary_totals} FROM {pattern.table}")).fetchone()
+        for expected, actual in zip(base, summary):  # type: ignore
+            expected, actual = expected or 0, actual or 0
+            if expected != actual and not math.isclose(float(expected), float(actual), rel_tol=1e-9):
+                return False
+        return True
+
+    def merge_delta(self, pattern, upto):
+        """
+        Adds the rows past the stored watermark to the summary with an upsert on the key dimensions.
+        """
+        state = self.state[pattern.name]
+        columns = list(pattern.dimensions) + list(pattern.measures)
+        insert = f"INSERT INTO {pattern.table} ({', '.join(columns)}) {self.summary_sql(pattern, since=True)}"
+        merges = []
+        for name, expr in pattern.measures.items():
+            rollup = ROLLUPS[expr.split("(")[0].strip().lower()]
+            if self.engine.dialect.name == "mysql":
+                new = f"VALUES({name})"
+                merges.append(f"{name} = " + {"SUM": f"{name} + {new}", "MIN": f"LEAST({name}, {new})", "MAX": f"GREATEST({name}, {new})"}[rollup])
+            else:
+                new = f"excluded.{name}"
+                merges.append(f"{name} = " + {"SUM": f"{name} + {new}", "MIN": f"min({name}, {new})", "MAX": f"max({name}, {new})"}[rollup])
+        if self.engine.dialect.name == "mysql":
+            insert += f" ON DUPLICATE KEY UPDATE {', '.join(merges)}"
+        else:
+            insert += f" ON CONFLICT ({', '.join(pattern.keys)}) DO UPDATE SET {', '.join(merges)}"
+
+        with self.engine.begin() as connection:
+            connection.execute(text(insert), {"since": state["watermark"], "upto": upto})
+        state["watermark"] = upto
+        self.stats["delta_merges"] += 1
+
+    def refresh(self, full=False):
+        """
+        Brings every summary up to date: rebuilds it when a non-append base table changed, when
+        the appended rows it holds no longer add up (or on `full` / SUMMARY_FULL_REFRESH_INTERVAL),
+        otherwise merges the appended rows. The totals are only compared when an append table
+        changed without its watermark advancing.
+        """
+        with self._refresh_lock:
+            compiled = self.compiled()[1]
+            all_versions = self.table_versions(set().union(*(compiled[pattern.name]["tables"] for pattern in self.patterns)))
+            for pattern in self.patterns:
+                state = self.state.get(pattern.name)
+                versions = {table: all_versions[table] for table in compiled[pattern.name]["tables"] if table in all_versions}
+                changed = {table for table, version in versions.items()
+                           if state is None or table not in state["versions"] or version != state["versions"][table]}
+                if (full or state is None or changed - pattern.append_tables
+                        or time.time() - state["built_at"] > self.full_refresh_interval):
+                    self.rebuild(pattern, versions)
+                    continue
+                if pattern.watermark and changed:
+                    upto = self.read_watermark(pattern)
+                    if upto > state["watermark"]:
+                        self.merge_delta(pattern, upto)
+                    elif not self.totals_match(pattern):
+                        self.stats["inconsistent"] += 1
+                        self.rebuild(pattern, versions)
+                        continue
+                state["versions"] = versions
+                state["checked_at"] = time.time()
+
+    def start_refresh_thread(self, interval=None):
+        """
+        Refreshes every SUMMARY_REFRESH_INTERVAL seconds in a daemon thread, starting with the initial build.
+        """
+        interval = interval or float(os.getenv('SUMMARY_REFRESH_INTERVAL', '30'))
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except SQLAlchemyError as e:
+                    self.stats["refresh_errors"] += 1
+                    print(f"Summary table refresh failed: {e}")
+                if self._stop.wait(interval):
+                    return
+
+        threading.Thread(target=loop, name="summary-table-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------- Query rewriting -------------------
+
+    def rewrite_expression(self, code, aliases, compiled_pattern, columns):
+        """
+        Maps one expression onto the summary's columns, or raises NoMatch.
+        """
+        code = normalize(code, aliases, columns)
+        aggregates = []
+        match = AGGREGATE_PATTERN.search(code)
+        while match:
+            end = find_closing_paren(code, match.end())
+            call = code[match.start():end]
+            if end < 0 or call not in compiled_pattern["measures"]:
+                raise NoMatch(f"no measure for {call}")
+            name, rollup = compiled_pattern["measures"][call]
+            aggregates.append(f"{rollup}({name})")
+            code = code[:match.start()] + f"\x01{len(aggregates) - 1}\x01" + code[end:]
+            match = AGGREGATE_PATTERN.search(code)
+
+        for expression, name in compiled_pattern["dimensions"]:
+            code = re.sub(rf"(?<![\w.]){re.escape(expression)}(?![\w.])", name, code)
+        if re.search(r"\b[a-z_]\w*\.[a-z_]\w*\b", code):
+            raise NoMatch("column outside the summary")
+        return re.sub(r"\x01(\d+)\x01", lambda m: aggregates[int(m.group(1))], code), bool(aggregates)
+
+    def match(self, sql):
+        """
+        Returns (pattern, rewritten sql) for the first summary that can answer the query, or None.
+        """
+        try:
+            code, literals = mask_literals(sql)
+            clauses = split_clauses(code)
+        except NoMatch:
+            return None
+        if "from" not in clauses:
+            return None
+        columns, compiled = self.compiled()
+        try:
+            tables, aliases, edges = parse_from(clauses["from"], columns)
+        except NoMatch:
+            return None
+
+        for pattern in self.patterns:
+            compiled_pattern = compiled[pattern.name]
+            if tables != compiled_pattern["tables"] or edges != compiled_pattern["edges"]:
+                continue
+            try:
+
+                def rewrite(expression):
+                    return self.rewrite_expression(expression, aliases, compiled_pattern, columns)
+
+                select, aggregated = [], False
+                for item in split_top_level(clauses["select"]):
+                    alias = re.fullmatch(r"(.+?)(?:(?<=\))as|\sas)?\s([a-z_]\w*)", item)
+                    if alias and alias.group(2) not in ("end", "null", "true", "false"):
+                        expression, label = alias.group(1), f" AS {alias.group(2)}"
+                    else:
+                        expression, label = item, ""
+                    rewritten, has_aggregate = rewrite(expression)
+                    aggregated |= has_aggregate
+                    select.append(rewritten + label)
+                if not aggregated and "group by" not in clauses:
+                    continue  # row-level query, the summary has no rows to return
+
+                parts = {"where": rewrite(clauses["where"])[0] if "where" in clauses else None,
+                         "having": rewrite(clauses["having"])[0] if "having" in clauses else None,
+                         "order by": ", ".join(rewrite(item)[0] for item in split_top_level(clauses["order by"])) if "order by" in clauses else None}
+                group_by = [rewrite(item)[0] for item in split_top_level(clauses["group by"])] if "group by" in clauses else []
+
+                # Columns determined by a grouped key join the GROUP BY, as MySQL's functional dependency check would allow
+                used = " ".join(select + [parts["having"] or "", parts["order by"] or ""])
+                grouped = {item.lower() for item in group_by}
+                for key, dependents in pattern.keys.items():
+                    if key.lower() in grouped:
+                        group_by += [name for name in dependents
+                                     if name.lower() not in grouped and re.search(rf"\b{name}\b", used, re.IGNORECASE)]
+            except NoMatch:
+                continue
+
+            rewritten = f"SELECT {', '.join(select)} FROM {pattern.table}"
+            if parts["where"]:
+                rewritten += f" WHERE {parts['where']}"
+            if group_by:
+                rewritten += f" GROUP BY {', '.join(group_by)}"
+            if parts["having"]:
+                rewritten += f" HAVING {parts['having']}"
+            if parts["order by"]:
+                rewritten += f" ORDER BY {parts['order by']}"
+            if "limit" in clauses:
+                rewritten += f" LIMIT {clauses['limit']}"
+            return pattern, unmask_literals(rewritten, literals) + ";"
+        return None
+
+    def rewrite(self, sql):
+        """
+        Returns the query rewritten against a fresh summary table, or unchanged.
+        """
+        matched = self.match(sql)
+        with self._lock:
+            if matched is None:
+                self.stats["not_matched"] += 1
+                return sql
+            state = self.state.get(matched[0].name)
+            if state is None or time.time() - state["checked_at"] > self.max_lag_s:
+                self.stats["stale"] += 1
+                return sql
+            self.stats["rewrites"] += 1
+        return matched[1]
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, summaries=len(self.state))
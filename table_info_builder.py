@@ -0,0 +1,177 @@
+import re
+
+
+# Token-budgeted table info
+# Renders the schema for a table group as one compact line per table, keeps primary and
+# foreign key columns so joins still work, and drops the columns least relevant to the
+# question (then samples, then descriptions) until the text fits the token budget.
+
+SAMPLE_VALUE_LENGTH = 25
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken's cl100k_base encoding, falling back to ~4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def split_words(name):
+    """
+    Splits an identifier or a question into lowercase, singularized words.
+    """
+    words = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+", name)
+    return {word.lower().rstrip("s") if len(word) > 3 else word.lower() for word in words}
+
+
+def parse_ddl(ddl):
+    """
+    Extracts columns, primary key and foreign keys from a SHOW CREATE TABLE style statement.
+    """
+    columns = []
+    primary_key = set()
+    foreign_keys = {}
+    for line in ddl.splitlines():
+        line = line.strip().rstrip(",")
+        column = re.match(r"^`([^`]+)`\s+(\w+(?:\([^)]*\))?(?:\s+unsigned)?)", line)
+        if column:
+            columns.append((column.group(1), column.group(2)))
+            continue
+        pk = re.match(r"^PRIMARY KEY \((.*)\)", line)
+        if pk:
+            primary_key.update(re.findall(r"`([^`]+)`", pk.group(1)))
+            continue
+        fk = re.search(r"FOREIGN KEY \((.*?)\) REFERENCES `([^`]+)` \((.*?)\)", line)
+        if fk:
+            source = re.findall(r"`([^`]+)`", fk.group(1))
+            target = re.findall(r"`([^`]+)`", fk.group(3))
+            for source_column, target_column in zip(source, target):
+                foreign_keys[source_column] = f"{fk.group(2)}.{target_column}"
+    return columns, primary_key, foreign_keys
+
+
+def score_column(table, column, question_words):
+    column_words = split_words(column)
+    score = len(column_words & question_words)
+    if split_words(table) & question_words:
+        score += 0.5
+    return score
+
+
+def format_sample_value(value):
+    if value is None:
+        return "NULL"
+    text = str(value).replace("\n", " ").replace("|", "/")
+    return text if len(text) <= SAMPLE_VALUE_LENGTH else text[:SAMPLE_VALUE_LENGTH] + "..."
+
+
+def render_table(table, spec, keep_samples, keep_description):
+    lines = []
+    if keep_description and spec["description"]:
+        lines.append(f"-- {table}: {spec['description'].strip()}")
+
+    columns = []
+    for name, column_type in spec["columns"]:
+        if name not in spec["kept"]:
+            continue
+        column = f"{name} {column_type}"
+        if name in spec["primary_key"]:
+            column += " PK"
+        if name in spec["foreign_keys"]:
+            column += f" FK->{spec['foreign_keys'][name]}"
+        columns.append(column)
+    lines.append(f"{table}({', '.join(columns)})")
+
+    if keep_samples and spec["samples"]:
+        samples = [
+            f"{name}={'|'.join(format_sample_value(value) for value in values)}"
+            for name, values in spec["samples"].items()
+            if name in spec["kept"] and not any(isinstance(value, (bytes, bytearray)) for value in values)
+        ]
+        if samples:
+            lines.append(f"-- samples: {'; '.join(samples)}")
+    return "\n".join(lines)
+
+
+def build_budgeted_table_info(question, schema_info, sample_data, table_descriptions, token_budget, full_context=None):
+    """
+    Returns (table_info, report) where table_info fits within token_budget when possible and
+    report holds the token counts before and after pruning plus the dropped columns.
+    """
+    question_words = split_words(question)
+    specs = {}
+    for table, ddl in schema_info.items():
+        columns, primary_key, foreign_keys = parse_ddl(ddl)
+        samples = {}
+        if table in sample_data:
+            rows, headers = sample_data[table]
+            headers = list(headers)
+            samples = {header: [row[i] for row in rows] for i, header in enumerate(headers)}
+        specs[table] = {
+            "columns": columns,
+            "primary_key": primary_key,
+            "foreign_keys": foreign_keys,
+            "kept": {name for name, _ in columns},
+            "samples": samples,
+            "description": table_descriptions.get(table, ""),
+            "scores": {name: score_column(table, name, question_words) for name, _ in columns},
+        }
+
+    options = {"samples": True, "descriptions": True}
+
+    def render():
+        return "\n\n".join(render_table(table, spec, options["samples"], options["descriptions"]) for table, spec in specs.items())
+
+    # Candidate columns to drop, least relevant first; key columns are never dropped
+    candidates = sorted(
+        ((spec["scores"][name], -position, table, name)
+         for table, spec in specs.items()
+         for position, (name, _) in enumerate(spec["columns"])
+         if name not in spec["primary_key"] and name not in spec["foreign_keys"]),
+    )
+    irrelevant = [c for c in candidates if c[0] == 0]
+    relevant = [c for c in candidates if c[0] > 0]
+    dropped = []
+
+    def drop_until_fits(columns):
+        text = render()
+        for _, _, table, name in columns:
+            if count_tokens(text) <= token_budget:
+                break
+            specs[table]["kept"].discard(name)
+            dropped.append(f"{table}.{name}")
+            text = render()
+        return text
+
+    table_info = drop_until_fits(irrelevant)
+    if count_tokens(table_info) > token_budget:
+        options["samples"] = False
+        table_info = drop_until_fits(relevant)
+    if count_tokens(table_info) > token_budget:
+        options["descriptions"] = False
+        table_info = render()
+
+    tokens_after = count_tokens(table_info)
+    report = {
+        "tokens_before": count_tokens(full_context) if full_context is not None else None,
+        "tokens_after": tokens_after,
+        "token_budget": token_budget,
+        "within_budget": tokens_after <= token_budget,
+        "columns_total": sum(len(spec["columns"]) for spec in specs.values()),
+        "columns_kept": sum(len(spec["kept"]) for spec in specs.values()),
+        "dropped_columns": dropped,
+        "samples_included": options["samples"],
+        "descriptions_included": options["descriptions"],
+    }
+    return table_info, report
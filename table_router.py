@@ -0,0 +1,138 @@
+import re
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from table_info_builder import split_words
+
+
+# Embedding-based table router
+# Each table is embedded once from its description (database_table_descriptions.csv) and
+# its column names. A question is scored against all tables with a single matrix product,
+# the best matches are kept and then joined along foreign keys into a minimal connected set.
+
+def describe_table(table, columns, description):
+    column_words = " ".join(" ".join(sorted(split_words(name))) for name in columns)
+    return f"{table}: {description} Columns: {column_words}"
+
+
+class TableRouter:
+
+    def __init__(self, embedding_model, tables, descriptions, max_tables=3, relative_threshold=0.85, mention_boost=0.2):
+        """
+        tables: dict of table -> {"columns": [name or (name, type)], "foreign_keys": {column: (table, column)}}
+        descriptions: dict of table -> description text
+        """
+        self.embedding_model = embedding_model
+        self.max_tables = max_tables
+        self.relative_threshold = relative_threshold
+        self.mention_boost = mention_boost
+        self.table_names = list(tables)
+
+        self.columns = {
+            table: [c[0] if isinstance(c, (tuple, list)) else c for c in spec["columns"]]
+            for table, spec in tables.items()
+        }
+        texts = [describe_table(table, self.columns[table], descriptions.get(table, "")) for table in self.table_names]
+        vectors = np.asarray(embedding_model.embed_documents(texts), dtype=np.float32)
+        self.matrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        # Undirected foreign key graph used to connect the selected tables
+        self.graph = {table: set() for table in self.table_names}
+        for table, spec in tables.items():
+            for referred_table, _ in spec.get("foreign_keys", {}).values():
+                if referred_table in self.graph and referred_table != table:
+                    self.graph[table].add(referred_table)
+                    self.graph[referred_table].add(table)
+
+        # Words that name a table directly ("payments", "office", "product line")
+        self.mentions = {table: split_words(table) | {table.lower().rstrip("s")} for table in self.table_names}
+
+    @classmethod
+    def from_metadata(cls, embedding_model, metadata, descriptions_csv, **kwargs):
+        """
+        Builds the router from util_schema_introspection.fetch_schema_metadata output.
+        """
+        tables = {
+            table: {
+                "columns": [column["name"] for column in meta["columns"]],
+                "foreign_keys": {
+                    column: (fk["referred_table"], referred)
+                    for fk in meta["foreign_keys"].values()
+                    for column, referred in zip(fk["columns"], fk["referred_columns"])
+                },
+            }
+            for table, meta in metadata.items()
+        }
+        return cls(embedding_model, tables, read_descriptions(descriptions_csv), **kwargs)
+
+    @classmethod
+    def from_dump(cls, embedding_model, dump_path, descriptions_csv, **kwargs):
+        """
+        Builds the router offline from a SQL dump such as database_dump.sql.
+        """
+        from util_schema_introspection import parse_dump_schema
+        return cls(embedding_model, parse_dump_schema(dump_path), read_descriptions(descriptions_csv), **kwargs)
+
+    def embed_question(self, question):
+        vector = np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def score(self, question, question_vector=None):
+        """
+        Returns one similarity score per table (in self.table_names order).
+        """
+        if question_vector is None:
+            question_vector = self.embed_question(question)
+        scores = self.matrix @ question_vector
+        question_words = split_words(question) | {w.lower() for w in re.findall(r"\w+", question)}
+        for i, table in enumerate(self.table_names):
+            if self.mentions[table] & question_words:
+                scores[i] += self.mention_boost
+        return scores
+
+    def connect(self, selected):
+        """
+        Expands the selected tables into a connected set by adding the shortest foreign key
+        path from the tables chosen so far to each further table.
+        """
+        connected = [selected[0]]
+        for target in selected[1:]:
+            if target in connected:
+                continue
+            path = self._shortest_path(set(connected), target)
+            for table in path:
+                if table not in connected:
+                    connected.append(table)
+        return connected
+
+    def _shortest_path(self, sources, target):
+        queue = deque((source, [source]) for source in sources)
+        seen = set(sources)
+        while queue:
+            table, path = queue.popleft()
+            if table == target:
+                return path
+            for neighbour in self.graph[table]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append((neighbour, path + [neighbour]))
+        # Not reachable through foreign keys - include it on its own
+        return [target]
+
+    def route(self, question, question_vector=None):
+        """
+        Returns the minimal connected list of tables for the question, best match first.
+        """
+        scores = self.score(question, question_vector)
+        order = np.argsort(-scores)
+        best = scores[order[0]]
+        selected = [self.table_names[i] for i in order[:self.max_tables]
+                    if scores[i] >= best * self.relative_threshold]
+        return self.connect(selected)
+
+
+def read_descriptions(descriptions_csv):
+    table_description = pd.read_csv(descriptions_csv)
+    return {row['Table']: row['Description'] for _, row in table_description.iterrows()}
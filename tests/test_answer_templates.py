@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from answer_templates import AnswerTemplates, parse_result
+
+
+def test_parse_compact_result():
+    assert parse_result('name | city\nAtelier | Nantes\nNULL | " padded"') == \
+        (["name", "city"], [("Atelier", "Nantes"), (None, " padded")], 2)
+
+
+def test_value_containing_separator_falls_back_to_llm():
+    assert parse_result('name | city\nAtelier | "a | b"') is None
+
+
+def test_parse_counted_total():
+    assert parse_result("n\n1\n2\n(8 more rows not shown, 10 rows in total)") == (["n"], [("1",), ("2",)], 10)
+
+
+def test_parse_repr_result():
+    assert parse_result("[(1, 'Paris')]") == (None, [("1", "Paris")], 1)
+
+
+def test_unquoted_value_starting_with_quote_falls_back_to_llm():
+    assert parse_result('name\n"Hello" world') is None
+    assert AnswerTemplates().render("List product names", 'name\n"Hello" world') == ("complex", None)
+
+
+def test_error_and_empty_results():
+    assert parse_result("Error: unknown column") is None
+    assert AnswerTemplates().render("List the customers in Atlantis", "") == ("empty", "No matching records were found.")
+
+
+def test_scalar_answer():
+    assert AnswerTemplates().render("How many employees are there?", "COUNT(*)\n23") == ("scalar", "There are 23 employees.")
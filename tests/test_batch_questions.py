@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from batch_questions import RequestCoalescer, dedupe_questions, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  How many   Orders?? ") == "how many orders"
+
+
+def test_dedupe_keeps_first_spelling():
+    unique, positions = dedupe_questions(["How many orders?", "List offices", "how many orders"])
+    assert unique == ["How many orders?", "List offices"]
+    assert positions == [0, 1, 0]
+
+
+def test_identical_requests_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        results = await asyncio.gather(*(coalescer.run("q", work) for _ in range(3)))
+        return coalescer, results
+
+    coalescer, results = asyncio.run(scenario())
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+    assert coalescer.stats == {"executions": 1, "coalesced": 2}
+    assert coalescer._in_flight == {}
+
+
+def test_cancelled_first_caller_leaves_work_running_for_the_others():
+    async def work():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        first = asyncio.ensure_future(coalescer.run("q", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(coalescer.run("q", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "answer"
+
+
+def test_work_is_cancelled_with_its_last_caller():
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        caller = asyncio.ensure_future(coalescer.run("q", work))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+    assert finished == []
+    assert coalescer._in_flight == {}
+
+
+def test_errors_reach_every_caller():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("no such table")
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        return await asyncio.gather(coalescer.run("q", work), coalescer.run("q", work), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from column_values import ColumnValueIndex, acronym
+from local_database import create_local_engine
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = ColumnValueIndex(create_local_engine())
+    index.refresh()
+    return index
+
+
+def test_acronym():
+    assert acronym("united states of america") == "usa"
+    assert acronym("france") is None
+
+
+def test_misspelled_literal_is_corrected(index):
+    assert index.correct_literals("SELECT COUNT(*) FROM customers WHERE country = 'United States'") == \
+        "SELECT COUNT(*) FROM customers WHERE country = 'USA'"
+    assert index.correct_literals("SELECT * FROM products p WHERE p.productLine = 'Clasic Cars'") == \
+        "SELECT * FROM products p WHERE p.productLine = 'Classic Cars'"
+
+
+def test_stored_values_are_kept(index):
+    for sql in ["SELECT COUNT(*) FROM customers c WHERE c.country = 'france'",
+                "SELECT COUNT(*) FROM customers WHERE country = 'USA' AND customerName LIKE 'Mini%'",
+                "SELECT COUNT(*) FROM customers WHERE country = 'Atlantis'"]:
+        assert index.correct_literals(sql) == sql
+
+
+def test_prompt_hint_names_stored_values(index):
+    hint = index.prompt_hint("How many customers are in the United States?")
+    assert "- customers.country: 'USA'" in hint
+    assert index.prompt_hint("How many orders were placed?") == ""
+
+
+def test_refresh_skips_unchanged_tables(index):
+    assert index.refresh() == set()
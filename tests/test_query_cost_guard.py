@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from query_cost_guard import QueryCostGuard
+
+
+@pytest.fixture
+def guard():
+    return QueryCostGuard(engine=None, max_execution_ms=5000, rewrite_limit=1000)
+
+
+def test_rewrite_adds_hint_and_limit(guard):
+    assert guard.rewrite("SELECT * FROM orders;") == \
+        "SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM orders\nLIMIT 1000;"
+
+
+def test_rewrite_keeps_existing_limit(guard):
+    assert guard.rewrite("select city from offices limit 5") == \
+        "select /*+ MAX_EXECUTION_TIME(5000) */ city from offices limit 5;"
+
+
+def test_rewrite_puts_hint_on_main_select_of_cte(guard):
+    sql = ("WITH totals (customer, total) AS (SELECT customerNumber, SUM(amount) FROM payments GROUP BY customerNumber), "
+           "top AS (SELECT customer FROM totals WHERE total > (SELECT AVG(total) FROM totals)) "
+           "SELECT customer FROM top")
+    assert guard.rewrite(sql) == sql.replace(
+        ") SELECT customer FROM top", ") SELECT /*+ MAX_EXECUTION_TIME(5000) */ customer FROM top") + "\nLIMIT 1000;"
+
+
+def test_recorded_rewrite_is_reported(guard):
+    rewritten = guard.record_rewrite("SELECT * FROM orders")
+    assert guard.rewritten_sql("select *  from ORDERS;") == rewritten
+    assert guard.rewritten_sql("SELECT * FROM customers") is None
+
+
+class ExplainEngine:
+    """
+    Stands in for the engine: EXPLAIN returns the given plan rows, or raises when there are none.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.explained = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.explained += 1
+        if self.plan is None:
+            from sqlalchemy.exc import OperationalError
+            raise OperationalError(str(statement), {}, Exception("unknown column"))
+        return self
+
+    def mappings(self):
+        return self
+
+    def fetchall(self):
+        return self.plan
+
+
+def cost_guard(plan):
+    return QueryCostGuard(engine=ExplainEngine(plan), row_budget=1000, reject_factor=10, max_execution_ms=5000, rewrite_limit=100)
+
+
+def test_estimate_multiplies_tables_within_a_select_and_sums_selects():
+    guard = cost_guard([{"id": 1, "rows": 20}, {"id": 1, "rows": 30}, {"id": 2, "rows": 7}, {"id": 2, "rows": None}])
+    assert guard.estimate_rows("SELECT 1") == 20 * 30 + 7
+    guard.estimate_rows("select  1;")
+    assert guard.engine.explained == 1  # cached per canonical query
+
+
+def test_check_allows_within_budget():
+    guard = cost_guard([{"id": 1, "rows": 1000}])
+    assert guard.check("SELECT * FROM offices") == ("allow", "SELECT * FROM offices", 1000)
+    assert guard.rewritten_sql("SELECT * FROM offices") is None
+
+
+def test_check_rewrites_up_to_reject_factor():
+    guard = cost_guard([{"id": 1, "rows": 5000}])
+    decision, sql, estimate = guard.check("SELECT * FROM orders")
+    assert (decision, estimate) == ("rewrite", 5000)
+    assert sql == "SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM orders\nLIMIT 100;"
+    assert guard.rewritten_sql("SELECT * FROM orders") == sql
+
+
+def test_check_rejects_beyond_reject_factor():
+    guard = cost_guard([{"id": 1, "rows": 10001}])
+    assert guard.check("SELECT * FROM orderdetails, orders") == ("reject", None, 10001)
+    assert guard.get_stats()["rejected"] == 1
+
+
+def test_check_lets_unexplainable_queries_run():
+    guard = cost_guard(None)
+    assert guard.check("SELECT missing FROM orders") == ("allow", "SELECT missing FROM orders", None)
+    assert guard.get_stats()["unexplained"] == 1
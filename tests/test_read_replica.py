@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from read_replica import translate_query
+
+
+def test_mysql_functions_are_translated():
+    assert translate_query("SELECT CONCAT(firstName, ' ', lastName) FROM employees WHERE YEAR(hired) = 2004") == \
+        "SELECT (firstName || ' ' || lastName) FROM employees WHERE CAST(strftime('%Y', hired) AS INTEGER) = 2004"
+    assert translate_query("SELECT IF(a > 1, 'x', 'y') FROM t WHERE d < NOW()") == \
+        "SELECT (CASE WHEN a > 1 THEN 'x' ELSE 'y' END) FROM t WHERE d < datetime('now')"
+
+
+def test_quoting_and_division():
+    assert translate_query('SELECT `order id` FROM t WHERE name = "it\'s"') == \
+        "SELECT \"order id\" FROM t WHERE name = 'it''s'"
+    assert translate_query("SELECT buyPrice / 2 FROM products;") == "SELECT buyPrice * 1.0 / 2 FROM products"
+
+
+def test_literals_are_left_alone():
+    assert translate_query("SELECT 'a/b', 'YEAR(x)' FROM t") == "SELECT 'a/b', 'YEAR(x)' FROM t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT DATE_FORMAT(orderDate, '%Y') FROM orders",
+    "SELECT 1; DELETE FROM t",
+    "UPDATE t SET a = 1",
+    "SELECT * FROM t FOR UPDATE",
+    "SELECT a || b FROM t",
+])
+def test_ineligible_queries(sql):
+    assert translate_query(sql) is None
+
+
+def test_decimal_columns_only_as_bare_select_items():
+    decimals = ("amount",)
+    assert translate_query("SELECT customerNumber, p.amount AS paid FROM payments p", decimals) is not None
+    assert translate_query("SELECT amount FROM payments ORDER BY amount", decimals) is None
+    assert translate_query("SELECT SUM(amount) FROM payments", decimals) is None
+    assert translate_query("SELECT customerNumber FROM payments WHERE amount > 100", decimals) is None
+    assert translate_query("SELECT * FROM payments ORDER BY 2", decimals) is None
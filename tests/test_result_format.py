@@ -0,0 +1,36 @@
+import datetime
+import decimal
+
+from result_format import MORE_ROWS_PATTERN, ResultSummary, format_compact, format_value, marker_total
+
+
+def test_plain_values():
+    assert format_value(None) == "NULL"
+    assert format_value(decimal.Decimal("1234.50")) == "1234.50"
+    assert format_value(datetime.date(2003, 1, 6)) == "2003-01-06"
+    assert format_value("Mini Gifts") == "Mini Gifts"
+
+
+def test_ambiguous_strings_are_json_quoted():
+    for text in ["", "NULL", "a | b", "two\nlines", " padded", '"Hello" world']:
+        assert format_value(text).startswith('"'), text
+
+
+def test_compact_rows():
+    summary = ResultSummary()
+    summary.set_columns(["name", "amount"])
+    rows = [('"Hello" world', decimal.Decimal("1.50"))]
+    for row in rows:
+        summary.add(row)
+    assert format_compact(rows, len(rows), summary) == 'name | amount\n"\\"Hello\\" world" | 1.50'
+
+
+def test_more_rows_marker_reports_counted_total_or_lower_bound():
+    summary = ResultSummary()
+    summary.set_columns(["n"])
+    counted = format_compact([(1,), (2,)], 250, summary)
+    assert counted.endswith("\n(248 more rows not shown, 250 rows in total)")
+    assert marker_total(MORE_ROWS_PATTERN.search(counted)) == 250
+    uncounted = format_compact([(1,), (2,)], None, summary)
+    assert uncounted.endswith("\n(more than 2 rows, only the first 2 shown)")
+    assert marker_total(MORE_ROWS_PATTERN.search(uncounted)) == 3
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from util_schema_introspection import match_tables, render_table_ddl
+
+
+def test_match_tables_is_case_insensitive():
+    metadata = {"customers": {}, "orderdetails": {}}
+    assert match_tables(metadata, ["Customers", "orderdetails", "payments"]) == \
+        ({"Customers": "customers", "orderdetails": "orderdetails"}, ["payments"])
+
+
+def test_table_options_are_rendered_without_auto_increment_counter():
+    table_meta = {
+        "columns": [{"name": "id", "column_type": "int", "nullable": False, "default": None, "extra": "auto_increment",
+                     "comment": "", "charset": None, "collation": None}],
+        "indexes": {"PRIMARY": {"unique": True, "columns": ["`id`"]}},
+        "foreign_keys": {},
+        "engine": "InnoDB", "charset": "utf8mb4", "collation": "utf8mb4_0900_ai_ci", "comment": "Log",
+        "options": ["row_format=DYNAMIC"],
+    }
+    assert render_table_ddl("events", table_meta) == (
+        "CREATE TABLE `events` (\n  `id` int NOT NULL AUTO_INCREMENT,\n  PRIMARY KEY (`id`)\n) "
+        "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci ROW_FORMAT=DYNAMIC COMMENT='Log'")
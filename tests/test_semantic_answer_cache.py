@@ -0,0 +1,43 @@
+import re
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_community")
+
+from semantic_answer_cache import SemanticAnswerCache, question_entities
+
+
+class WordEmbeddings:
+    """Bag of lowercase words without digits, so questions differing only in a number embed identically."""
+
+    VOCABULARY = ["how", "many", "orders", "were", "placed", "in", "by", "customer", "list", "the", "customers"]
+
+    def embed_query(self, text):
+        words = re.findall(r"[a-z]+", text.lower())
+        return [float(words.count(word)) for word in self.VOCABULARY] + [0.001]
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticAnswerCache(WordEmbeddings(), threshold=0.92, ttl=3600, max_entries=10)
+    cache.store("How many orders were placed in 2003?", "SELECT COUNT(*) FROM orders WHERE YEAR(orderDate) = 2003;", "There are 111 orders.")
+    return cache
+
+
+def test_question_entities():
+    assert question_entities("How many orders did 'Mini Gifts' place in France in 2003?") == {"mini gifts", "france", "2003"}
+
+
+def test_rewording_with_same_entities_hits(cache):
+    assert cache.lookup("how many orders were placed in 2003")["answer"] == "There are 111 orders."
+
+
+def test_other_number_misses(cache):
+    assert cache.lookup("How many orders were placed in 2004?") is None
+    assert cache.get_stats()["entity_mismatches"] == 1
+
+
+def test_invalidate_tables(cache):
+    assert cache.invalidate_tables(["Orders"]) == 1
+    assert cache.lookup("How many orders were placed in 2003?") is None
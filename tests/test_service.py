@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langchain_core")
+
+from langchain_core.runnables import RunnableLambda
+
+from service import ServiceShuttingDown, SQLQAService, batch_error
+
+
+def started_service(chain, request_timeout=1.0):
+    """A service with the pipeline replaced by `chain`, without importing main."""
+    service = SQLQAService(llm_concurrency=2, db_concurrency=2, request_timeout=request_timeout)
+    service.pipeline = SimpleNamespace(table_info="", few_shot_prompt=3, answer_cache=None)
+    service.chain = service.cached_chain = chain
+    service._idle = asyncio.Event()
+    service._idle.set()
+    return service
+
+
+def answering_chain(calls, delay=0.0):
+    async def answer(inputs):
+        calls.append(inputs["question"])
+        await asyncio.sleep(delay)
+        if "fail" in inputs["question"]:
+            raise ValueError("no such table")
+        return {"answer": inputs["question"].upper(), "sql_query": "SELECT 1;", "result": "[(1,)]"}
+
+    return RunnableLambda(lambda inputs: None, afunc=answer)
+
+
+def test_answer_returns_answer_and_sql():
+    service = started_service(answering_chain([]))
+    assert asyncio.run(service.answer("how many orders")) == {"answer": "HOW MANY ORDERS", "sql_query": "SELECT 1;", "cached": False}
+    assert service._in_flight == 0
+
+
+def test_concurrent_identical_questions_run_once():
+    calls = []
+    service = started_service(answering_chain(calls, delay=0.01))
+
+    async def scenario():
+        return await asyncio.gather(service.answer("How many orders?"), service.answer("how many orders"))
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert calls == ["How many orders?"]
+
+
+def test_batch_reports_failures_per_question():
+    service = started_service(answering_chain([]))
+    answers = asyncio.run(service.answer_batch(["list offices", "fail please", "List offices?"]))
+    assert answers[0] == answers[2]
+    assert answers[1] == {"error": "no such table", "status": 500}
+
+
+def test_timeout_and_shutdown():
+    service = started_service(answering_chain([], delay=0.2), request_timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(service.answer("slow question"))
+    assert batch_error(asyncio.TimeoutError())["status"] == 504
+
+    service._closing = True
+    with pytest.raises(ServiceShuttingDown):
+        asyncio.run(service.answer("how many orders"))
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from util import canonicalize_sql, extract_referenced_tables, repair_sql_query, split_sql_statements
+
+
+def test_code_fence_and_prefix():
+    sql, repairs = repair_sql_query("SQLQuery: ```sql\nSELECT COUNT(*) FROM employees;\n```")
+    assert sql == "SELECT COUNT(*) FROM employees;"
+    assert "code_fence" in repairs
+
+
+def test_first_of_several_statements():
+    sql, repairs = repair_sql_query("SELECT 1; SELECT 2;")
+    assert sql == "SELECT 1;"
+    assert "multiple_statements" in repairs
+
+
+def test_label_trailer_is_cut():
+    sql, _ = repair_sql_query("SELECT city FROM offices\nSQLResult: [('Paris',)]\nAnswer: Paris")
+    assert sql == "SELECT city FROM offices;"
+
+
+def test_unterminated_cte_keeps_blank_lines():
+    response = (
+        "WITH totals AS (\n  SELECT customerNumber, SUM(amount) AS total FROM payments GROUP BY customerNumber\n)\n\n"
+        ", ranked AS (\n  SELECT customerNumber, total FROM totals\n)\n\n"
+        "SELECT customerNumber FROM ranked ORDER BY total DESC LIMIT 5"
+    )
+    sql, repairs = repair_sql_query(response)
+    assert sql == response + ";"
+    assert repairs == ["cte", "missing_terminator"]
+
+
+def test_unterminated_query_drops_prose_paragraph():
+    sql, _ = repair_sql_query(
+        "SELECT customerName\nFROM customers\n\nWHERE country = 'France'\n\n"
+        "This query lists the customers located in France.")
+    assert sql == "SELECT customerName\nFROM customers\n\nWHERE country = 'France';"
+
+
+def test_no_sql_raises():
+    with pytest.raises(ValueError):
+        repair_sql_query("I could not find a matching table.")
+
+
+def test_split_ignores_semicolons_in_literals_and_comments():
+    statements = split_sql_statements("SELECT 'a;b' -- x;y\nFROM t; SELECT 2")
+    assert [s["text"].strip() for s in statements] == ["SELECT 'a;b' -- x;y\nFROM t", "SELECT 2"]
+    assert [s["terminated"] for s in statements] == [True, False]
+
+
+def test_canonicalize_keeps_literals():
+    assert canonicalize_sql("SELECT `City` FROM Offices WHERE country = 'USA' ;") == \
+        canonicalize_sql("select city\n  from offices where country='USA'")
+    assert canonicalize_sql("SELECT 1 WHERE a = 'USA'") != canonicalize_sql("SELECT 1 WHERE a = 'usa'")
+
+
+def test_canonicalize_does_not_normalize_inside_literals():
+    assert canonicalize_sql("SELECT 1 FROM t WHERE n = 'Mini  Gifts'") != canonicalize_sql("SELECT 1 FROM t WHERE n = 'Mini Gifts'")
+    assert canonicalize_sql("SELECT 1 FROM t WHERE n = 'x - y'") != canonicalize_sql("SELECT 1 FROM t WHERE n = 'x-y'")
+    assert canonicalize_sql("SELECT 1  FROM t WHERE n = 'A  (b)'") == "select 1 from t where n='A  (b)'"
+
+
+def test_referenced_tables_include_comma_joins():
+    sql = ("SELECT c.customerName FROM orders o, customers AS c, `classicmodels`.`payments` "
+           "JOIN employees e ON e.employeeNumber = c.salesRepEmployeeNumber WHERE o.status IN ('a', 'b') GROUP BY 1, 2")
+    assert extract_referenced_tables(sql) == {"orders", "customers", "payments", "employees"}
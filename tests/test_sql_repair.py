@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.runnables import RunnableLambda
+
+from query_cost_guard import QueryCostGuard
+from sql_repair import SQLRepairer
+
+
+class GuardedTool:
+    """
+    Stands in for the query tool: runs every query through the cost guard's rewrite.
+    """
+
+    def __init__(self):
+        self.cost_guard = QueryCostGuard(engine=None, max_execution_ms=5000, rewrite_limit=100)
+        self.executed = []
+
+    def invoke(self, sql):
+        sql = self.cost_guard.record_rewrite(sql)
+        self.executed.append(sql)
+        return "n\n1"
+
+
+def test_generated_sql_is_kept_and_rewrite_is_reported_separately():
+    tool = GuardedTool()
+    repairer = SQLRepairer(RunnableLambda(lambda _: "SELECT 1;"), tool)
+    state = repairer.execute_with_retry({"question": "List the orders", "sql_query": "SELECT * FROM orders;"})
+    assert state["sql_query"] == "SELECT * FROM orders;"
+    assert state["executed_sql_query"] == tool.executed[0] == "SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM orders\nLIMIT 100;"
+
+
+def test_unchanged_query_is_reported_as_executed():
+    class PlainTool:
+        def invoke(self, sql):
+            return "n\n1"
+
+    repairer = SQLRepairer(RunnableLambda(lambda _: "SELECT 1;"), PlainTool())
+    state = repairer.execute_with_retry({"question": "How many?", "sql_query": "SELECT COUNT(*) FROM orders;"})
+    assert state["sql_query"] == state["executed_sql_query"] == "SELECT COUNT(*) FROM orders;"
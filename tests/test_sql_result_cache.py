@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+import sql_result_cache
+from sql_result_cache import SQLResultCache
+
+
+def test_equivalent_queries_share_an_entry():
+    cache = SQLResultCache(max_bytes=10_000, ttl=0)
+    cache.put("SELECT city FROM offices;", "[('Paris',)]")
+    assert cache.get("select city\n  from `offices`") == "[('Paris',)]"
+    assert cache.get("SELECT city FROM offices WHERE country = 'France'") is None
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sql_result_cache.time, "monotonic", lambda: now[0])
+    cache = SQLResultCache(max_bytes=10_000, ttl=60)
+    cache.put("SELECT 1 FROM offices", "[(1,)]")
+    now[0] += 30
+    assert cache.get("SELECT 1 FROM offices") == "[(1,)]"
+    now[0] += 31
+    assert cache.get("SELECT 1 FROM offices") is None
+    assert cache.get_stats()["expirations"] == 1 and cache.get_stats()["bytes"] == 0
+
+
+def test_size_bound_evicts_least_recently_used():
+    result = "x" * 400
+    cache = SQLResultCache(max_bytes=1000, ttl=0)
+    cache.put("SELECT a FROM t1", result)
+    cache.put("SELECT b FROM t2", result)
+    cache.get("SELECT a FROM t1")
+    cache.put("SELECT c FROM t3", result)
+    assert cache.get("SELECT b FROM t2") is None
+    assert cache.get("SELECT a FROM t1") == result
+    assert cache.get_stats()["evictions"] == 1
+    cache.put("SELECT d FROM t4", "x" * 2000)
+    assert cache.get("SELECT d FROM t4") is None
+
+
+def test_invalidate_tables_drops_only_readers():
+    cache = SQLResultCache(max_bytes=10_000, ttl=0)
+    cache.put("SELECT * FROM orders o JOIN customers c ON o.customerNumber = c.customerNumber", "[]")
+    cache.put("SELECT city FROM offices", "[]")
+    assert cache.invalidate_tables({"Customers"}) == 1
+    assert cache.get("SELECT city FROM offices") == "[]"
+    assert cache.get_stats()["entries"] == 1
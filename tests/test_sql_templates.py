@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from sql_templates import SQLTemplateStore, align, tokenize
+
+QUESTION = "Which product line has the highest total revenue from customers in France"
+SQL = (
+    "SELECT p.productLine, SUM(od.quantityOrdered * od.priceEach) AS rev FROM products p "
+    "JOIN orderdetails od ON p.productCode = od.productCode JOIN orders o ON od.orderNumber = o.orderNumber "
+    "JOIN customers c ON o.customerNumber = c.customerNumber WHERE c.country = 'France' "
+    "GROUP BY p.productLine ORDER BY rev DESC LIMIT 1;"
+)
+
+
+@pytest.fixture
+def store():
+    store = SQLTemplateStore(engine=None, path="")
+    assert store.learn(QUESTION, SQL) is not None
+    return store
+
+
+def test_matches_question_with_other_slot_value(store):
+    template, confidence, values = store.match(
+        "Which product line has the highest total revenue from customers in Spain")
+    assert confidence == 1.0
+    assert values == {"slot0": "Spain"}
+
+
+def test_filler_words_may_differ(store):
+    assert store.match("Which product line has the highest total revenue from the customers in Spain?")
+
+
+def test_antonym_is_rejected(store):
+    assert store.match("Which product line has the lowest total revenue from customers in Spain") is None
+
+
+def test_negation_is_rejected(store):
+    assert store.match("Which product line has the highest total revenue from customers not in Spain") is None
+    assert store.match("Which product line has the highest total revenue from customers in not Spain") is None
+    assert store.match("Which product line doesn't have the highest total revenue from customers in Spain") is None
+
+
+def test_align_rejects_inserted_content_word():
+    template = ["orders", "for", "customer", 0]
+    question = "orders shipped for customer Atelier graphique"
+    assert align(template, tokenize(question), question) is None
+    question = "the orders for customer Atelier graphique"
+    assert align(template, tokenize(question), question)[1] == {0: "Atelier graphique"}
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from streaming_query import limit_query
+
+
+def test_limit_is_pushed_to_the_server():
+    assert limit_query("SELECT * FROM orders ORDER BY orderDate;", 101) == "SELECT * FROM orders ORDER BY orderDate\nLIMIT 101"
+    assert limit_query("WITH t AS (SELECT 1) SELECT * FROM t", 5) == "WITH t AS (SELECT 1) SELECT * FROM t\nLIMIT 5"
+
+
+def test_own_limit_and_non_select_are_kept():
+    for query in ["SELECT * FROM orders LIMIT 10;", "SELECT * FROM orders LIMIT 5, 10", "SELECT * FROM t FOR UPDATE",
+                  "SHOW TABLES", "UPDATE t SET a = 1"]:
+        assert limit_query(query, 101) == query
@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("langchain_community")
+
+from sqlalchemy import text
+
+from local_database import create_local_engine
+from summary_tables import SummaryTableManager
+
+REVENUE_BY_LINE = ("SELECT p.productLine, SUM(od.quantityOrdered * od.priceEach) AS revenue "
+                   "FROM products p JOIN orderdetails od ON p.productCode = od.productCode "
+                   "GROUP BY p.productLine ORDER BY revenue DESC")
+
+
+@pytest.fixture(scope="module")
+def manager():
+    manager = SummaryTableManager(create_local_engine(), max_lag_s=3600)
+    manager.refresh()
+    return manager
+
+
+def rows(manager, sql):
+    with manager.engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(sql)).fetchall()]
+
+
+def test_aggregate_is_rewritten_to_the_summary(manager):
+    rewritten = manager.rewrite(REVENUE_BY_LINE)
+    assert rewritten == ("SELECT productLine, SUM(totalRevenue) AS revenue FROM summary_product_sales "
+                         "GROUP BY productLine ORDER BY revenue desc;")
+    assert [(line, round(revenue, 2)) for line, revenue in rows(manager, rewritten)] == \
+        [(line, round(revenue, 2)) for line, revenue in rows(manager, REVENUE_BY_LINE)]
+
+
+def test_literals_and_aliases_survive_the_rewrite(manager):
+    sql = ("SELECT products.productName, COUNT(*) FROM products JOIN orderdetails ON products.productCode = orderdetails.productCode "
+           "WHERE products.productLine = 'Classic Cars' GROUP BY products.productCode")
+    rewritten = manager.rewrite(sql)
+    assert "FROM summary_product_sales WHERE productLine='Classic Cars'" in rewritten
+    assert "SUM(orderLines)" in rewritten
+    assert sorted(rows(manager, rewritten)) == sorted(rows(manager, sql))
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT p.productName, od.quantityOrdered FROM products p JOIN orderdetails od ON p.productCode = od.productCode",
+    "SELECT AVG(od.priceEach) FROM products p JOIN orderdetails od ON p.productCode = od.productCode",
+    "SELECT SUM(od.quantityOrdered) FROM products p JOIN orderdetails od ON p.productCode = od.productCode "
+    "WHERE od.orderNumber > 10200",
+    "SELECT COUNT(*) FROM orders",
+])
+def test_queries_the_summary_cannot_answer_are_unchanged(manager, sql):
+    assert manager.rewrite(sql) == sql
+
+
+def test_appended_rows_are_merged():
+    manager = SummaryTableManager(create_local_engine(), max_lag_s=3600)
+    manager.refresh()
+    query = ("SELECT p.productCode, SUM(od.quantityOrdered) FROM products p JOIN orderdetails od "
+             "ON p.productCode = od.productCode WHERE p.productCode = 'S10_1678' GROUP BY p.productCode")
+    before = rows(manager, query)
+    with manager.engine.begin() as connection:
+        connection.execute(text("INSERT INTO orderdetails (orderNumber, productCode, quantityOrdered, priceEach, orderLineNumber) "
+                                "VALUES (99999, 'S10_1678', 5, 90.00, 1)"))
+    manager.refresh()
+    assert manager.stats["delta_merges"] >= 1 and manager.stats["inconsistent"] == 0
+    assert rows(manager, manager.rewrite(query)) == [("S10_1678", before[0][1] + 5)]
@@ -2,25 +2,48 @@ import re
 import os
 from os.path import join, dirname
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import inspect
+from db_engine import get_engine
+from util_schema_introspection import fetch_schema_metadata, match_tables, render_column_info
 
 
 # Loading the environment variables
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
-def get_table_info(tables_to_inspect):
+def get_table_info(tables_to_inspect, mode=None):
     """
     Fetches schema information for the tables provided in the 'tables_to_inspect' list.
+    mode 'bulk' (default, or SCHEMA_INTROSPECTION_MODE) reads every table from information_schema
+    in a fixed number of queries; 'per_table' uses the SQLAlchemy inspector one table at a time.
+    Bulk matches table names case-insensitively and falls back to per_table for names it misses.
+    """
+    mode = mode or os.getenv('SCHEMA_INTROSPECTION_MODE', 'bulk')
+    # Shared engine - reuses pooled connections instead of a new pool per call
+    engine = get_engine()
+
+    if mode != 'bulk':
+        return inspect_table_info(engine, tables_to_inspect)
+
+    with engine.connect() as connection:
+        metadata = fetch_schema_metadata(connection, tables_to_inspect)
+    found, missing = match_tables(metadata, tables_to_inspect)
+    schema_info = {table: render_column_info(metadata[key]) for table, key in found.items()}
+    if missing:
+        schema_info.update(inspect_table_info(engine, missing))
+    return {table: schema_info[table] for table in tables_to_inspect if table in schema_info}
+
+def inspect_table_info(engine, tables_to_inspect):
+    """
+    Per-table path of get_table_info: the SQLAlchemy inspector, one table at a time.
     """
-    # Database connection parameters
-    engine = create_engine(f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}")
     inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
     schema_info = {}
-    
+
     # Only get schema details for tables in the provided list
     for table in tables_to_inspect:
-        if table in inspector.get_table_names():
+        if table in table_names:
             columns = inspector.get_columns(table)
             schema_info[table] = [{"name": col["name"], "type": str(col["type"])} for col in columns]
         else:
@@ -30,13 +53,233 @@ def get_table_info(tables_to_inspect):
 
 # Extract SQL query from the response
 def extract_sql_query(response: str) -> str:
-    # Regular expression to extract SQL query
-    match = re.search(r"(SELECT.*?;)", response, re.DOTALL)
-    if match:
-        return match.group(1)
-    else:
+    sql, _ = repair_sql_query(response)
+    return sql
+
+# Deterministic local repair of an LLM response into one runnable statement.
+# Handles code fences, "SQLQuery:" style prefixes, CTEs (WITH ... AS), a missing
+# terminator and several statements in one response. Returns (sql, repairs applied).
+def repair_sql_query(response: str):
+    repairs = []
+    text = response
+
+    fence = re.search(r"```(?:sql|mysql)?[ \t]*\n?(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if fence:
+        text = fence.group(1)
+        repairs.append("code_fence")
+    elif "```" in text:
+        text = re.sub(r"```(?:sql|mysql)?", "", text, flags=re.IGNORECASE)
+        repairs.append("code_fence")
+
+    start = (re.search(r"\bWITH\s+(?:RECURSIVE\s+)?`?\w+`?\s*(?:\([^)]*\)\s*)?AS\s*\(", text, re.IGNORECASE)
+             or re.search(r"\bSELECT\b", text)
+             or re.search(r"\bSELECT\b", text, re.IGNORECASE))
+    if not start:
         raise ValueError("No valid SQL query found in the response.")
+    if start.group(0).upper().startswith("WITH"):
+        repairs.append("cte")
+    text = text[start.start():]
+
+    # Anything the model appended after the query
+    text = re.split(r"\n\s*(?:SQLResult|Answer|Explanation)\s*:", text, maxsplit=1)[0]
+
+    statements = split_sql_statements(text)
+    sql = statements[0]
+    if len(statements) > 1:
+        repairs.append("multiple_statements")
+    if not sql["terminated"]:
+        repairs.append("missing_terminator")
+        # Without a terminator, the query ends where a paragraph of prose starts; blank lines
+        # inside the query (between the parts of a CTE) are kept
+        sql["text"] = cut_trailing_prose(sql["text"])
+
+    return sql["text"].strip() + ";", repairs
+
+# A line that continues a SQL statement, and a line of prose the model wrote after one
+SQL_CONTINUATION_PATTERN = re.compile(
+    r"^(?:[(),*]|--|#|/\*|(?:SELECT|FROM|WHERE|JOIN|INNER|LEFT|RIGHT|CROSS|FULL|NATURAL|ON|AND|OR|NOT|GROUP|"
+    r"ORDER|HAVING|LIMIT|OFFSET|UNION|INTERSECT|EXCEPT|WITH|AS|CASE|WHEN|THEN|ELSE|END|WINDOW|USING|VALUES)\b)",
+    re.IGNORECASE,
+)
+PROSE_LINE_PATTERN = re.compile(r"^[A-Z][a-z']*\b(?:[^=<>()*;`\n]*\s){2,}[^=<>()*;`\n]*$")
+
+# Cut unterminated SQL at the first blank line followed by a paragraph of prose
+def cut_trailing_prose(text: str) -> str:
+    paragraphs = re.split(r"(\n\s*\n)", text)
+    kept = paragraphs[0]
+    for separator, paragraph in zip(paragraphs[1::2], paragraphs[2::2]):
+        first_line = paragraph.strip().split("\n", 1)[0].strip()
+        if not SQL_CONTINUATION_PATTERN.match(first_line) and PROSE_LINE_PATTERN.match(first_line):
+            break
+        kept += separator + paragraph
+    return kept
+
+# Split SQL text into statements on semicolons outside string literals and comments
+def split_sql_statements(text: str):
+    statements = []
+    current = ""
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(text):
+        chunk = text[position:match.start()]
+        while ";" in chunk:
+            before, chunk = chunk.split(";", 1)
+            current += before
+            statements.append({"text": current, "terminated": True})
+            current = ""
+        current += chunk + match.group(0)
+        position = match.end()
+    chunk = text[position:]
+    while ";" in chunk:
+        before, chunk = chunk.split(";", 1)
+        current += before
+        statements.append({"text": current, "terminated": True})
+        current = ""
+    current += chunk
+    if current.strip():
+        statements.append({"text": current, "terminated": False})
+    return [statement for statement in statements if statement["text"].strip()]
     
+# Split a list (function arguments, select items) on the separators outside parentheses
+def split_top_level(text: str, separator: str = ","):
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    parts.append(current.strip())
+    return parts
+
+# Index just past the parenthesis closing the one opened before `start`, or -1 when unbalanced
+def find_closing_paren(text: str, start: int) -> int:
+    depth = 1
+    for index in range(start, len(text)):
+        depth += {"(": 1, ")": -1}.get(text[index], 0)
+        if depth == 0:
+            return index + 1
+    return -1
+
+# A table reference in a FROM list: [schema.]table with an optional alias
+TABLE_REFERENCE_PATTERN = re.compile(
+    r"((?:`[^`]+`|\w+)(?:\s*\.\s*(?:`[^`]+`|\w+))?)"
+    r"(?:\s+(?:AS\s+)?(?!(?:on|where|join|inner|left|right|cross|natural|straight_join|group|order|limit|having|"
+    r"using|union|window|for|lock)\b)(?:`[^`]+`|\w+))?",
+    re.IGNORECASE,
+)
+LIST_SEPARATOR_PATTERN = re.compile(r"\s*,\s*")
+
+# Extract the table names a SQL query reads from (FROM / JOIN clauses, including comma joins)
+def extract_referenced_tables(sql: str) -> set:
+    tables = set()
+    for match in re.finditer(r"\b(?:FROM|JOIN)\s+", sql, re.IGNORECASE):
+        position = match.end()
+        while True:
+            reference = TABLE_REFERENCE_PATTERN.match(sql, position)
+            if not reference:
+                break
+            tables.add(reference.group(1).split(".")[-1].strip().strip("`").lower())
+            separator = LIST_SEPARATOR_PATTERN.match(sql, reference.end())
+            if not separator:
+                break
+            position = separator.end()
+    return tables
+
+# String literals, quoted identifiers and comments, in the order they must be recognised
+SQL_TOKEN_PATTERN = re.compile(
+    r"(?P<string>'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\")"
+    r"|(?P<identifier>`[^`]*`)"
+    r"|(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)",
+    re.DOTALL,
+)
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Normalizes a SQL query so that queries differing only in whitespace, keyword/alias case,
+    comments, identifier backticks or trailing semicolons share one cache key.
+    String literals are kept verbatim: only the text around them is normalized.
+    """
+    parts = []
+    literals = []
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        parts.append(sql[position:match.start()].lower())
+        if match.group("string"):
+            # Placeholder without whitespace or operators, replaced after normalization
+            parts.append(f"\x00{len(literals)}\x00")
+            literals.append(match.group("string"))
+        elif match.group("identifier"):
+            parts.append(match.group("identifier")[1:-1].lower())
+        else:
+            parts.append(" ")
+        position = match.end()
+    parts.append(sql[position:].lower())
+
+    canonical = re.sub(r"\s+", " ", "".join(parts)).strip()
+    canonical = re.sub(r"\s*([(),=<>+*/-])\s*", r"\1", canonical)
+    canonical = canonical.rstrip("; ").strip()
+    return re.sub(r"\x00(\d+)\x00", lambda m: literals[int(m.group(1))], canonical)
+
+# Literals, table aliases and compared columns, for rewriting the literals of generated SQL
+NUMBER_PATTERN = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+COMPARISON_PATTERN = re.compile(r"(?:(`?\w+`?)\s*\.\s*)?(`?\w+`?)\s*(?:=|<>|!=)\s*$")
+TABLE_ALIAS_PATTERN = re.compile(
+    r"\b(?:from|join)\s+(`?[\w.]+`?)(?:\s+(?:as\s+)?"
+    r"(?!(?:on|where|join|inner|left|right|cross|natural|group|order|limit|having|using|union)\b)(`?\w+`?))?",
+    re.IGNORECASE,
+)
+
+def find_literals(sql):
+    """
+    (start, end, kind, value) of each single-quoted string and numeric literal outside
+    comments and quoted identifiers.
+    """
+    literals = []
+    position = 0
+
+    def numbers(chunk, offset):
+        for match in NUMBER_PATTERN.finditer(chunk):
+            literals.append((offset + match.start(), offset + match.end(), "number", match.group(0)))
+
+    for match in SQL_TOKEN_PATTERN.finditer(sql):
+        numbers(sql[position:match.start()], position)
+        if match.group("string") and match.group(0).startswith("'"):
+            value = match.group(0)[1:-1].replace("''", "'").replace("\\'", "'").replace("\\\\", "\\")
+            literals.append((match.start(), match.end(), "string", value))
+        position = match.end()
+    numbers(sql[position:], position)
+    return literals
+
+def table_aliases(sql):
+    """
+    alias (and table name) -> table for the FROM / JOIN clauses of the query, lowercased.
+    """
+    code = SQL_TOKEN_PATTERN.sub(lambda m: "''" if m.group("string") else m.group(0), sql)
+    aliases = {}
+    for match in TABLE_ALIAS_PATTERN.finditer(code):
+        table = match.group(1).strip("`").split(".")[-1].strip("`").lower()
+        aliases[table] = table
+        if match.group(2):
+            aliases[match.group(2).strip("`").lower()] = table
+    return aliases
+
+def resolve_column(sql, start, aliases):
+    """
+    (table, column) compared with the literal starting at `start`, or None when the literal is
+    not the right-hand side of a plain comparison or its column cannot be tied to one table.
+    """
+    match = COMPARISON_PATTERN.search(sql[:start])
+    if not match:
+        return None
+    column = match.group(2).strip("`")
+    if match.group(1):
+        table = aliases.get(match.group(1).strip("`").lower())
+    else:
+        tables = set(aliases.values())
+        table = tables.pop() if len(tables) == 1 else None
+    return (table, column) if table else None
+
 # Helper function to ensure environment variables are correctly set
 def get_env_variable(var_name, default=None):
     value = os.environ.get(var_name, default)
@@ -1,19 +1,26 @@
-from sqlalchemy import create_engine, inspect
+from db_engine import get_engine
 import os
+import re
+import hashlib
+import threading
+import time
 from os.path import join, dirname
 from dotenv import load_dotenv
 
 from langchain_community.utilities.sql_database import SQLDatabase
 from prettytable import PrettyTable
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
+from util_schema_introspection import fetch_schema_metadata, fetch_table_versions, match_tables, render_table_ddl
+from table_info_builder import build_budgeted_table_info, count_tokens
 
 # Loading the environment variables
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
-# Initialize the SQLAlchemy engine (replace with your database URI)
-engine = create_engine(f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}")
+# Shared SQLAlchemy engine (configured in db_engine.py)
+engine = get_engine()
 
 
 # Step 1: Define the find_relevant_group method
@@ -23,7 +30,16 @@ table_groups = {
     "Sales Detailed Report": ["customers", "employees", "orders", "orderdetails", "products", "productlines"]
 }
 
-def find_relevant_group(question):
+# Optional embedding-based router (see table_router.py); keyword matching is the fallback
+table_router = None
+
+def set_table_router(router):
+    global table_router
+    table_router = router
+
+def find_relevant_group(question, question_vector=None):
+    if table_router is not None:
+        return table_router.route(question, question_vector)
     if "Customer" in question:
         return table_groups["Customer Order"]
     elif "Product" in question or "Order" in question:
@@ -40,42 +56,180 @@ def get_table_ddl(table):
 
 
 # Step 2: Define the get_table_info method (fetch schema)
-def get_table_info(tables_to_inspect):
+def get_table_info(tables_to_inspect, mode=None):
     """
     Fetches schema information for the tables provided in the 'tables_to_inspect' list.
+    mode 'bulk' (default, or SCHEMA_INTROSPECTION_MODE) builds the DDL locally from a fixed
+    number of information_schema queries; 'per_table' runs SHOW CREATE TABLE for each table.
+    Bulk matches table names case-insensitively (as util.get_table_info does) and falls back
+    to per_table for names it misses; tables found by neither are left out with a message.
     """
+    mode = mode or os.getenv('SCHEMA_INTROSPECTION_MODE', 'bulk')
     schema_info = {}
+    missing = tables_to_inspect
+
+    if mode == 'bulk':
+        with engine.connect() as connection:
+            metadata = fetch_schema_metadata(connection, tables_to_inspect)
+        found, missing = match_tables(metadata, tables_to_inspect)
+        schema_info = {table: render_table_ddl(key, metadata[key]) for table, key in found.items()}
 
     # Fetch table creation SQL
-    for table in tables_to_inspect:
-        ddl = get_table_ddl(table)
-        schema_info[table] = ddl
-    
-    return schema_info
+    for table in missing:
+        try:
+            schema_info[table] = get_table_ddl(table)
+        except SQLAlchemyError:
+            print(f"Table {table} not found in the database.")
+
+    return {table: schema_info[table] for table in tables_to_inspect if table in schema_info}
 
 
 # Step 3: Define the get_sample_data method (fetch sample data)
-def get_sample_data(table_name, limit=3):
+# SAMPLE_ROWS_MODE=projected (the default) reads the column types first: BLOB, BINARY and spatial
+# columns are left out of the select list and long text columns are cut to SAMPLE_TEXT_LENGTH
+# characters on the server with LEFT(), so e.g. productlines.image never crosses the wire. The rows
+# are picked from a pool of SAMPLE_POOL_FACTOR x limit rows spread over the primary key, preferring
+# rows that show values not shown yet. Snapshots are stored per table and DDL checksum, so a table
+# is sampled once per schema version. SAMPLE_ROWS_MODE=all runs SELECT * ... LIMIT as before.
+SAMPLE_ROWS_MODE = os.getenv('SAMPLE_ROWS_MODE', 'projected')
+SAMPLE_TEXT_LENGTH = int(os.getenv('SAMPLE_TEXT_LENGTH', '100'))
+SAMPLE_POOL_FACTOR = int(os.getenv('SAMPLE_POOL_FACTOR', '5'))
+
+BINARY_TYPES = ("tinyblob", "blob", "mediumblob", "longblob", "binary", "varbinary", "bit", "geometry", "point",
+                "linestring", "polygon", "multipoint", "multilinestring", "multipolygon", "geometrycollection")
+LONG_TEXT_TYPES = ("text", "mediumtext", "longtext", "json")
+INTEGER_TYPES = ("tinyint", "smallint", "mediumint", "int", "integer", "bigint")
+TABLE_ROWS_QUERY = text("""
+    SELECT TABLE_ROWS FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+""")
+
+_sample_snapshots = {}
+_sample_lock = threading.Lock()
+sample_snapshot_stats = {"sample_hits": 0, "sample_fetches": 0}
+
+
+def column_base_type(column):
+    match = re.match(r"(\w+)(?:\((\d+)\))?", column["column_type"].lower())
+    return match.group(1), int(match.group(2)) if match.group(2) else None
+
+
+def sample_projection(table_meta, quote):
+    """
+    Select-list expressions and headers for the sampled columns of a table.
+    """
+    expressions, headers = [], []
+    for column in table_meta["columns"]:
+        base, length = column_base_type(column)
+        if base in BINARY_TYPES:
+            continue
+        name = quote(column["name"])
+        if base in LONG_TEXT_TYPES or base in ("char", "varchar") and length and length > SAMPLE_TEXT_LENGTH:
+            expressions.append(f"CASE WHEN CHAR_LENGTH({name}) > {SAMPLE_TEXT_LENGTH} "
+                               f"THEN CONCAT(LEFT({name}, {SAMPLE_TEXT_LENGTH}), '...') ELSE {name} END AS {name}")
+        else:
+            expressions.append(name)
+        headers.append(column["name"])
+    return expressions, headers
+
+
+def select_representative_rows(rows, limit):
+    """
+    Greedily picks `limit` rows from the pool that add the most values not shown yet, kept in pool order.
+    """
+    rows = list(dict.fromkeys(tuple(row) for row in rows))
+    seen = [set() for _ in rows[0]] if rows else []
+    remaining = list(range(len(rows)))
+    chosen = []
+    while remaining and len(chosen) < limit:
+        best = max(remaining, key=lambda i: sum(1 for values, value in zip(seen, rows[i])
+                                                if value is not None and value not in values))
+        remaining.remove(best)
+        chosen.append(best)
+        for values, value in zip(seen, rows[best]):
+            values.add(value)
+    return [rows[i] for i in sorted(chosen)]
+
+
+def fetch_sample_rows(connection, table_name, table_meta, limit):
+    """
+    Projected sample rows of one table. A single integer primary key is sampled with index seeks
+    spread between its MIN and MAX, any other primary key with offsets spread over the estimated
+    row count; tables without one fall back to the first rows.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    expressions, headers = sample_projection(table_meta, quote)
+    if not expressions:
+        return [], headers
+    select = f"SELECT {', '.join(expressions)} FROM {quote(table_name)}"
+    pool_size = limit * SAMPLE_POOL_FACTOR
+    primary = table_meta["indexes"].get("PRIMARY")
+    key_columns = [quote(column.split("(")[0].strip("`")) for column in primary["columns"]] if primary else []
+    key_types = {column["name"]: column_base_type(column)[0] for column in table_meta["columns"]}
+    queries = []
+
+    if len(key_columns) == 1 and key_types.get(primary["columns"][0].strip("`")) in INTEGER_TYPES:
+        low, high = connection.execute(text(f"SELECT MIN({key_columns[0]}), MAX({key_columns[0]}) FROM {quote(table_name)}")).fetchone()  # type: ignore
+        if low is not None and high - low >= pool_size:
+            queries = [f"({select} WHERE {key_columns[0]} >= {low + i * (high - low) // pool_size} ORDER BY {key_columns[0]} LIMIT 1)"
+                       for i in range(pool_size)]
+    elif key_columns:
+        table_rows = connection.execute(TABLE_ROWS_QUERY, {"table": table_name}).scalar() or 0
+        if table_rows > pool_size:
+            queries = [f"({select} ORDER BY {', '.join(key_columns)} LIMIT 1 OFFSET {i * table_rows // pool_size})"
+                       for i in range(pool_size)]
+
+    query = " UNION ALL ".join(queries) if queries else f"{select} LIMIT {pool_size}"
+    rows = connection.execute(text(query)).fetchall()
+    return select_representative_rows(rows, limit), headers
+
+
+def get_sample_data(table_name, limit=3, checksum=None):
     """
-    Fetch sample data for the given table.
+    Fetch sample data for the given table. With the table's DDL checksum, the snapshot is
+    stored and reused until the schema changes.
     """
+    if SAMPLE_ROWS_MODE == 'all':
+        with engine.connect() as connection:
+            query = text(f'SELECT * FROM {table_name} LIMIT {limit};')
+            result = connection.execute(query)
+            rows = result.fetchall()
+
+            # Extract column headers
+            headers = result.keys()
+            return rows, headers
+
+    key = (table_name, limit, checksum)
+    if checksum is not None:
+        with _sample_lock:
+            snapshot = _sample_snapshots.get(key)
+            if snapshot is not None:
+                sample_snapshot_stats["sample_hits"] += 1
+                return snapshot
+
     with engine.connect() as connection:
-        query = text(f'SELECT * FROM {table_name} LIMIT {limit};')
-        result = connection.execute(query)
-        rows = result.fetchall()
-        
-        # Extract column headers
-        headers = result.keys()
-        return rows, headers
+        metadata = fetch_schema_metadata(connection, [table_name])
+        snapshot = fetch_sample_rows(connection, table_name, metadata[table_name], limit) if table_name in metadata else ([], [])
+
+    with _sample_lock:
+        sample_snapshot_stats["sample_fetches"] += 1
+        if checksum is not None:
+            # Snapshots of earlier schema versions of the table are dropped
+            for stale in [k for k in _sample_snapshots if k[0] == table_name and k[1] == limit]:
+                del _sample_snapshots[stale]
+            _sample_snapshots[key] = snapshot
+    return snapshot
 
 # Step 4: Function to retrieve table descriptions from a CSV file
+TABLE_DESCRIPTIONS_CSV = "database_table_descriptions.csv"
+
 def get_table_details():
     """
     Reads the table descriptions from a CSV file and returns a dictionary where
     the key is the table name and the value is the table description.
     """
     # Read the CSV file into a DataFrame
-    table_description = pd.read_csv("database_table_descriptions.csv")
+    table_description = pd.read_csv(TABLE_DESCRIPTIONS_CSV)
     
     # Create a dictionary to store table descriptions
     table_docs = {}
@@ -116,26 +270,222 @@ def format_output(schema_info, sample_data, table_descriptions):
     return output
 
 
-# Combine the steps and generate the response
-def process_query(question):
-    # Step 1: Find the relevant table group based on the user's question
-    relevant_tables = find_relevant_group(question)
-    
+# Step 6: Schema context cache keyed by table group
+# The rendered context is reused until the tables' UPDATE_TIME, the DDL checksum
+# or the descriptions CSV mtime changes. The fingerprint is only re-read from
+# MySQL once every SCHEMA_CACHE_CHECK_INTERVAL seconds, so the hot path is a dict
+# lookup plus an os.stat of the CSV.
+SCHEMA_CACHE_CHECK_INTERVAL = float(os.getenv('SCHEMA_CACHE_CHECK_INTERVAL', '30'))
+
+_schema_context_cache = {}
+_schema_cache_lock = threading.Lock()
+schema_cache_stats = {"hits": 0, "misses": 0, "rebuilds": 0, "validations": 0}
+
+
+def get_schema_fingerprint(tables):
+    """
+    Returns a per-table (UPDATE_TIME, DDL checksum) fingerprint for the given tables,
+    read from information_schema in a single connection. Outside MySQL the version comes
+    from fetch_table_versions and the checksum from the inspected columns.
+    """
+    if engine.dialect.name != "mysql":
+        with engine.connect() as connection:
+            versions = fetch_table_versions(connection, list(tables))
+            metadata = fetch_schema_metadata(connection, tables)
+        return tuple((table, str(versions.get(table)),
+                      hashlib.md5(repr(metadata.get(table, {}).get("columns")).encode("utf-8")).hexdigest())
+                     for table in tables)
+    update_time_query = text("""
+        SELECT TABLE_NAME, UPDATE_TIME
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :tables
+    """).bindparams(bindparam("tables", expanding=True))
+    columns_query = text("""
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, COLUMN_KEY, EXTRA, COLUMN_COMMENT
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :tables
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """).bindparams(bindparam("tables", expanding=True))
+
+    with engine.connect() as connection:
+        update_times = dict(connection.execute(update_time_query, {"tables": list(tables)}).fetchall())
+        column_rows = connection.execute(columns_query, {"tables": list(tables)}).fetchall()
+
+    checksums = {table: hashlib.md5() for table in tables}
+    for row in column_rows:
+        if row[0] in checksums:
+            checksums[row[0]].update(repr(tuple(row[1:])).encode("utf-8"))
+
+    return tuple((table, str(update_times.get(table)), checksums[table].hexdigest()) for table in tables)
+
+
+def get_descriptions_mtime():
+    try:
+        return os.path.getmtime(TABLE_DESCRIPTIONS_CSV)
+    except OSError:
+        return None
+
+
+def collect_schema_parts(relevant_tables, fingerprint=None):
+    """
+    Fetches the schema, sample data and descriptions for the given tables without consulting the
+    cache. With the tables' fingerprint, sample snapshots of unchanged schemas are reused.
+    """
     # Step 2: Fetch the table schema for relevant tables
     schema_details = get_table_info(relevant_tables)
-    
+
     # Step 3: Fetch sample data for the relevant tables
+    checksums = {table: checksum for table, _, checksum in fingerprint or ()}
     sample_data = {}
     for table in relevant_tables:
-        data, headers = get_sample_data(table)
+        data, headers = get_sample_data(table, checksum=checksums.get(table))
         sample_data[table] = (data, headers)
-        
+
     # Step 4: Fetch the table descriptions from the CSV file
     table_descriptions = get_table_details()
 
+    return schema_details, sample_data, table_descriptions
+
+
+def build_query_context(relevant_tables):
+    """
+    Builds the schema context for the given tables without consulting the cache.
+    """
     # Step 5: Format the output as per the required format
-    formatted_output = format_output(schema_details, sample_data, table_descriptions)
-    return formatted_output
+    return format_output(*collect_schema_parts(relevant_tables))
+
+
+def get_cached_schema_entry(relevant_tables):
+    """
+    Returns the cache entry (raw schema parts and rendered context) for a table group,
+    rebuilding it only when the schema fingerprint or the descriptions CSV has changed.
+    """
+    key = tuple(relevant_tables)
+    now = time.monotonic()
+    csv_mtime = get_descriptions_mtime()
+
+    with _schema_cache_lock:
+        entry = _schema_context_cache.get(key)
+        if entry and entry["csv_mtime"] == csv_mtime and now - entry["checked_at"] < SCHEMA_CACHE_CHECK_INTERVAL:
+            schema_cache_stats["hits"] += 1
+            return entry
+
+    fingerprint = get_schema_fingerprint(key)
+
+    with _schema_cache_lock:
+        schema_cache_stats["validations"] += 1
+        entry = _schema_context_cache.get(key)
+        if entry and entry["csv_mtime"] == csv_mtime and entry["fingerprint"] == fingerprint:
+            entry["checked_at"] = now
+            schema_cache_stats["hits"] += 1
+            return entry
+
+    parts = collect_schema_parts(list(key), fingerprint)
+    context = format_output(*parts)
+    new_entry = {
+        "parts": parts,
+        "context": context,
+        "tokens": count_tokens(context),
+        "fingerprint": fingerprint,
+        "csv_mtime": csv_mtime,
+        "checked_at": now,
+    }
+
+    with _schema_cache_lock:
+        schema_cache_stats["rebuilds" if entry else "misses"] += 1
+        _schema_context_cache[key] = new_entry
+    return new_entry
+
+
+def get_cached_query_context(relevant_tables):
+    """
+    Returns the rendered schema context for a table group from the cache.
+    """
+    return get_cached_schema_entry(relevant_tables)["context"]
+
+
+def get_schema_cache_stats():
+    with _schema_cache_lock:
+        stats = dict(schema_cache_stats, entries=len(_schema_context_cache))
+    with _sample_lock:
+        return dict(stats, sample_snapshots=len(_sample_snapshots), **sample_snapshot_stats)
+
+
+def clear_schema_cache():
+    with _schema_cache_lock:
+        _schema_context_cache.clear()
+    with _sample_lock:
+        _sample_snapshots.clear()
+
+
+# Table info of the SQL prompt
+# The chain in main.py renders {table_info} per question from the routed tables with
+# build_table_info. With TABLE_INFO_TOKEN_BUDGET set (tokens, e.g. 800), the context is
+# pruned to the columns most relevant to the question; token counts go to table_info_stats.
+TABLE_INFO_TOKEN_BUDGET = int(os.getenv('TABLE_INFO_TOKEN_BUDGET', '0')) or None
+
+_table_info_lock = threading.Lock()
+table_info_stats = {"prompts": 0, "pruned": 0, "over_budget": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def build_table_info(question, relevant_tables, use_cache=True, token_budget=None, report=None):
+    """
+    Returns the table info of a table group for the question. With a token_budget, the context is
+    pruned to the columns most relevant to the question (keys are always kept). Token counts
+    before and after pruning are written into `report` when a dict is passed.
+    """
+    # Steps 2-5: Schema, sample data, descriptions and formatting (cached per table group)
+    if use_cache:
+        entry = get_cached_schema_entry(relevant_tables)
+        parts, full_context, tokens = entry["parts"], entry["context"], entry["tokens"]
+    else:
+        parts = collect_schema_parts(relevant_tables)
+        full_context = format_output(*parts)
+        tokens = count_tokens(full_context)
+
+    if token_budget is None or tokens <= token_budget:
+        if report is not None:
+            report.update(tokens_before=tokens, tokens_after=tokens, token_budget=token_budget, within_budget=True)
+        return full_context
+
+    table_info, budget_report = build_budgeted_table_info(question, *parts, token_budget=token_budget)
+    if report is not None:
+        report.update(budget_report, tokens_before=tokens)
+    return table_info
+
+
+def prompt_table_info(question, relevant_tables):
+    """
+    Table info for the SQL prompt, pruned to TABLE_INFO_TOKEN_BUDGET, with token counts recorded.
+    """
+    report = {}
+    table_info = build_table_info(question, relevant_tables, token_budget=TABLE_INFO_TOKEN_BUDGET, report=report)
+    with _table_info_lock:
+        table_info_stats["prompts"] += 1
+        table_info_stats["pruned"] += report["tokens_after"] < report["tokens_before"]
+        table_info_stats["over_budget"] += not report["within_budget"]
+        table_info_stats["tokens_before"] += report["tokens_before"]
+        table_info_stats["tokens_after"] += report["tokens_after"]
+    return table_info
+
+
+def get_table_info_stats():
+    with _table_info_lock:
+        stats = dict(table_info_stats, token_budget=TABLE_INFO_TOKEN_BUDGET)
+    prompts = stats["prompts"] or 1
+    stats["avg_tokens_before"] = stats["tokens_before"] / prompts
+    stats["avg_tokens_after"] = stats["tokens_after"] / prompts
+    return stats
+
+
+# Combine the steps and generate the response
+def process_query(question, use_cache=True, token_budget=None, report=None):
+    """
+    Returns the table info for the question's table group (see build_table_info).
+    """
+    # Step 1: Find the relevant table group based on the user's question
+    relevant_tables = find_relevant_group(question)
+    return build_table_info(question, relevant_tables, use_cache, token_budget, report)
 
 # Example usage
 # output = process_query("Sales")
@@ -0,0 +1,366 @@
+import hashlib
+import re
+from sqlalchemy import text, bindparam, inspect
+from sqlalchemy.exc import DBAPIError
+
+
+# Bulk schema introspection
+# Pulls columns, indexes, foreign keys and comments for every requested table with
+# a fixed number of set-based information_schema queries (three, regardless of the
+# number of tables) and renders the per-table text locally.
+# fetch_table_versions is the change detection shared by the components that copy or
+# aggregate table data (read_replica.py, summary_tables.py).
+
+COLUMNS_QUERY = text("""
+    SELECT c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_DEFAULT,
+           c.EXTRA, c.COLUMN_COMMENT, c.CHARACTER_SET_NAME, c.COLLATION_NAME,
+           t.ENGINE, t.TABLE_COLLATION, t.TABLE_COMMENT, ccsa.CHARACTER_SET_NAME, t.CREATE_OPTIONS
+    FROM information_schema.COLUMNS c
+    JOIN information_schema.TABLES t
+      ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+    LEFT JOIN information_schema.COLLATION_CHARACTER_SET_APPLICABILITY ccsa
+      ON ccsa.COLLATION_NAME = t.TABLE_COLLATION
+    WHERE c.TABLE_SCHEMA = DATABASE() AND c.TABLE_NAME IN :tables
+    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+""").bindparams(bindparam("tables", expanding=True))
+
+# Keys in SHOW CREATE TABLE order: PRIMARY, then unique keys, then the rest, each in creation
+# order (the InnoDB index id). INNODB_INDEXES needs the PROCESS privilege; without it
+# INDEXES_BY_NAME_QUERY falls back to name order within the same grouping.
+INDEXES_QUERY = text("""
+    SELECT s.TABLE_NAME, s.INDEX_NAME, s.NON_UNIQUE, s.COLUMN_NAME, s.SUB_PART
+    FROM information_schema.STATISTICS s
+    LEFT JOIN information_schema.INNODB_TABLES it
+      ON it.NAME = CONCAT(s.TABLE_SCHEMA, '/', s.TABLE_NAME)
+    LEFT JOIN information_schema.INNODB_INDEXES ii
+      ON ii.TABLE_ID = it.TABLE_ID AND ii.NAME = s.INDEX_NAME
+    WHERE s.TABLE_SCHEMA = DATABASE() AND s.TABLE_NAME IN :tables
+    ORDER BY s.TABLE_NAME, s.INDEX_NAME = 'PRIMARY' DESC, s.NON_UNIQUE, ii.INDEX_ID, s.INDEX_NAME, s.SEQ_IN_INDEX
+""").bindparams(bindparam("tables", expanding=True))
+
+INDEXES_BY_NAME_QUERY = text("""
+    SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :tables
+    ORDER BY TABLE_NAME, INDEX_NAME = 'PRIMARY' DESC, NON_UNIQUE, INDEX_NAME, SEQ_IN_INDEX
+""").bindparams(bindparam("tables", expanding=True))
+
+FOREIGN_KEYS_QUERY = text("""
+    SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME,
+           k.REFERENCED_COLUMN_NAME, r.UPDATE_RULE, r.DELETE_RULE
+    FROM information_schema.KEY_COLUMN_USAGE k
+    JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+      ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+    WHERE k.TABLE_SCHEMA = DATABASE() AND k.TABLE_NAME IN :tables
+      AND k.REFERENCED_TABLE_NAME IS NOT NULL
+    ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+""").bindparams(bindparam("tables", expanding=True))
+
+# MySQL column types whose SQLAlchemy class name differs from the MySQL keyword
+SQLALCHEMY_TYPE_NAMES = {"int": "INTEGER", "bool": "BOOLEAN", "boolean": "BOOLEAN"}
+
+# Types whose arguments are string literals, rendered by SQLAlchemy exactly as MySQL lists them
+LITERAL_ARGUMENT_TYPES = ("enum", "set")
+
+# Types that never show "DEFAULT NULL" in SHOW CREATE TABLE
+NO_DEFAULT_TYPES = ("tinytext", "text", "mediumtext", "longtext",
+                    "tinyblob", "blob", "mediumblob", "longblob", "json", "geometry")
+
+
+def fetch_schema_metadata(connection, tables):
+    """
+    Fetches column, index and foreign key metadata for all the given tables in three queries.
+    Returns a dict of table -> metadata, containing only the tables that exist.
+    Outside MySQL the metadata comes from inspect_schema_metadata.
+    """
+    if connection.dialect.name != "mysql":
+        return inspect_schema_metadata(connection, tables)
+    params = {"tables": list(tables)}
+    metadata = {}
+
+    for row in connection.execute(COLUMNS_QUERY, params):
+        (table, name, column_type, is_nullable, default, extra, comment,
+         charset, collation, engine_name, table_collation, table_comment, table_charset, create_options) = row
+        if table not in metadata:
+            metadata[table] = {
+                "columns": [],
+                "indexes": {},
+                "foreign_keys": {},
+                "engine": engine_name,
+                "collation": table_collation,
+                "charset": table_charset,
+                "comment": table_comment,
+                # e.g. "row_format=DYNAMIC stats_persistent=0"; "partitioned" is not a table option
+                "options": [option for option in (create_options or "").split() if "=" in option],
+            }
+        metadata[table]["columns"].append({
+            "name": name,
+            "column_type": column_type,
+            "nullable": is_nullable == "YES",
+            "default": default,
+            "extra": extra or "",
+            "comment": comment or "",
+            "charset": charset,
+            "collation": collation,
+        })
+
+    try:
+        index_rows = connection.execute(INDEXES_QUERY, params).fetchall()
+    except DBAPIError:
+        index_rows = connection.execute(INDEXES_BY_NAME_QUERY, params).fetchall()
+    for table, index_name, non_unique, column, sub_part in index_rows:
+        if table in metadata:
+            index = metadata[table]["indexes"].setdefault(index_name, {"unique": not int(non_unique), "columns": []})
+            index["columns"].append(f"`{column}`({sub_part})" if sub_part else f"`{column}`")
+
+    for table, constraint, column, ref_table, ref_column, update_rule, delete_rule in connection.execute(FOREIGN_KEYS_QUERY, params):
+        if table in metadata:
+            fk = metadata[table]["foreign_keys"].setdefault(constraint, {
+                "columns": [], "referred_table": ref_table, "referred_columns": [],
+                "on_update": update_rule, "on_delete": delete_rule,
+            })
+            fk["columns"].append(column)
+            fk["referred_columns"].append(ref_column)
+
+    return metadata
+
+
+def inspect_schema_metadata(connection, tables):
+    """
+    fetch_schema_metadata for engines without MySQL's information_schema (the local SQLite
+    copies of the benchmarks), from the SQLAlchemy inspector one table at a time. Table options,
+    character sets and column extras are left empty.
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    metadata = {}
+    for table in tables:
+        if table not in existing:
+            continue
+        columns = [{
+            "name": column["name"],
+            "column_type": str(column["type"]).lower().replace(", ", ","),
+            "nullable": column["nullable"],
+            "default": re.sub(r"^'(.*)'$", r"\1", column["default"]) if column.get("default") is not None else None,
+            "extra": "",
+            "comment": column.get("comment") or "",
+            "charset": None,
+            "collation": None,
+        } for column in inspector.get_columns(table)]
+        indexes = {}
+        primary = inspector.get_pk_constraint(table)["constrained_columns"]
+        if primary:
+            indexes["PRIMARY"] = {"unique": True, "columns": [f"`{column}`" for column in primary]}
+        for index in inspector.get_indexes(table):
+            indexes[index["name"]] = {"unique": bool(index["unique"]), "columns": [f"`{column}`" for column in index["column_names"]]}
+        foreign_keys = {}
+        for i, fk in enumerate(inspector.get_foreign_keys(table), 1):
+            foreign_keys[fk["name"] or f"{table}_ibfk_{i}"] = {
+                "columns": fk["constrained_columns"], "referred_table": fk["referred_table"],
+                "referred_columns": fk["referred_columns"],
+                "on_update": fk["options"].get("onupdate", "NO ACTION").upper(),
+                "on_delete": fk["options"].get("ondelete", "NO ACTION").upper(),
+            }
+        metadata[table] = {"columns": columns, "indexes": indexes, "foreign_keys": foreign_keys,
+                           "engine": None, "collation": None, "charset": None, "comment": None, "options": []}
+    return metadata
+
+
+TABLE_VERSIONS_QUERY = text("""
+    SELECT TABLE_NAME, UPDATE_TIME, UPDATE_TIME >= NOW() - INTERVAL 1 SECOND
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+""")
+
+
+def fetch_table_versions(connection, tables=None):
+    """
+    {table: version} for the base tables (only `tables` when given): UPDATE_TIME, the time of
+    the last write, on MySQL (one information_schema query, no scan). Other engines (the local
+    SQLite copies) have no such marker, so there the version is a hash of the rows.
+    MySQL 8 serves UPDATE_TIME from a statistics cache kept for information_schema_stats_expiry
+    seconds (86400 by default), so the session sets it to 0 first; 5.7 has no such cache.
+    InnoDB does not persist UPDATE_TIME: it is NULL after a server restart until the next
+    write, which shows as one change. It has one-second resolution, so a table written in the
+    second of the check gets a version equal to nothing and is seen as changed again next time.
+    """
+    if connection.dialect.name != "mysql":
+        quote = connection.dialect.identifier_preparer.quote
+        names = tables if tables is not None else inspect(connection).get_table_names()
+        versions = {}
+        for table in names:
+            digest = hashlib.md5()
+            for row in connection.execute(text(f"SELECT * FROM {quote(table)}")):
+                digest.update(repr(tuple(row)).encode("utf-8"))
+            versions[table] = digest.hexdigest()
+        return versions
+    try:
+        connection.exec_driver_sql("SET SESSION information_schema_stats_expiry = 0")
+    except DBAPIError:
+        connection.rollback()  # MySQL 5.7
+    versions = {}
+    for table, update_time, recent in connection.execute(TABLE_VERSIONS_QUERY):
+        if tables is None or table in tables:
+            versions[table] = object() if recent else update_time
+    return versions
+
+
+def match_tables(metadata, tables):
+    """
+    Maps each requested table to its key in fetch_schema_metadata's result, matching names
+    case-insensitively (information_schema has the stored case, lower_case_table_names aside).
+    Returns ({table: metadata key}, [tables not found]).
+    """
+    by_lower_name = {table.lower(): table for table in metadata}
+    found, missing = {}, []
+    for table in tables:
+        key = table if table in metadata else by_lower_name.get(table.lower())
+        if key:
+            found[table] = key
+        else:
+            missing.append(table)
+    return found, missing
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def render_column_definition(column, table_meta):
+    parts = [f"`{column['name']}`", column["column_type"]]
+
+    if column["collation"] and column["collation"] != table_meta["collation"]:
+        if column["charset"] and column["charset"] != table_meta["charset"]:
+            parts.append(f"CHARACTER SET {column['charset']}")
+        parts.append(f"COLLATE {column['collation']}")
+
+    if not column["nullable"]:
+        parts.append("NOT NULL")
+
+    # information_schema spells these in lower case, SHOW CREATE TABLE in upper case
+    extra = column["extra"].replace("DEFAULT_GENERATED", "").replace("auto_increment", "AUTO_INCREMENT")
+    extra = extra.replace("on update", "ON UPDATE").strip()
+    base_type = column["column_type"].split("(")[0].split(" ")[0].lower()
+    if column["default"] is not None:
+        generated = "DEFAULT_GENERATED" in column["extra"] or column["default"].upper().startswith("CURRENT_TIMESTAMP")
+        parts.append(f"DEFAULT {column['default'] if generated else quote_literal(column['default'])}")
+    elif column["nullable"] and base_type not in NO_DEFAULT_TYPES:
+        parts.append("DEFAULT NULL")
+
+    if extra:
+        parts.append(extra)
+    if column["comment"]:
+        parts.append(f"COMMENT {quote_literal(column['comment'])}")
+    return " ".join(parts)
+
+
+def render_table_ddl(table, table_meta):
+    """
+    Renders a SHOW CREATE TABLE style statement from bulk-fetched metadata. Table options are
+    rendered except the AUTO_INCREMENT counter, which SHOW CREATE TABLE includes but which
+    changes with every insert (and information_schema only reports it as of the last statistics
+    refresh), so the text only changes with the schema.
+    """
+    lines = [render_column_definition(column, table_meta) for column in table_meta["columns"]]
+
+    for index_name, index in table_meta["indexes"].items():
+        columns = ",".join(index["columns"])
+        if index_name == "PRIMARY":
+            lines.append(f"PRIMARY KEY ({columns})")
+        elif index["unique"]:
+            lines.append(f"UNIQUE KEY `{index_name}` ({columns})")
+        else:
+            lines.append(f"KEY `{index_name}` ({columns})")
+
+    for constraint, fk in table_meta["foreign_keys"].items():
+        columns = ",".join(f"`{c}`" for c in fk["columns"])
+        referred = ",".join(f"`{c}`" for c in fk["referred_columns"])
+        line = f"CONSTRAINT `{constraint}` FOREIGN KEY ({columns}) REFERENCES `{fk['referred_table']}` ({referred})"
+        if fk["on_delete"] not in ("RESTRICT", "NO ACTION"):
+            line += f" ON DELETE {fk['on_delete']}"
+        if fk["on_update"] not in ("RESTRICT", "NO ACTION"):
+            line += f" ON UPDATE {fk['on_update']}"
+        lines.append(line)
+
+    body = ",\n".join(f"  {line}" for line in lines)
+    options = []
+    if table_meta["engine"]:
+        options.append(f"ENGINE={table_meta['engine']}")
+    if table_meta["charset"]:
+        options.append(f"DEFAULT CHARSET={table_meta['charset']}")
+    if table_meta["collation"]:
+        options.append(f"COLLATE={table_meta['collation']}")
+    for option in table_meta.get("options", ()):
+        name, _, value = option.partition("=")
+        options.append(f"{name.upper()}={value}")
+    if table_meta["comment"]:
+        options.append(f"COMMENT={quote_literal(table_meta['comment'])}")
+    return f"CREATE TABLE `{table}` (\n{body}\n)" + "".join(f" {option}" for option in options)
+
+
+def sqlalchemy_type_string(column_type):
+    """
+    Converts an information_schema COLUMN_TYPE (e.g. 'decimal(10,2) unsigned') into the
+    string SQLAlchemy's MySQL dialect produces for the reflected type (e.g. 'DECIMAL(10, 2) UNSIGNED').
+    ENUM and SET literals are kept as-is: enum('a','b') becomes ENUM('a','b').
+    """
+    match = re.match(r"^(\w+)(?:\((.*)\))?(.*)$", column_type.strip())
+    if not match:
+        return column_type.upper()
+    base, args, modifiers = match.groups()
+    result = SQLALCHEMY_TYPE_NAMES.get(base.lower(), base.upper())
+    if args and base.lower() in LITERAL_ARGUMENT_TYPES:
+        result += f"({args})"
+    elif args:
+        result += "(" + ", ".join(arg.strip() for arg in args.split(",")) + ")"
+    for modifier in modifiers.split():
+        result += f" {modifier.upper()}"
+    return result
+
+
+def render_column_info(table_meta):
+    """
+    Returns the [{"name": ..., "type": ...}] list util.get_table_info produces for a table.
+    """
+    column_info = []
+    for column in table_meta["columns"]:
+        type_string = sqlalchemy_type_string(column["column_type"])
+        # Character set and collation only appear on the reflected type when they differ from the table default
+        if column["collation"] and column["collation"] != table_meta["collation"]:
+            if column["charset"] and column["charset"] != table_meta["charset"]:
+                type_string += f" CHARACTER SET {column['charset']}"
+            type_string += f" COLLATE {column['collation']}"
+        column_info.append({"name": column["name"], "type": type_string})
+    return column_info
+
+
+def parse_dump_schema(dump_path):
+    """
+    Reads table columns and foreign keys from the CREATE TABLE statements of a SQL dump
+    (e.g. database_dump.sql), for use without a live database.
+    Returns a dict of table -> {"columns": [(name, type)], "primary_key": [...], "foreign_keys": {column: (table, column)}}.
+    """
+    with open(dump_path, encoding="utf-8") as dump_file:
+        dump = dump_file.read()
+
+    schema = {}
+    for match in re.finditer(r"CREATE TABLE\s+`?(\w+)`?\s*\((.*?)\n\)", dump, re.DOTALL | re.IGNORECASE):
+        table, body = match.group(1), match.group(2)
+        columns, primary_key, foreign_keys = [], [], {}
+        for line in body.splitlines():
+            line = line.strip().rstrip(",")
+            if not line:
+                continue
+            pk = re.match(r"PRIMARY KEY\s*\((.*)\)", line, re.IGNORECASE)
+            fk = re.search(r"FOREIGN KEY\s*\((.*?)\)\s*REFERENCES\s+`?(\w+)`?\s*\((.*?)\)", line, re.IGNORECASE)
+            if pk:
+                primary_key = [c.strip(" `") for c in pk.group(1).split(",")]
+            elif fk:
+                for source, target in zip(fk.group(1).split(","), fk.group(3).split(",")):
+                    foreign_keys[source.strip(" `")] = (fk.group(2), target.strip(" `"))
+            elif not re.match(r"(UNIQUE\s+)?(KEY|INDEX|CONSTRAINT)\b", line, re.IGNORECASE):
+                column = re.match(r"`?(\w+)`?\s+(\w+(?:\([^)]*\))?)", line)
+                if column:
+                    columns.append((column.group(1), column.group(2)))
+        schema[table] = {"columns": columns, "primary_key": primary_key, "foreign_keys": foreign_keys}
+    return schema